@@ -0,0 +1,186 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Arena Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains the Arena class, a compact representation of many expression trees.
+Instead of one Unit per node, plus a list of terms and two MonoData objects per
+monomial, an arena stores every node of every tree in a few parallel arrays.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+from array import array
+from parse import *
+
+# The op code of each kind of Unit, and the op of each op code.
+OPCODES = {'+': 0, '*': 1, 'x': 2, '^': 3}
+OPS = '+*x^'
+
+
+class Arena:
+    """
+    A collection of expression trees stored in parallel arrays.
+
+    The nodes of each tree are stored in pre-order, i.e., each node is immediately followed by
+    the nodes of its first term's subtree, then its second term's subtree, and so on.
+    The node at index i has
+        - the op code self.ops[i] (see OPCODES);
+        - self.counts[i] terms, if it is a sum, product or power;
+        - a subtree of self.sizes[i] nodes, including itself, so that the node after its subtree
+          (e.g., its next sibling) is at index i + self.sizes[i];
+        - the coefficient self.coeffs[i] and degree self.degs[i], if it is a monomial (0 otherwise).
+
+    Instance Attributes:
+        - ops: The op code of each node.
+        - counts: The number of terms of each node.
+        - sizes: The size of the subtree of each node.
+        - coeffs: The coefficient of each node.
+        - degs: The degree of each node.
+        - roots: The index of the root of each tree, in the order they were added.
+
+    Representation Invariants:
+        - len(self.ops) == len(self.counts) == len(self.sizes) == len(self.coeffs) == len(self.degs)
+
+    >>> arena = Arena()
+    >>> arena.add(get_unit('(((x + 3) * (x + 3)) + 1)'))
+    0
+    >>> arena.add_equation(get_equation('x^2 = (x + 1)'))
+    1
+    >>> list(arena.ops), list(arena.sizes)
+    ([0, 1, 0, 2, 2, 0, 2, 2, 2, 2, 0, 2, 2], [9, 7, 3, 1, 1, 3, 1, 1, 1, 1, 3, 1, 1])
+    >>> print(arena.get(0))
+    (((x + 3) * (x + 3)) + 1)
+    >>> print(arena.get_equation(1))
+    x^2 = (x + 1)
+    """
+    ops: array
+    counts: array
+    sizes: array
+    coeffs: array
+    degs: array
+    roots: array
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty Arena.
+        """
+        self.ops = array('b')
+        self.counts = array('i')
+        self.sizes = array('i')
+        self.coeffs = array('d')
+        self.degs = array('d')
+        self.roots = array('i')
+
+    def __len__(self) -> int:
+        """
+        Return the number of trees in this arena.
+        """
+        return len(self.roots)
+
+    def nbytes(self) -> int:
+        """
+        Return the number of bytes used by the contents of the arrays of this arena.
+        """
+        arrays = (self.ops, self.counts, self.sizes, self.coeffs, self.degs, self.roots)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def add(self, unit: Unit) -> int:
+        """
+        Add the tree represented by unit to this arena, and return its index in self.roots.
+        """
+        self.roots.append(len(self.ops))
+
+        # Write the nodes in pre-order, and fill in each node's size once its whole subtree is written
+        stack = [(unit, False)]
+
+        while len(stack) > 0:
+            node, written = stack.pop()
+            if written:  # node is the index of a sum, product or power whose whole subtree is now written
+                self.sizes[node] = len(self.ops) - node
+                continue
+
+            self.ops.append(OPCODES[node.op])
+            if node.op == 'x':
+                self.counts.append(0)
+                self.sizes.append(1)
+                self.coeffs.append(node.terms[0].value)
+                self.degs.append(node.terms[1].value)
+            else:
+                self.counts.append(len(node.terms))
+                self.sizes.append(0)
+                self.coeffs.append(0.0)
+                self.degs.append(0.0)
+                stack.append((len(self.ops) - 1, True))
+                stack.extend((term, False) for term in reversed(node.terms))
+
+        return len(self.roots) - 1
+
+    def add_equation(self, eqn: Equation) -> int:
+        """
+        Add the left and right sides of eqn to this arena as consecutive trees,
+        and return the index in self.roots of the left side.
+        """
+        self.add(eqn.left)
+        self.add(eqn.right)
+        return len(self.roots) - 2
+
+    def get(self, index: int) -> Unit:
+        """
+        Return a new Unit representing the tree with the given index in self.roots.
+
+        Preconditions:
+            - 0 <= index < len(self.roots)
+        """
+        root = self.roots[index]
+        end = root + self.sizes[root]
+        units = []  # the units whose terms are still being built, innermost last
+        result = None
+
+        for i in range(root, end):
+            if self.ops[i] == OPCODES['x']:
+                unit = mono(self.coeffs[i], self.degs[i])
+            else:
+                unit = Unit(OPS[self.ops[i]], [])
+
+            if len(units) > 0 and units[-1][0].op == '^':  # the base and then the power, in that order
+                units[-1][0].terms.append(unit)
+            elif len(units) > 0:
+                units[-1][0].add_term(unit)
+            else:
+                result = unit
+
+            if self.ops[i] != OPCODES['x'] and self.counts[i] > 0:
+                units.append([unit, self.counts[i]])
+            else:
+                # unit is complete, and so may be the last term of its ancestors
+                while len(units) > 0 and len(units[-1][0].terms) == units[-1][1]:
+                    units.pop()
+
+        return result
+
+    def get_equation(self, index: int) -> Equation:
+        """
+        Return a new Equation whose left and right sides are the trees with the given index
+        in self.roots and the next one, respectively.
+
+        Preconditions:
+            - 0 <= index < len(self.roots) - 1
+        """
+        return Equation(self.get(index), self.get(index + 1))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0401'],
+        'extra-imports': ['parse', 'array'],
+        'max-nested-blocks': 4
+    })
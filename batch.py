@@ -0,0 +1,380 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Batch Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for solving many equations without any user interaction.
+Equations are read one per line, and their results are written as JSON Lines,
+i.e., one JSON object per line, as soon as each equation is solved.
+Equations can also be solved in parallel across a pool of worker processes.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Iterable, Iterator, Optional, TextIO
+from budget import Budget, BudgetExceeded
+from parse import *
+
+# The buffer size, in bytes, of the files read and written in batch mode.
+BUFFER_SIZE = 1 << 16
+
+
+def classify(sols: set[float]) -> str:
+    """
+    Return the classification of a solution set returned by Equation.solve:
+        - 'none', if there are no solutions;
+        - 'finite', if there are finitely-many solutions;
+        - 'infinite', if every value of x is a solution;
+        - 'unsupported', if the equation is not supported.
+
+    >>> classify({1.0, 2.0})
+    'finite'
+    >>> classify({float('nan')})
+    'unsupported'
+    """
+    if len(sols) == 0:
+        return 'none'
+    elif any(math.isnan(s) for s in sols):
+        return 'unsupported'
+    elif any(math.isinf(s) for s in sols):
+        return 'infinite'
+    else:
+        return 'finite'
+
+
+def solve_line(line: str, n: int = 5, cache: Optional[Any] = None, solutions: Optional[Any] = None,
+               stats: Optional[Any] = None, budget: Optional[Any] = None) -> dict:
+    """
+    Return a record of the result of solving the equation represented by line, without a trace.
+    The record is a dict with the keys
+        - 'input': line;
+        - 'status': the classification of the solutions (see classify), 'invalid' if line
+                    does not satisfy the preconditions of get_equation, or 'aborted' if solving it
+                    exceeded budget;
+        - 'roots': the sorted finite solutions, rounded to n decimal places.
+    Invalid records also have the keys 'error' and 'offset' (see ParseError), and aborted records
+    have the keys 'error' and 'limit' (see BudgetExceeded).
+    (Records made by solve_lines may also have the status 'error'.)
+    If a SubtreeCache is given as cache, it is used to parse (see get_equation) and simplify the equation.
+    If a SolutionCache is given as solutions, the solutions are looked up in it (see SolutionCache.solve_string).
+    Otherwise, if a SolveStats is given as stats (see stats.py), the time taken to parse and solve the
+    equation is recorded in it.
+    If a Budget is given as budget (see budget.py), it is started, and the equation is parsed and solved
+    within its limits.
+
+    >>> solve_line('x^2 = (x + 1)')
+    {'input': 'x^2 = (x + 1)', 'status': 'finite', 'roots': [-0.61803, 1.61803]}
+    >>> solve_line('(x + 1 = 0')
+    {'input': '(x + 1 = 0', 'status': 'invalid', 'roots': [], 'error': "unclosed '('", 'offset': 0}
+    >>> from budget import Budget
+    >>> solve_line('((x + 1) * (x + 2) * (x + 3)) = x^3', budget=Budget(max_terms=3))
+    {'input': '((x + 1) * (x + 2) * (x + 3)) = x^3', 'status': 'aborted', 'roots': [], \
+'error': '4 terms, over the limit of 3', 'limit': 'terms'}
+    """
+    try:
+        if budget is not None:
+            budget.start()
+        if solutions is not None:
+            sols = solutions.solve_string(line, n, cache, budget)
+        elif stats is not None:
+            start = time.perf_counter()
+            eqn = get_equation(line, cache)
+            stats.add_time('parse', time.perf_counter() - start)
+            sols = eqn.solve(n, trace=False, cache=cache, stats=stats, budget=budget)[0]
+        else:
+            sols = get_equation(line, cache).solve(n, trace=False, cache=cache, budget=budget)[0]
+    except ParseError as error:
+        return _invalid_record(line, error)
+    except BudgetExceeded as error:
+        return _aborted_record(line, error)
+    except ValueError:  # the solver cannot reduce this equation to a sum of monomials
+        sols = {float('nan')}
+
+    return _record(line, sols)
+
+
+def solve_lines(lines: Iterable[str], n: int = 5, cache: Optional[Any] = None, solutions: Optional[Any] = None,
+                stats: Optional[Any] = None, budget: Optional[Any] = None) -> Iterator[dict]:
+    """
+    Yield the record (see solve_line) of each nonblank line in lines, in order.
+    Lines are read lazily, so only one line is held in memory at a time.
+    If solving a line raises an unexpected error, its record has the status 'error' and the
+    key 'error', and the remaining lines are still solved.
+    The caches, stats and budget, if given, are used as in solve_line, so stats aggregates the whole batch,
+    while budget applies to each line on its own.
+
+    >>> [record['status'] for record in solve_lines(['0 = 1\\n', '\\n', '7 = 7\\n'])]
+    ['none', 'infinite']
+    >>> from stats import SolveStats
+    >>> stats = SolveStats()
+    >>> _ = list(solve_lines(['((x + 1) * (x + -1)) = 0', '(x + 1) = 0'], stats=stats))
+    >>> stats.counts['equations'], stats.counts['distributions']
+    (2, 1)
+    """
+    for line in lines:
+        line = line.strip()
+        if line != '':
+            try:
+                yield solve_line(line, n, cache, solutions, stats, budget)
+            except Exception as error:  # isolate the failure to this line
+                yield _error_record(line, error)
+
+
+def solve_batch(lines: Iterable[str], n: int = 5, cache: Optional[Any] = None,
+                budget: Optional[Any] = None, timeout: Optional[float] = None) -> list[dict]:
+    """
+    Return the records (see solve_lines) of the nonblank lines in lines, in order.
+
+    Each equation is reduced on its own (see Equation.reduce), but the roots of all the
+    supported equations are then computed together by a single call to dense.solve_quadratics.
+    The records are the same as those yielded by solve_lines (with the same budget, if given).
+    If timeout is given, the whole batch shares a deadline timeout seconds from now: each equation
+    is aborted once the deadline passes (see Budget.start), even if its own budget is not used up,
+    so that later lines still get records by then.
+
+    >>> [record['roots'] for record in solve_batch(['x^2 = 4', '(2x + 1) = 0', 'x^3 = 1', '(x = 1'])]
+    [[-2.0, 2.0], [-0.5], [], []]
+    >>> [record['status'] for record in solve_batch(['x = 1', 'x = 2'], timeout=0.0)]
+    ['aborted', 'aborted']
+    """
+    from dense import solve_quadratics  # import NumPy only when a batch is vectorized
+
+    until = None
+    if timeout is not None:
+        until = time.perf_counter() + timeout
+        if budget is None:
+            budget = Budget()
+
+    records = []
+    pending = []  # (index in records, a, b, c) for each equation whose roots are to be computed
+
+    for line in lines:
+        line = line.strip()
+        if line == '':
+            continue
+
+        try:
+            if budget is not None:
+                budget.start(until)
+                budget.check_time()
+            eqn = get_equation(line, cache)
+            if eqn.is_unsupported():  # no need to reduce it
+                records.append(_record(line, {float('nan')}))
+                continue
+            coeff_by_deg = eqn.reduce(trace=False, cache=cache, budget=budget)[0]
+        except ParseError as error:
+            records.append(_invalid_record(line, error))
+        except BudgetExceeded as error:
+            records.append(_aborted_record(line, error))
+        except ValueError:  # the solver cannot reduce this equation to a sum of monomials
+            records.append(_record(line, {float('nan')}))
+        except Exception as error:  # isolate the failure to this line
+            records.append(_error_record(line, error))
+        else:
+            if any(deg not in {0, 1, 2} for deg in coeff_by_deg):
+                records.append(_record(line, {float('nan')}))
+            else:
+                pending.append((len(records), coeff_by_deg.get(2, 0), coeff_by_deg.get(1, 0), coeff_by_deg.get(0, 0)))
+                records.append(line)  # replaced by its record once the roots are known
+
+    if len(pending) > 0:
+        indices, a, b, c = zip(*pending)
+        for i, sols in zip(indices, solve_quadratics(a, b, c, n)):
+            if sols is None:  # as solve_line would raise
+                records[i] = _error_record(records[i], OverflowError(OUT_OF_RANGE))
+            else:
+                records[i] = _record(records[i], sols)
+
+    return records
+
+
+def solve_parallel(lines: Iterable[str], n: int = 5, workers: Optional[int] = None,
+                   chunksize: int = 256, budget: Optional[Any] = None) -> Iterator[dict]:
+    """
+    Yield the record (see solve_lines) of each nonblank line in lines, in order, solving
+    chunks of chunksize lines at a time across a pool of worker processes.
+    If workers is None, one worker is used per CPU. If a Budget is given as budget, each worker
+    solves each line within its limits (see solve_line), so that no line can hold up a worker for long.
+
+    Lines are read lazily, and at most two chunks per worker are queued or being solved at
+    once, so memory stays bounded no matter how many lines there are.
+    If a chunk cannot be solved at all, each of its lines gets an 'error' record. If a worker dies,
+    this is the case for every chunk that was queued or being solved in its pool, and the remaining
+    chunks are solved in a new pool.
+
+    Preconditions:
+        - workers is None or workers >= 1
+        - chunksize >= 1
+
+    >>> [record['roots'] for record in solve_parallel(['x = 1', 'x = 2', 'x = 3'], workers=2, chunksize=1)]
+    [[1.0], [2.0], [3.0]]
+
+    Killing a worker after the first two chunks are queued only loses those chunks:
+    >>> import multiprocessing, signal
+    >>> def lines_with_kill():
+    ...     for i in range(40):
+    ...         if i == 8:
+    ...             os.kill(multiprocessing.active_children()[0].pid, signal.SIGKILL)
+    ...             time.sleep(0.5)  # until the pool notices
+    ...         yield f'x = {i}'
+    >>> records = list(solve_parallel(lines_with_kill(), workers=2, chunksize=4))
+    >>> len(records), {record['status'] for record in records[:8]} <= {'finite', 'error'}
+    (40, True)
+    >>> [record['roots'] for record in records[8:]] == [[float(i)] for i in range(8, 40)]
+    True
+    """
+    from concurrent.futures import ProcessPoolExecutor  # import multiprocessing only when it is used
+    from concurrent.futures.process import BrokenProcessPool
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    executor = ProcessPoolExecutor(workers)
+    pending = deque()
+
+    try:
+        for chunk in _chunks(lines, chunksize):
+            try:
+                future = executor.submit(_solve_chunk, chunk, n, budget)
+            except BrokenProcessPool:  # a worker died, so the chunks pending in this pool will fail
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(workers)
+                future = executor.submit(_solve_chunk, chunk, n, budget)
+
+            pending.append((chunk, future))
+            if len(pending) >= 2 * workers:
+                yield from _chunk_records(*pending.popleft())
+
+        while len(pending) > 0:
+            yield from _chunk_records(*pending.popleft())
+    finally:
+        executor.shutdown()
+
+
+def _solve_chunk(chunk: list[str], n: int, budget: Optional[Any] = None) -> list[dict]:
+    """
+    Return the records (see solve_lines) of the lines in chunk. This runs in a worker process.
+    """
+    return solve_batch(chunk, n, budget=budget)
+
+
+def _chunk_records(chunk: list[str], future: Any) -> list[dict]:
+    """
+    Return the records computed by future for the lines in chunk, or an 'error' record for
+    each line if the future failed (e.g., with BrokenProcessPool, if a worker of its pool died).
+    """
+    try:
+        return future.result()
+    except Exception as error:  # isolate the failure to this chunk
+        return [_error_record(line.strip(), error) for line in chunk if line.strip() != '']
+
+
+def _chunks(lines: Iterable[str], chunksize: int) -> Iterator[list[str]]:
+    """
+    Yield consecutive lists of chunksize lines from lines (the last may be shorter).
+
+    >>> list(_chunks(['a', 'b', 'c'], 2))
+    [['a', 'b'], ['c']]
+    """
+    chunk = []
+
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+
+def _record(line: str, sols: set[float]) -> dict:
+    """
+    Return the record (see solve_line) of a line whose equation has the solutions sols.
+    """
+    status = classify(sols)
+    return {'input': line, 'status': status, 'roots': sorted(sols) if status == 'finite' else []}
+
+
+def _invalid_record(line: str, error: ParseError) -> dict:
+    """
+    Return the record (see solve_line) of a line that could not be parsed.
+    """
+    return {'input': line, 'status': 'invalid', 'roots': [], 'error': error.message, 'offset': error.offset}
+
+
+def _aborted_record(line: str, error: BudgetExceeded) -> dict:
+    """
+    Return the record (see solve_line) of a line whose solution exceeded its budget.
+    """
+    return {'input': line, 'status': 'aborted', 'roots': [], 'error': error.message, 'limit': error.limit}
+
+
+def _error_record(line: str, error: Exception) -> dict:
+    """
+    Return the record of a line whose solution failed with the given unexpected error.
+    """
+    return {'input': line, 'status': 'error', 'roots': [], 'error': f'{type(error).__name__}: {error}'}
+
+
+def write_records(records: Iterable[dict], out: TextIO) -> int:
+    """
+    Write each record in records to out as a line of JSON, and return the number of records written.
+    """
+    count = 0
+
+    for record in records:
+        out.write(json.dumps(record))
+        out.write('\n')
+        count += 1
+
+    return count
+
+
+def solve_file(in_path: str, out_path: str, n: int = 5, workers: int = 1, chunksize: int = 256,
+               solutions: Optional[Any] = None, stats: Optional[Any] = None, budget: Optional[Any] = None) -> int:
+    """
+    Solve each equation in the file at in_path, one per line, and write their records
+    (see solve_lines) as JSON Lines to the file at out_path. A path of '-' refers to stdin
+    or stdout, respectively. Returns the number of equations solved.
+    If workers > 1, the equations are solved in parallel (see solve_parallel).
+    Otherwise, they are solved one at a time, looking up their solutions in solutions, if given,
+    and recording their stats in stats, if given (see solve_lines).
+    Either way, each equation is solved within budget, if given.
+
+    Preconditions:
+        - workers >= 1
+        - chunksize >= 1
+    """
+    in_file = open(sys.stdin.fileno() if in_path == '-' else in_path, buffering=BUFFER_SIZE,
+                   encoding='utf-8', closefd=in_path != '-')
+    out_file = open(sys.stdout.fileno() if out_path == '-' else out_path, 'w', buffering=BUFFER_SIZE,
+                    encoding='utf-8', closefd=out_path != '-')
+
+    with in_file, out_file:
+        if workers > 1:
+            return write_records(solve_parallel(in_file, n, workers, chunksize, budget), out_file)
+        else:
+            records = solve_lines(in_file, n, solutions=solutions, stats=stats, budget=budget)
+            return write_records(records, out_file)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0401'],
+        'extra-imports': ['budget', 'parse', 'json', 'math', 'os', 'sys', 'time', 'collections', 'concurrent.futures',
+                          'typing'],
+        'max-nested-blocks': 4
+    })
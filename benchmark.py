@@ -0,0 +1,912 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Benchmark Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for timing the equation solver on generated inputs.
+Running this module prints the results of every benchmark.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import gc
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+import poly
+from parse import *
+from arena import Arena
+from batch import classify, solve_lines, solve_parallel
+from cache import SolutionCache, SubtreeCache
+from delta import solve_trace
+
+# The most time, in seconds, that importing the modules of a text-only run may take
+# (see bench_startup), and the modules that such a run must never import.
+STARTUP_BUDGET = 0.1
+HEAVY_MODULES = {'numpy', 'networkx', 'matplotlib'}
+
+
+def product_of_binomials(k: int) -> str:
+    """
+    Return an equation string whose left side is a product of k binomials.
+    Only two of the binomials depend on x, so the equation stays quadratic,
+    but every factor doubles the number of terms created during distribution.
+
+    Preconditions:
+        - k >= 2
+
+    >>> product_of_binomials(3)
+    '((x + 1) * (x + -1) * (0x + 1)) = 0'
+    >>> get_equation(product_of_binomials(6)).solve(5, trace=False)[0] == {-1.0, 1.0}
+    True
+    """
+    factors = ['(x + 1)', '(x + -1)'] + ['(0x + 1)'] * (k - 2)
+    return f'({" * ".join(factors)}) = 0'
+
+
+def product_of_wide_sums(w: int) -> str:
+    """
+    Return a string representing a product of two sums of w monomials each, whose expansion
+    has w^2 terms before like terms are collected.
+
+    Preconditions:
+        - w >= 2
+
+    >>> product_of_wide_sums(2)
+    '((1 + x) * (1 + 2x))'
+    """
+    return f'(({" + ".join(str(get_unit(f"x^{i}")) for i in range(w))}) ' \
+           f'* ({" + ".join(str(get_unit(f"{i + 1}x^{i}")) for i in range(w))}))'
+
+
+def nested_sum(depth: int) -> str:
+    """
+    Return a string representing a sum nested depth levels deep.
+
+    >>> nested_sum(2)
+    '((x + 1) + 1)'
+    """
+    return '(' * depth + 'x' + ' + 1)' * depth
+
+
+def wide_sum(length: int) -> str:
+    """
+    Return a string representing a flat sum of length monomials.
+
+    >>> wide_sum(3)
+    '(x + 2x^2 + 3x^3)'
+    """
+    return f'({" + ".join(str(get_unit(f"{i}x^{i}")) for i in range(1, length + 1))})'
+
+
+def repeated_squares(k: int, shift: int) -> str:
+    """
+    Return an equation string whose left side is a sum of k copies of the square of (x + shift).
+
+    >>> repeated_squares(2, 3)
+    '(((x + 3) * (x + 3)) + ((x + 3) * (x + 3))) = -1'
+    """
+    return f'({" + ".join([f"((x + {shift}) * (x + {shift}))"] * k)}) = -1'
+
+
+def time_solve(string: str, trace: bool, repeat: int = 3) -> float:
+    """
+    Return the best time in seconds, over repeat runs, taken by Equation.solve on the
+    equation represented by string. Parsing is not included in the time.
+
+    Preconditions:
+        - string satisfies the preconditions of get_equation
+        - repeat >= 1
+    """
+    best = float('inf')
+
+    for _ in range(repeat):
+        eqn = get_equation(string)
+        start = time.perf_counter()
+        eqn.solve(5, trace)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def bench_trace(ks: tuple = (4, 6, 8, 10, 12), repeat: int = 3) -> None:
+    """
+    Print the time taken by Equation.solve with and without a trace on products of
+    k binomials for each k in ks, and check that both modes give the same solutions.
+    """
+    print('Equation.solve: trace vs. no trace (products of k binomials)')
+    print(f'{"k":>4} {"trace (s)":>12} {"no trace (s)":>14} {"speedup":>9}')
+
+    for k in ks:
+        string = product_of_binomials(k)
+        assert get_equation(string).solve(5)[0] == get_equation(string).solve(5, trace=False)[0]
+
+        with_trace = time_solve(string, True, repeat)
+        without_trace = time_solve(string, False, repeat)
+        print(f'{k:>4} {with_trace:>12.5f} {without_trace:>14.5f} {with_trace / without_trace:>8.1f}x')
+
+
+def bench_stream(sizes: tuple = (100, 200, 400)) -> None:
+    """
+    Print the peak memory and the time until the first graph is available, for Equation.solve (which
+    returns every graph at the end) and Equation.solve_iter (which yields each graph as soon as it is built),
+    on a nested sum of each size in sizes, and check that both give the same graphs.
+    """
+    print('Trace: Equation.solve vs. Equation.solve_iter (nested sums)')
+    print(f'{"size":>6} {"graphs":>7} {"solve first (s)":>16} {"solve KiB":>10} '
+          f'{"iter first (s)":>15} {"iter KiB":>9}')
+
+    for size in sizes:
+        string = f'{nested_sum(size)} = 1'
+        expected = get_equation(string).solve(5)[1]
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        graphs = get_equation(string).solve(5)[1]
+        solve_first = time.perf_counter() - start
+        solve_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        iter_first = None
+        for i, graph in enumerate(get_equation(string).solve_iter(5)):
+            if iter_first is None:
+                iter_first = time.perf_counter() - start
+            assert i == len(expected) or graph == expected[i]
+        iter_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert graphs == expected
+        print(f'{size:>6} {len(graphs):>7} {solve_first:>16.5f} {solve_peak / 1024:>10.0f} '
+              f'{iter_first:>15.5f} {iter_peak / 1024:>9.0f}')
+
+
+def bench_delta(sizes: tuple = (100, 200, 400)) -> None:
+    """
+    Print the memory held by the trace of Equation.solve (a list of full graphs) and by a DeltaTrace
+    of the same graphs (see delta.solve_trace), the time taken to build each, and the time taken to
+    rebuild every graph of the DeltaTrace, on a nested sum of each size in sizes.
+    Also check that the DeltaTrace gives back the same graphs.
+    """
+    print('Trace: graph snapshots vs. DeltaTrace (nested sums)')
+    print(f'{"size":>6} {"graphs":>7} {"list KiB":>10} {"delta KiB":>10} {"list (s)":>10} {"delta (s)":>10} '
+          f'{"rebuild (s)":>12}')
+
+    for size in sizes:
+        string = f'{nested_sum(size)} = 1'
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        graphs = get_equation(string).solve(5)[1]
+        list_time = time.perf_counter() - start
+        list_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        trace = solve_trace(get_equation(string), 5)[1]
+        delta_time = time.perf_counter() - start
+        delta_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        rebuilt = list(trace)
+        rebuild_time = time.perf_counter() - start
+
+        assert rebuilt == graphs
+        print(f'{size:>6} {len(graphs):>7} {list_bytes / 1024:>10.0f} {delta_bytes / 1024:>10.0f} '
+              f'{list_time:>10.5f} {delta_time:>10.5f} {rebuild_time:>12.5f}')
+
+
+def bench_persistent(ks: tuple = (4, 8, 12), threads: int = 4, repeat: int = 3) -> None:
+    """
+    Print the time taken to solve a product of k binomials for each k in ks by parsing it again
+    for every solve, and by solving one parsed equation again with persistent=True, and check that
+    threads threads solving that one equation at once all get the same solutions and trace.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    print('Equation.solve: parse and solve vs. persistent solve of one equation (products of k binomials)')
+    print(f'{"k":>4} {"parse+solve (s)":>16} {"persistent (s)":>15} {"speedup":>9}')
+
+    for k in ks:
+        string = product_of_binomials(k)
+        expected = get_equation(string).solve(5)
+        times = {'mutating': float('inf'), 'persistent': float('inf')}
+        eqn = get_equation(string)
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            get_equation(string).solve(5)
+            times['mutating'] = min(times['mutating'], time.perf_counter() - start)
+
+            start = time.perf_counter()
+            eqn.solve(5, persistent=True)
+            times['persistent'] = min(times['persistent'], time.perf_counter() - start)
+
+        with ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(lambda _: eqn.solve(5, persistent=True), range(threads)))
+
+        assert all(result == expected for result in results) and str(eqn) == str(get_equation(string))
+        print(f'{k:>4} {times["mutating"]:>16.5f} {times["persistent"]:>15.5f} '
+              f'{times["mutating"] / times["persistent"]:>8.1f}x')
+
+
+def bench_strings(sizes: tuple = (100, 300, 600), ks: tuple = (8, 12, 16)) -> None:
+    """
+    Print the time taken by Equation.solve with a trace on a nested sum of each size in sizes, and on a product
+    of k binomials for each k in ks, and the part of it spent building the strings of units (see Unit.__repr__),
+    as profiled by cProfile. Since each unit caches its string, each monomial label is only formatted once.
+    """
+    import cProfile
+    import pstats
+
+    print('Equation.solve: time spent formatting the labels of the trace (nested sums, products of k binomials)')
+    print(f'{"equation":>12} {"graphs":>7} {"solve (s)":>10} {"strings (s)":>12} {"share":>7}')
+
+    strings = [(f'nested {size}', f'{nested_sum(size)} = 1') for size in sizes] \
+        + [(f'product {k}', product_of_binomials(k)) for k in ks]
+
+    for name, string in strings:
+        eqn = get_equation(string)
+        profile = cProfile.Profile()
+        profile.enable()
+        graphs = eqn.solve(5)[1]
+        profile.disable()
+
+        stats = pstats.Stats(profile)
+        formatting = sum(row[3] for func, row in stats.stats.items() if func[2] == '__repr__')
+        print(f'{name:>12} {len(graphs):>7} {stats.total_tt:>10.5f} {formatting:>12.5f} '
+              f'{formatting / stats.total_tt:>6.1%}')
+
+
+def bench_render(size: int = 20, workers: tuple = (1, 2, 4), chunksize: int = 8) -> None:
+    """
+    Print the time taken to render every graph of the trace of a nested sum of the given size to PNG,
+    with a new pyplot figure per graph (as visualize.visualize does), and with render.render_all
+    (one reused Figure per process) for each number of worker processes in workers.
+    """
+    import io
+    import matplotlib
+    matplotlib.use('Agg')  # render without a display
+    import matplotlib.pyplot as plt
+    from render import render_all
+    from visualize import draw
+
+    graphs = get_equation(f'{nested_sum(size)} = 1').solve(5)[1]
+    print(f'Rendering: {len(graphs)} graphs of a nested sum of size {size} to PNG')
+    print(f'{"method":>24} {"time (s)":>10} {"graphs/s":>10}')
+
+    draw(graphs[0], plt.gca())  # import networkx before timing
+    plt.close('all')
+
+    start = time.perf_counter()
+    for graph in graphs:
+        figure = plt.figure()
+        draw(graph, figure.gca())
+        figure.savefig(io.BytesIO(), format='png')
+        plt.close(figure)
+    elapsed = time.perf_counter() - start
+    print(f'{"new figure per graph":>24} {elapsed:>10.3f} {len(graphs) / elapsed:>10.1f}')
+
+    for w in workers:
+        start = time.perf_counter()
+        count = sum(1 for _ in render_all(graphs, 'png', w, chunksize))
+        elapsed = time.perf_counter() - start
+        assert count == len(graphs)
+        print(f'{f"render_all, {w} worker(s)":>24} {elapsed:>10.3f} {len(graphs) / elapsed:>10.1f}')
+
+
+def bench_layout(sizes: tuple = (100, 400, 800), repeat: int = 3) -> None:
+    """
+    Print the time taken to lay out every graph of the trace of a nested sum of each size in sizes
+    with visualize.hierarchy_pos (including building the networkx graph it needs), with visualize.tree_pos,
+    and with visualize.tree_pos and a LayoutCache, and check that the layouts agree.
+    """
+    import networkx as nx
+    from visualize import LayoutCache, hierarchy_pos, tree_pos
+
+    print('Layout: hierarchy_pos vs. tree_pos (every graph of the trace of a nested sum)')
+    print(f'{"size":>6} {"graphs":>7} {"nodes":>8} {"networkx (s)":>13} {"tree_pos (s)":>13} {"cached (s)":>11}')
+
+    for size in sizes:
+        graphs = get_equation(f'{nested_sum(size)} = 1').solve(5)[1]
+        times = {'networkx': float('inf'), 'tree_pos': float('inf'), 'cached': float('inf')}
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            expected = []
+            for edges, _ in graphs:
+                g = nx.Graph()
+                if len(edges) == 1 and edges[0][0] == edges[0][1]:
+                    g.add_node(0)
+                else:
+                    g.add_edges_from(edges)
+                expected.append(hierarchy_pos(g, 0))
+            times['networkx'] = min(times['networkx'], time.perf_counter() - start)
+
+            start = time.perf_counter()
+            layouts = [tree_pos(graph) for graph in graphs]
+            times['tree_pos'] = min(times['tree_pos'], time.perf_counter() - start)
+
+            cache = LayoutCache()
+            start = time.perf_counter()
+            for graph in graphs:
+                tree_pos(graph, cache)
+            times['cached'] = min(times['cached'], time.perf_counter() - start)
+
+        assert all(abs(pos[i][0] - layout[i][0]) < 1e-9 and abs(pos[i][1] - layout[i][1]) < 1e-9
+                   for pos, layout in zip(expected, layouts) for i in pos)
+        print(f'{size:>6} {len(graphs):>7} {sum(len(graph[1]) for graph in graphs):>8} {times["networkx"]:>13.5f} '
+              f'{times["tree_pos"]:>13.5f} {times["cached"]:>11.5f}')
+
+
+def bench_dense(ws: tuple = (10, 20, 40, 80), repeat: int = 3) -> None:
+    """
+    Print the time taken by Unit.simplify with the tree and dense engines on products of two
+    sums of w monomials for each w in ws, and check that both engines give the same result.
+    """
+    print('Unit.simplify: tree vs. dense engine (products of two sums of w terms)')
+    print(f'{"w":>4} {"tree (s)":>12} {"dense (s)":>12} {"speedup":>9}')
+
+    for w in ws:
+        string = product_of_wide_sums(w)
+        times, results = {}, {}
+
+        for engine in ('tree', 'dense'):
+            times[engine] = float('inf')
+            for _ in range(repeat):
+                unit = get_unit(string)
+                start = time.perf_counter()
+                unit.simplify(False, engine)
+                times[engine] = min(times[engine], time.perf_counter() - start)
+            results[engine] = str(unit)
+
+        assert results['tree'] == results['dense']
+        print(f'{w:>4} {times["tree"]:>12.5f} {times["dense"]:>12.5f} {times["tree"] / times["dense"]:>8.1f}x')
+
+
+def bench_products(ks: tuple = (10, 20, 30, 100, 300), ws: tuple = (64, 256, 1024, 4096), repeat: int = 3) -> None:
+    """
+    Print the time taken by Unit.simplify (without a trace) on products of k copies of (x + 1) for each
+    k in ks, which used to create 2^k terms, and the time taken by poly_mul on two dense polynomials
+    of w terms each for each w in ws, with and without FFT, checking that both give the same result.
+    """
+    print('Unit.simplify: products of k binomials (x + 1)')
+    print(f'{"k":>4} {"time (s)":>12} {"terms":>7}')
+
+    for k in ks:
+        best = float('inf')
+        for _ in range(repeat):
+            unit = get_unit(f'({" * ".join(["(x + 1)"] * k)})')
+            start = time.perf_counter()
+            unit.simplify(trace=False)
+            best = min(best, time.perf_counter() - start)
+        print(f'{k:>4} {best:>12.5f} {len(unit.terms):>7}')
+
+    print()
+    print('poly_mul: direct vs. FFT (two polynomials of w terms)')
+    print(f'{"w":>5} {"direct (s)":>12} {"FFT (s)":>12} {"speedup":>9}')
+
+    threshold = poly.FFT_THRESHOLD
+    for w in ws:
+        p1 = {float(deg): float(deg % 7 - 3) for deg in range(w)}
+        p2 = {float(deg): float(deg % 5 + 1) for deg in range(w)}
+        times, results = {}, {}
+
+        for name in ('direct', 'fft'):
+            poly.FFT_THRESHOLD = threshold if name == 'fft' else float('inf')
+            times[name] = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                results[name] = poly.poly_mul(p1, p2)
+                times[name] = min(times[name], time.perf_counter() - start)
+
+        assert results['direct'] == results['fft']
+        print(f'{w:>5} {times["direct"]:>12.5f} {times["fft"]:>12.5f} {times["direct"] / times["fft"]:>8.1f}x')
+
+    poly.FFT_THRESHOLD = threshold
+
+
+def bench_powers(ks: tuple = (16, 64, 256, 1024), repeat: int = 3) -> None:
+    """
+    Print the time taken to raise (x + 1) to the power k for each k in ks, multiplying by (x + 1) one
+    factor at a time, and by repeated squaring (poly_pow), checking that both give the same result.
+    Also print the time taken by Unit.simplify on the string (x + 1)^k.
+    """
+    print('(x + 1)^k: one factor at a time vs. repeated squaring vs. Unit.simplify')
+    print(f'{"k":>5} {"one at a time (s)":>18} {"squaring (s)":>13} {"speedup":>9} {"simplify (s)":>13}')
+    binomial = {1: 1, 0: 1}  # int coefficients, so that both results are exact
+    poly.poly_mul({float(deg): 1.0 for deg in range(64)}, binomial)  # import NumPy before timing FFTs
+
+    for k in ks:
+        times, results = {}, {}
+        for name in ('linear', 'squaring', 'simplify'):
+            times[name] = float('inf')
+            for _ in range(repeat):
+                unit = get_unit(f'(x + 1)^{k}')
+                start = time.perf_counter()
+                if name == 'linear':
+                    results[name] = {0: 1}
+                    for _ in range(k):
+                        results[name] = poly.poly_mul(results[name], binomial)
+                elif name == 'squaring':
+                    results[name] = poly.poly_pow(binomial, k)
+                else:
+                    unit.simplify(trace=False)
+                times[name] = min(times[name], time.perf_counter() - start)
+
+        assert results['linear'] == results['squaring']
+        print(f'{k:>5} {times["linear"]:>18.5f} {times["squaring"]:>13.5f} '
+              f'{times["linear"] / times["squaring"]:>8.1f}x {times["simplify"]:>13.5f}')
+
+
+def bench_bound(ks: tuple = (10, 100, 1000), repeat: int = 3) -> None:
+    """
+    Print the time taken to reduce x^50 * (x + 1) * ... * (x + k) = 0 for each k in ks, which is how
+    Equation.solve used to find out that it is unsupported, and the time taken by Equation.solve, which now
+    rejects it by its degree bound. Also print the overhead of the bound on a supported equation of k factors.
+    """
+    print('Unsupported equations: reduce vs. solve (rejected by Equation.degree_bound)')
+    print(f'{"k":>5} {"reduce (s)":>12} {"solve (s)":>12} {"speedup":>9} {"bound overhead":>15}')
+
+    for k in ks:
+        factors = ' * '.join(f'(x + {i})' for i in range(1, k + 1))
+        supported = get_equation(f'({" * ".join(["(0x + 1)"] * k)} * (x + 1)) = 0')
+        times = {}
+        for name in ('reduce', 'solve', 'bound'):
+            times[name] = float('inf')
+            for _ in range(repeat):
+                eqn = get_equation(f'(x^50 * {factors}) = 0')
+                start = time.perf_counter()
+                if name == 'reduce':
+                    eqn.reduce(trace=False)
+                elif name == 'solve':
+                    assert classify(eqn.solve(5, trace=False)[0]) == 'unsupported'
+                else:
+                    supported.is_unsupported()
+                times[name] = min(times[name], time.perf_counter() - start)
+
+        start = time.perf_counter()
+        get_equation(str(supported)).solve(5, trace=False)
+        overhead = times['bound'] / (time.perf_counter() - start)
+        print(f'{k:>5} {times["reduce"]:>12.5f} {times["solve"]:>12.5f} '
+              f'{times["reduce"] / times["solve"]:>8.1f}x {overhead * 100:>14.1f}%')
+
+
+def bench_budget(ks: tuple = (1000, 2000, 4000), count: int = 200, max_seconds: float = 0.01,
+                 max_terms: int = 1000) -> None:
+    """
+    Print the time taken by solve_lines on count lines with one adversarial line, (x^2 + 1)^k = (x^(2k) + 3),
+    for each k in ks, without a budget, and with a Budget of max_seconds or of max_terms.
+    The adversarial line is aborted once the budget is exceeded, so the time of the batch stays about the same.
+    """
+    from budget import Budget
+
+    print(f'Budget: {count} lines with one adversarial line (x^2 + 1)^k, without and with a budget')
+    print(f'{"k":>6} {"no budget (s)":>14} {"time budget (s)":>16} {"terms budget (s)":>17}')
+
+    for k in ks:
+        lines = [product_of_binomials(4)] * (count - 1) + [f'(x^2 + 1)^{k} = (x^{2 * k} + 3)']
+        times, records = {}, {}
+        for name, budget in (('none', None), ('seconds', Budget(max_seconds=max_seconds)),
+                             ('terms', Budget(max_terms=max_terms))):
+            start = time.perf_counter()
+            records[name] = list(solve_lines(lines, budget=budget))
+            times[name] = time.perf_counter() - start
+
+        assert records['none'][:-1] == records['seconds'][:-1] == records['terms'][:-1]
+        assert records['seconds'][-1]['status'] == records['terms'][-1]['status'] == 'aborted'
+        print(f'{k:>6} {times["none"]:>14.5f} {times["seconds"]:>16.5f} {times["terms"]:>17.5f}')
+
+
+def bench_parse(sizes: tuple = (10, 100, 1000, 10000, 100000), repeat: int = 3) -> None:
+    """
+    Print the throughput of get_unit, in characters per second, on nested and flat sums
+    of each size in sizes.
+    """
+    print('get_unit: parse throughput (characters per second)')
+    print(f'{"size":>7} {"nested":>14} {"flat":>14}')
+
+    for size in sizes:
+        rates = []
+        for string in (nested_sum(size), wide_sum(size)):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                get_unit(string)
+                best = min(best, time.perf_counter() - start)
+            rates.append(len(string) / best)
+
+        print(f'{size:>7} {rates[0]:>14.0f} {rates[1]:>14.0f}')
+
+
+def bench_depth(sizes: tuple = (100, 1000, 10000, 100000), repeat: int = 3) -> None:
+    """
+    Print the time per node, in microseconds, taken by Unit.simplify (without a trace) and
+    Unit.get_graph on nested and flat sums of each size in sizes. Since neither recurses,
+    the time per node stays flat as the nesting gets deeper than the recursion limit.
+    """
+    print(f'simplify / get_graph: time per node (us), recursion limit {sys.getrecursionlimit()}')
+    print(f'{"size":>7} {"simplify nested":>16} {"simplify flat":>14} {"graph nested":>13} {"graph flat":>11}')
+
+    for size in sizes:
+        simplify_times, graph_times = [], []
+        for string in (nested_sum(size), wide_sum(size)):
+            simplify_best, graph_best = float('inf'), float('inf')
+            for _ in range(repeat):
+                unit = get_unit(string)
+                start = time.perf_counter()
+                unit.get_graph()
+                graph_best = min(graph_best, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                unit.simplify(trace=False)
+                simplify_best = min(simplify_best, time.perf_counter() - start)
+
+            simplify_times.append(simplify_best / (2 * size) * 1e6)  # each sum has about 2 * size nodes
+            graph_times.append(graph_best / (2 * size) * 1e6)
+
+        print(f'{size:>7} {simplify_times[0]:>16.3f} {simplify_times[1]:>14.3f} '
+              f'{graph_times[0]:>13.3f} {graph_times[1]:>11.3f}')
+
+
+def bench_parallel(workers: tuple = (1, 2, 4, 8, 16), count: int = 2000, chunksize: int = 64) -> None:
+    """
+    Print the throughput, in equations per second, of solve_parallel with each number of
+    workers in workers, on count products of 8 binomials, alongside the serial solve_lines.
+    """
+    lines = [product_of_binomials(8)] * count
+    print(f'solve_parallel: throughput on {count} products of 8 binomials (chunksize {chunksize})')
+    print(f'{"workers":>8} {"eqn/s":>10} {"speedup":>9}')
+
+    start = time.perf_counter()
+    expected = list(solve_lines(lines))
+    serial = count / (time.perf_counter() - start)
+    print(f'{"serial":>8} {serial:>10.0f} {1:>8.1f}x')
+
+    for k in workers:
+        start = time.perf_counter()
+        records = list(solve_parallel(lines, workers=k, chunksize=chunksize))
+        rate = count / (time.perf_counter() - start)
+        assert records == expected
+        print(f'{k:>8} {rate:>10.0f} {rate / serial:>8.1f}x')
+
+
+def bench_server(concurrency: tuple = (1, 8, 64, 256), count: int = 2000, workers: int = 1) -> None:
+    """
+    Print the latency percentiles and throughput of a SolveServer (see server.py) with the given number
+    of workers, solving count random equations (see loadgen.generate_equations) from each number of
+    concurrent connections in concurrency, next to the time taken to solve one equation by starting
+    a new process (python main.py --batch -), which is what the server saves on every request.
+    """
+    import asyncio
+    from loadgen import generate_equations, run_load
+    from server import SolveServer
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', '--batch', '-'], input='x^2 = 4\n', capture_output=True, text=True,
+                   check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    cold = time.perf_counter() - start
+
+    equations = generate_equations(count)
+
+    async def run_all() -> list[dict]:
+        async with SolveServer(workers) as server:
+            return [await run_load('127.0.0.1', server.port, equations, k) for k in concurrency]
+
+    print(f'SolveServer: latency under load ({workers} worker(s), {count} requests; '
+          f'a new process takes {cold * 1000:.1f} ms per equation)')
+    print(f'{"clients":>8} {"req/s":>8} {"p50 (ms)":>9} {"p99 (ms)":>9} {"max (ms)":>9} {"errors":>7}')
+
+    for report in asyncio.run(run_all()):
+        errors = report['requests'] - report['statuses'].get(200, 0)
+        print(f'{report["concurrency"]:>8} {report["throughput"]:>8.0f} {report["p50"] * 1000:>9.2f} '
+              f'{report["p99"] * 1000:>9.2f} {report["max"] * 1000:>9.2f} {errors:>7}')
+
+
+def bench_roots(counts: tuple = (100, 10000, 1000000), seed: int = 111) -> None:
+    """
+    Print the time taken to compute the roots of count random reduced quadratics for each count
+    in counts, one at a time with solve_reduced and all at once with dense.solve_quadratics.
+    """
+    import numpy as np
+    from dense import quadratic_roots, solve_quadratics
+
+    print('Roots of reduced quadratics: solve_reduced vs. solve_quadratics (as sets) and quadratic_roots (as arrays)')
+    print(f'{"count":>8} {"scalar (s)":>12} {"sets (s)":>12} {"arrays (s)":>12} {"speedup":>9}')
+    rng = random.Random(seed)
+
+    for count in counts:
+        a, b, c = ([rng.randint(-9, 9) for _ in range(count)] for _ in range(3))
+        a = [a_i if a_i != 0 else 1 for a_i in a]
+
+        start = time.perf_counter()
+        expected = [solve_reduced({2: a[i], 1: b[i], 0: c[i]}, 5) for i in range(count)]
+        scalar = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sols = solve_quadratics(a, b, c, 5)
+        vector = time.perf_counter() - start
+
+        a, b, c = np.array(a, dtype=float), np.array(b, dtype=float), np.array(c, dtype=float)
+        start = time.perf_counter()
+        quadratic_roots(a, b, c, 5)
+        arrays = time.perf_counter() - start
+
+        assert sols == expected
+        print(f'{count:>8} {scalar:>12.5f} {vector:>12.5f} {arrays:>12.5f} {scalar / arrays:>8.1f}x')
+
+
+def bench_cache(count: int = 2000, distinct: int = 20, k: int = 8, maxsize: int = 4096) -> None:
+    """
+    Print the time taken to solve count equations, drawn from only distinct different ones,
+    each with a sum of k repeated squares, with and without a SubtreeCache.
+    """
+    rng = random.Random(count)
+    lines = [repeated_squares(k, rng.randrange(distinct)) for _ in range(count)]
+    cache = SubtreeCache(maxsize)
+    print(f'SubtreeCache: {count} equations ({distinct} distinct) with {k} repeated squares each')
+
+    start = time.perf_counter()
+    expected = list(solve_lines(lines))
+    uncached = time.perf_counter() - start
+
+    start = time.perf_counter()
+    records = list(solve_lines(lines, cache=cache))
+    cached = time.perf_counter() - start
+
+    assert records == expected
+    print(f'no cache: {uncached:.5f} s, cache: {cached:.5f} s ({uncached / cached:.1f}x), stats: {cache.stats()}')
+
+
+def bench_solutions(count: int = 2000, distinct: int = 20, k: int = 6, maxsize: int = 4096) -> None:
+    """
+    Print the time taken to solve count equations, drawn from 2 * distinct different strings that
+    reduce to only distinct different equations, with and without a SolutionCache.
+    """
+    rng = random.Random(count)
+    lines = []
+    for _ in range(count):
+        root = rng.randrange(distinct)
+        if rng.random() < 0.5:
+            lines.append(f'({" * ".join(["(0x + 1)"] * k)} * (x + {-root}) * x) = 0')
+        else:
+            lines.append(f'(x^2 + {-root}x) = 0')
+
+    print(f'SolutionCache: {count} equations ({2 * distinct} distinct strings, {distinct} distinct reduced forms)')
+
+    start = time.perf_counter()
+    expected = list(solve_lines(lines))
+    uncached = time.perf_counter() - start
+
+    for front_size in (0, maxsize):
+        solutions = SolutionCache(maxsize, front_size=front_size)
+        start = time.perf_counter()
+        records = list(solve_lines(lines, solutions=solutions))
+        cached = time.perf_counter() - start
+
+        assert records == expected
+        print(f'no cache: {uncached:.5f} s, cache (front size {front_size}): {cached:.5f} s '
+              f'({uncached / cached:.1f}x), stats: {solutions.stats()}')
+
+
+class DictMonoData(MonoData):
+    """
+    A MonoData that, like every object before Expr used __slots__, stores its attributes in a __dict__.
+    """
+
+
+class DictUnit(Unit):
+    """
+    A Unit that, like every object before Expr used __slots__, stores its attributes in a __dict__.
+    """
+
+
+def count_nodes(unit: Unit) -> int:
+    """
+    Return the number of Units in the tree represented by unit.
+    """
+    count = 0
+    stack = [unit]
+
+    while len(stack) > 0:
+        node = stack.pop()
+        count += 1
+        if node.op != 'x':
+            stack.extend(node.terms)
+
+    return count
+
+
+def to_dict_unit(unit: Unit) -> DictUnit:
+    """
+    Return a copy of the tree represented by unit made of DictUnits and DictMonoData.
+    """
+    if unit.op == 'x':
+        return DictUnit('x', [DictMonoData('coeff', unit.terms[0].value), DictMonoData('deg', unit.terms[1].value)])
+    else:
+        return DictUnit(unit.op, [to_dict_unit(term) for term in unit.terms])
+
+
+def measure(build: Callable[[], Any]) -> tuple[Any, int]:
+    """
+    Return the result of calling build(), and the number of bytes it allocated that are still in use.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (result, after - before)
+
+
+def bench_memory(count: int = 1000, k: int = 6) -> None:
+    """
+    Print the memory used per node to store count equations, each with a product of k
+    binomials on the left, as Units with a __dict__, as Units with __slots__, and in an Arena.
+    """
+    strings = [product_of_binomials(k) for _ in range(count)]
+    nodes = sum(count_nodes(eqn.left) + count_nodes(eqn.right) for eqn in map(get_equation, strings))
+    print(f'Memory: {count} equations with {nodes} nodes in total')
+    print(f'{"representation":>16} {"bytes":>12} {"bytes/node":>12}')
+
+    eqns, slotted = measure(lambda: [get_equation(string) for string in strings])
+    _, dicts = measure(lambda: [(to_dict_unit(eqn.left), to_dict_unit(eqn.right)) for eqn in eqns])
+
+    def build_arena() -> Arena:
+        arena = Arena()
+        for eqn in eqns:
+            arena.add_equation(eqn)
+        return arena
+
+    arena, arrays = measure(build_arena)
+    assert all(str(arena.get_equation(2 * i)) == str(eqns[i]) for i in range(count))
+
+    for name, size in (('__dict__', dicts), ('__slots__', slotted), ('Arena', arrays)):
+        print(f'{name:>16} {size:>12} {size / nodes:>12.1f}')
+    print(f'Arena.nbytes: {arena.nbytes()} ({arena.nbytes() / nodes:.1f} bytes/node)')
+
+
+def bench_serialize(counts: tuple = (10000, 100000), seed: int = 111) -> None:
+    """
+    Print the size of a corpus of count random equations (see loadgen.generate_equations) for each count in
+    counts, as text, pickled Equations and a file of encoded equations (see serialize.py), and the time taken
+    to load it by parsing the text, unpickling, reading the file in bulk, and opening it as an EquationFile
+    and decoding its last equation. Check that the equations read back are the same as the parsed ones.
+    """
+    import pickle
+    import tempfile
+    from loadgen import generate_equations
+    from serialize import EquationFile, read_equations, write_equations
+
+    print('Serialization: loading a corpus of parsed equations')
+    print(f'{"count":>8} {"text (MB)":>10} {"pickle (MB)":>12} {"file (MB)":>10} {"parse (s)":>10} '
+          f'{"unpickle (s)":>13} {"read (s)":>9} {"open (ms)":>10} {"speedup":>8}')
+
+    for count in counts:
+        strings = generate_equations(count, seed, depth=2)
+
+        start = time.perf_counter()
+        eqns = [get_equation(string) for string in strings]
+        parse_time = time.perf_counter() - start
+
+        data = pickle.dumps(eqns, pickle.HIGHEST_PROTOCOL)
+        gc.collect()
+        start = time.perf_counter()
+        pickle.loads(data)
+        unpickle_time = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'corpus.eqt')
+            write_equations(path, eqns)
+            size = os.path.getsize(path)
+
+            gc.collect()
+            start = time.perf_counter()
+            with EquationFile(path) as corpus:
+                last = corpus[-1]
+            open_time = time.perf_counter() - start
+
+            gc.collect()
+            start = time.perf_counter()
+            loaded = read_equations(path)
+            read_time = time.perf_counter() - start
+
+        assert [str(eqn) for eqn in loaded] == [str(eqn) for eqn in eqns] and str(last) == str(eqns[-1])
+        print(f'{count:>8} {sum(map(len, strings)) / 1e6:>10.1f} {len(data) / 1e6:>12.1f} {size / 1e6:>10.1f} '
+              f'{parse_time:>10.3f} {unpickle_time:>13.3f} {read_time:>9.3f} {open_time * 1000:>10.3f} '
+              f'{parse_time / read_time:>7.1f}x')
+
+
+def import_times(args: list[str]) -> dict[str, float]:
+    """
+    Run this Python with -X importtime and the given arguments (on an equation given on stdin),
+    and return the cumulative time, in seconds, taken to import each top-level module it imported.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, input='x^2 = 4\n',
+                            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    times = {}
+
+    for line in result.stderr.splitlines():
+        # Each line is 'import time: <self us> | <cumulative us> | <indented module name>'
+        if line.startswith('import time:'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit() and not name[1:].startswith(' '):  # top-level imports only
+                times[name.strip()] = int(cumulative) / 1e6
+
+    return times
+
+
+def bench_startup(budget: float = STARTUP_BUDGET) -> None:
+    """
+    Print the time taken to import every top-level module in a text-only run (solving one equation
+    in batch mode, and importing the interactive mode), and check that it is within budget seconds
+    and that no module in HEAVY_MODULES is imported.
+    """
+    print(f'Startup: import time of text-only runs (budget {budget:.3f} s)')
+    baseline = sum(import_times(['-c', 'pass']).values())  # the modules Python imports on its own
+
+    for name, args in (('batch', ['main.py', '--batch', '-']), ('interactive', ['-c', 'import main'])):
+        times = import_times(args)
+        total = sum(times.values()) - baseline
+        heavy = {module for module in times if module.split('.')[0] in HEAVY_MODULES}
+        slowest = sorted(times, key=times.get, reverse=True)[:3]
+
+        print(f'{name}: {total:.5f} s, slowest: {", ".join(f"{m} {times[m]:.5f} s" for m in slowest)}')
+        assert total <= budget, f'{name} startup took {total:.5f} s, over the budget of {budget} s'
+        assert len(heavy) == 0, f'{name} startup imported {", ".join(sorted(heavy))}'
+
+
+if __name__ == '__main__':
+    bench_trace()
+    print()
+    bench_stream()
+    print()
+    bench_delta()
+    print()
+    bench_persistent()
+    print()
+    bench_strings()
+    print()
+    bench_layout()
+    print()
+    bench_render()
+    print()
+    bench_dense()
+    print()
+    bench_products()
+    print()
+    bench_powers()
+    print()
+    bench_bound()
+    print()
+    bench_budget()
+    print()
+    bench_parse()
+    print()
+    bench_depth()
+    print()
+    bench_parallel()
+    print()
+    bench_server()
+    print()
+    bench_roots()
+    print()
+    bench_cache()
+    print()
+    bench_solutions()
+    print()
+    bench_memory()
+    print()
+    bench_serialize()
+    print()
+    bench_startup()
@@ -0,0 +1,176 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Budget Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains the Budget class, which limits how much work Equation.solve may do on one equation,
+and the BudgetExceeded error raised when a limit is hit. Limits are opt-in: a Budget is only
+checked when it is passed as the budget argument of Equation.solve (or Unit.simplify,
+batch.solve_lines, etc.), and the solver checks nothing when budget is None.
+
+The limits are checked cooperatively, i.e., between the steps of the simplification rather than
+during them, so a single step (e.g., one multiplication of polynomials) is never interrupted.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import time
+from typing import Optional
+
+
+class BudgetExceeded(RuntimeError):
+    """
+    An error raised when solving an equation exceeds a limit of its Budget.
+
+    Instance Attributes:
+        - limit: Which limit was exceeded: 'terms', 'nodes', 'graphs' or 'seconds'.
+        - message: A description of what went wrong.
+
+    Representation Invariants:
+        - self.limit in {'terms', 'nodes', 'graphs', 'seconds'}
+    """
+    limit: str
+    message: str
+
+    def __init__(self, limit: str, message: str) -> None:
+        """
+        Initialize a BudgetExceeded error.
+        """
+        super().__init__(message)
+        self.limit = limit
+        self.message = message
+
+
+class Budget:
+    """
+    Limits on the work done to solve one equation. A limit of None means no limit.
+
+    Instance Attributes:
+        - max_terms: The most terms in a flattened sum, or in the product of two polynomials
+                     (as predicted before multiplying them, see poly.poly_mul).
+        - max_nodes: The most sums and products simplified by the tree engine.
+        - max_graphs: The most graphs built for the trace (see Unit.get_graph).
+        - max_seconds: The most time spent, in seconds.
+        - nodes: The number of sums and products simplified since the last call to start.
+        - graphs: The number of graphs built since the last call to start.
+        - deadline: The time.perf_counter() at which max_seconds run out (or the earlier time until
+                    given to start), or float('inf').
+
+    Representation Invariants:
+        - self.max_terms is None or self.max_terms >= 0
+        - self.max_nodes is None or self.max_nodes >= 0
+        - self.max_graphs is None or self.max_graphs >= 0
+        - self.max_seconds is None or self.max_seconds >= 0
+
+    >>> budget = Budget(max_terms=100)
+    >>> budget.start()
+    >>> budget.check_terms(100)
+    >>> try:
+    ...     budget.check_terms(101)
+    ... except BudgetExceeded as error:
+    ...     print(error.limit, error)
+    terms 101 terms, over the limit of 100
+    >>> budget.start(until=time.perf_counter())
+    >>> try:
+    ...     budget.check_time()
+    ... except BudgetExceeded as error:
+    ...     print(error.limit, error)
+    seconds ran past its deadline
+    """
+    max_terms: Optional[int]
+    max_nodes: Optional[int]
+    max_graphs: Optional[int]
+    max_seconds: Optional[float]
+    nodes: int
+    graphs: int
+    deadline: float
+    # Private Instance Attributes:
+    #     - _cut: Whether deadline is the time until given to start, rather than when max_seconds run out.
+    _cut: bool
+
+    def __init__(self, max_terms: Optional[int] = None, max_nodes: Optional[int] = None,
+                 max_graphs: Optional[int] = None, max_seconds: Optional[float] = None) -> None:
+        """
+        Initialize a Budget with the given limits, and start it.
+        """
+        self.max_terms = max_terms
+        self.max_nodes = max_nodes
+        self.max_graphs = max_graphs
+        self.max_seconds = max_seconds
+        self.start()
+
+    def __repr__(self) -> str:
+        """
+        Return a string representing this Budget.
+        """
+        return (f'Budget(max_terms={self.max_terms}, max_nodes={self.max_nodes}, '
+                f'max_graphs={self.max_graphs}, max_seconds={self.max_seconds})')
+
+    def start(self, until: Optional[float] = None) -> None:
+        """
+        Reset the work done so far, and start the clock for max_seconds. If until is given, the time is
+        also up at the time.perf_counter() until, if that is sooner (e.g., at the deadline of a whole batch).
+        batch.solve_line and batch.solve_batch call this before parsing each line, so that each equation
+        gets the whole budget, which covers parsing it and bounding its degree (see Equation.is_unsupported)
+        as well as reducing it.
+        """
+        self.nodes = 0
+        self.graphs = 0
+        self.deadline = float('inf') if self.max_seconds is None else time.perf_counter() + self.max_seconds
+        self._cut = until is not None and until < self.deadline
+        if self._cut:
+            self.deadline = until
+
+    def check_time(self) -> None:
+        """
+        Raise a BudgetExceeded error if max_seconds have passed since the last call to start
+        (or if its time until has passed).
+        """
+        if time.perf_counter() > self.deadline:
+            if self._cut:
+                raise BudgetExceeded('seconds', 'ran past its deadline')
+            raise BudgetExceeded('seconds', f'took over the limit of {self.max_seconds} seconds')
+
+    def check_terms(self, terms: int) -> None:
+        """
+        Raise a BudgetExceeded error if terms is over max_terms, or if the time is up (see check_time).
+        """
+        if self.max_terms is not None and terms > self.max_terms:
+            raise BudgetExceeded('terms', f'{terms} terms, over the limit of {self.max_terms}')
+        self.check_time()
+
+    def add_node(self) -> None:
+        """
+        Record that a sum or product is about to be simplified, and raise a BudgetExceeded error
+        if this is over max_nodes, or if the time is up (see check_time).
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded('nodes', f'over the limit of {self.max_nodes} sums and products')
+        self.check_time()
+
+    def add_graph(self) -> None:
+        """
+        Record that a graph is about to be built, and raise a BudgetExceeded error if this is
+        over max_graphs, or if the time is up (see check_time).
+        """
+        self.graphs += 1
+        if self.max_graphs is not None and self.graphs > self.max_graphs:
+            raise BudgetExceeded('graphs', f'over the limit of {self.max_graphs} graphs')
+        self.check_time()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101'],
+        'extra-imports': ['time', 'typing'],
+        'max-nested-blocks': 4
+    })
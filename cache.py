@@ -0,0 +1,456 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Cache Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains the SubtreeCache class, which interns identical subtrees so that they
+share one node, and remembers the simplified polynomial of each one. Repeated
+subexpressions, like (x + 3) in ((x + 3) * (x + 3)), and repeated equations
+then cost a lookup instead of being expanded again.
+
+Also contains the SolutionCache class, which remembers the solutions of whole
+equations by their reduced form, so that equations which are written
+differently but reduce to the same polynomial are only solved once.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import json
+import sqlite3
+from collections import OrderedDict
+from parse import *
+from poly import poly_pow, poly_prod, poly_sum
+
+
+class SubtreeCache:
+    """
+    A bounded table of interned subtrees and their simplified polynomials (see poly.py).
+
+    Each subtree has a canonical key:
+        - ('x', coeff, deg) for a monomial;
+        - (op, uids) for a sum or product, where uids is the sorted tuple of the uids of the entries
+          of its terms (sorted because sums and products are commutative), or for a power, where
+          uids is the tuple of the uids of the entries of its base and its power, in that order.
+    Since a key refers to the terms by uid, it takes time proportional to the number of terms to
+    compute, not to the size of the subtree. Identical subtrees have the same key, and so share
+    one entry [uid, node, poly], where node is the interned node of the subtree and poly is its
+    simplified polynomial. Interned nodes are shared, so they must never be mutated.
+    The poly of an entry is only computed when it is first needed (see SubtreeCache.poly), and is None
+    until then, so that interning a subtree (see SubtreeCache.intern) never expands it.
+
+    When there are more than maxsize entries, the least recently used entry is evicted.
+    Uids are never reused, so a key that refers to an evicted entry can only miss.
+
+    A subtree that is itself an interned node (e.g., a term of an equation parsed with this cache,
+    see SubtreeCache.intern_terms) is looked up by its identity, without visiting its own terms
+    (unless its poly is needed but not yet computed).
+
+    Instance Attributes:
+        - maxsize: The maximum number of entries.
+        - hits: The number of subtrees whose entry was found.
+        - misses: The number of subtrees whose entry had to be created.
+        - evictions: The number of entries evicted to make room for new ones.
+
+    Representation Invariants:
+        - self.maxsize >= 1
+        - len(self._entries) <= self.maxsize
+
+    >>> cache = SubtreeCache()
+    >>> prod = Unit('*', [Unit('+', [mono(1, 1), mono(3, 0)]), Unit('+', [mono(3, 0), mono(1, 1)])])
+    >>> _ = prod.simplify(cache=cache)  # (x + 3)(3 + x)
+    >>> print(prod)
+    (x^2 + 6x + 9)
+    >>> cache.stats()
+    {'size': 4, 'maxsize': 4096, 'hits': 3, 'misses': 4, 'evictions': 0, 'hit_rate': 0.42857}
+    >>> factor = Unit('+', [mono(1, 1), mono(3, 0)])
+    >>> cache.intern(factor) is cache.intern(Unit('+', [mono(3, 0), mono(1, 1)]))
+    True
+    >>> eqn = get_equation('((x + 3) * (x + 3)) = (x + 3)', cache)
+    >>> eqn.left.terms[0] is eqn.left.terms[1] is cache.intern(factor)
+    True
+    >>> eqn.solve(5, trace=False, cache=cache)[0] == {-3.0, -2.0}
+    True
+    >>> cache.intern(factor)  # interned nodes are not rewritten
+    (x + 3)
+    """
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    # Private Instance Attributes:
+    #     - _entries: The entries (uid, node, poly) by key, from least to most recently used.
+    #     - _next_uid: The uid of the next entry to be created.
+    #     - _keys: The key of each entry, by the id of its node.
+    _entries: OrderedDict
+    _next_uid: int
+    _keys: dict[int, tuple]
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        """
+        Initialize an empty SubtreeCache with at most maxsize entries.
+
+        Preconditions:
+            - maxsize >= 1
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._next_uid = 0
+        self._keys = {}
+
+    def __len__(self) -> int:
+        """
+        Return the number of entries in this cache.
+        """
+        return len(self._entries)
+
+    def intern(self, unit: Unit) -> Unit:
+        """
+        Return the interned node of unit, which is shared by every subtree identical to unit.
+        The returned node must not be mutated.
+        """
+        return self._lookup(unit, False)[1]
+
+    def intern_terms(self, unit: Unit) -> Unit:
+        """
+        Return a new unit with the op of unit, whose terms are the interned nodes of the terms of unit
+        (or unit itself, if it is a monomial). So identical subtrees of the returned unit, and of every
+        other unit returned by this method, share one node, while the returned unit itself can still
+        be rewritten in place by Unit.simplify with this cache.
+        """
+        if unit.op == 'x':
+            return unit
+        return Unit(unit.op, [self.intern(term) for term in unit.terms])
+
+    def poly(self, unit: Unit) -> dict[float, float]:
+        """
+        Return the simplified polynomial of unit (see poly.py).
+        The returned dict is shared with the cache, so it must not be mutated.
+        """
+        return self._lookup(unit, True)[2]
+
+    def stats(self) -> dict:
+        """
+        Return a dict of the size and counters of this cache, and its hit rate rounded to 5 decimal places.
+        """
+        lookups = self.hits + self.misses
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': round(self.hits / lookups, 5) if lookups > 0 else 0.0}
+
+    def clear(self) -> None:
+        """
+        Remove every entry from this cache, and reset its counters.
+        """
+        self.__init__(self.maxsize)
+
+    def _lookup(self, unit: Unit, poly: bool) -> list:
+        """
+        Return the entry [uid, node, poly] of unit, creating the entries of unit and its subtrees as needed.
+        If poly is True, the polys of unit and its subtrees are also computed as needed.
+
+        The subtrees are visited bottom-up with an explicit stack, so that every term's entry is
+        known before its parent's key is computed.
+        """
+        found = {}  # the entry of each node of unit visited so far, by id
+        stack = [unit]
+
+        while len(stack) > 0:
+            node = stack[-1]
+            if id(node) in found:
+                stack.pop()
+                continue
+
+            key = self._keys.get(id(node))
+            if key is not None and (not poly or self._entries[key][2] is not None):  # its terms need not be visited
+                stack.pop()
+                self.hits += 1
+                self._entries.move_to_end(key)
+                found[id(node)] = self._entries[key]
+                continue
+
+            if node.op != 'x':
+                unvisited = [term for term in node.terms if id(term) not in found]
+                if len(unvisited) > 0:
+                    stack.extend(unvisited)
+                    continue
+
+            stack.pop()
+            found[id(node)] = self._get_entry(node, found, poly)
+
+        return found[id(unit)]
+
+    def _get_entry(self, node: Unit, found: dict, poly: bool) -> list:
+        """
+        Return the entry [uid, node, poly] of node, creating it if it is not in this cache,
+        and computing its poly if poly is True and it has none yet.
+
+        Preconditions:
+            - node.op == 'x' or all(id(term) in found for term in node.terms)
+            - not poly or node.op == 'x' or all(found[id(term)][2] is not None for term in node.terms)
+        """
+        if node.op == 'x':
+            key = ('x', node.terms[0].value, node.terms[1].value)
+        else:
+            uids = tuple(found[id(term)][0] for term in node.terms)
+            key = (node.op, uids if node.op == '^' else tuple(sorted(uids)))
+
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            if node.op == 'x':
+                entry = [self._next_uid, mono(key[1], key[2]), None]
+            else:
+                entry = [self._next_uid, Unit(node.op, [found[id(term)][1] for term in node.terms]), None]
+
+            self._next_uid += 1
+            self._entries[key] = entry
+            self._keys[id(entry[1])] = key
+
+            if len(self._entries) > self.maxsize:
+                del self._keys[id(self._entries.popitem(last=False)[1][1])]
+                self.evictions += 1
+
+        if poly and entry[2] is None:
+            if node.op == 'x':
+                coeff, deg = key[1], key[2]
+                entry[2] = {deg: coeff} if coeff != 0 else {}
+            else:
+                polys = [found[id(term)][2] for term in node.terms]
+                if node.op == '^':
+                    entry[2] = poly_pow(polys[0], int(node.terms[1].terms[0].value))
+                else:
+                    entry[2] = poly_sum(polys) if node.op == '+' else poly_prod(polys)
+
+        return entry
+
+
+class SolutionCache:
+    """
+    A bounded cache of the solutions of equations, by their canonical reduced form.
+
+    The canonical key of an equation is (n, terms), where n is the number of decimal places of the
+    solutions and terms is the sorted tuple of the pairs (deg, coeff) of the equation's reduced
+    coeff_by_deg (see Equation.reduce) with nonzero coefficients. So, for example,
+    x^2 = (x + 1) and (x^2 + -1x + -1) = 0 have the same key, and are only solved once.
+
+    When there are more than maxsize solution sets, the least recently used one is evicted.
+    If a path is given, solution sets are also stored in an SQLite database at that path, which
+    is checked after this cache and before solving, so that they survive restarts.
+    If front_size > 0, up to front_size solution sets are also cached by the input string itself
+    (see solve_string), so that repeated strings are not even parsed.
+
+    Instance Attributes:
+        - maxsize: The maximum number of solution sets cached by key.
+        - front_size: The maximum number of solution sets cached by input string.
+        - hits: The number of solution sets found in this cache by key.
+        - front_hits: The number of solution sets found in this cache by input string.
+        - disk_hits: The number of solution sets found in the database.
+        - misses: The number of solution sets that had to be computed.
+        - evictions: The number of solution sets cached by key evicted to make room for new ones.
+        - front_evictions: The number of solution sets cached by input string evicted to make room for new ones.
+
+    Representation Invariants:
+        - self.maxsize >= 1
+        - self.front_size >= 0
+        - len(self._entries) <= self.maxsize
+        - len(self._front) <= self.front_size
+
+    >>> solutions = SolutionCache(front_size=16)
+    >>> solutions.solve_string('x^2 = (x + 1)', 5) == {-0.61803, 1.61803}
+    True
+    >>> solutions.solve_string('(x^2 + -1x + -1) = 0', 5) == {-0.61803, 1.61803}
+    True
+    >>> solutions.solve_string('x^2 = (x + 1)', 5) == {-0.61803, 1.61803}
+    True
+    >>> solutions.stats()  # doctest: +NORMALIZE_WHITESPACE
+    {'size': 1, 'front_size': 2, 'hits': 1, 'front_hits': 1, 'disk_hits': 0, 'misses': 1, 'evictions': 0,
+     'front_evictions': 0, 'hit_rate': 0.66667}
+    """
+    maxsize: int
+    front_size: int
+    hits: int
+    front_hits: int
+    disk_hits: int
+    misses: int
+    evictions: int
+    front_evictions: int
+    # Private Instance Attributes:
+    #     - _entries: The solution sets by key, from least to most recently used.
+    #     - _front: The solution sets by (input string, n), from least to most recently used.
+    #     - _db: The connection to the database, or None if there is no database.
+    _entries: OrderedDict
+    _front: OrderedDict
+    _db: Optional[sqlite3.Connection]
+
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None, front_size: int = 0) -> None:
+        """
+        Initialize an empty SolutionCache, backed by the database at path if path is not None.
+
+        Preconditions:
+            - maxsize >= 1
+            - front_size >= 0
+        """
+        self.maxsize = maxsize
+        self.front_size = front_size
+        self.hits = 0
+        self.front_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.front_evictions = 0
+        self._entries = OrderedDict()
+        self._front = OrderedDict()
+        self._db = None
+
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, sols TEXT NOT NULL)')
+
+    def __enter__(self) -> 'SolutionCache':
+        """
+        Return this cache, to be closed at the end of a with statement.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Close this cache at the end of a with statement.
+        """
+        self.close()
+
+    def solve(self, eqn: Equation, n: int, cache: Optional[SubtreeCache] = None,
+              budget: Optional[Any] = None) -> set[float]:
+        """
+        Return the solutions of eqn, rounded to n decimal places, as in Equation.solve.
+        eqn is reduced without a trace (using cache and budget, if given), but its roots are only
+        computed if they are not already in this cache.
+        """
+        if eqn.is_unsupported():  # no need to reduce it
+            return {float('nan')}
+        return self.solve_reduced(eqn.reduce(False, cache=cache, budget=budget)[0], n)
+
+    def solve_reduced(self, coeff_by_deg: dict[float, float], n: int) -> set[float]:
+        """
+        Return the solutions of the reduced equation given by coeff_by_deg, as in equation.solve_reduced,
+        computing them only if they are not already in this cache.
+        """
+        key = (n, tuple(sorted((deg, coeff_by_deg[deg]) for deg in coeff_by_deg if coeff_by_deg[deg] != 0)))
+
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return set(self._entries[key])
+
+        sols = self._load(key)
+        if sols is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            sols = frozenset(solve_reduced(coeff_by_deg, n))
+            self._save(key, sols)
+
+        if self._put(self._entries, key, sols, self.maxsize):
+            self.evictions += 1
+        return set(sols)
+
+    def solve_string(self, string: str, n: int, cache: Optional[SubtreeCache] = None,
+                     budget: Optional[Any] = None) -> set[float]:
+        """
+        Return the solutions of the equation represented by string, as in solve.
+        If string was recently solved to n decimal places, it is not parsed again.
+
+        Preconditions:
+            - string satisfies the preconditions of get_equation
+        """
+        if self.front_size == 0:
+            return self.solve(get_equation(string, cache), n, cache, budget)
+
+        key = (string, n)
+        if key in self._front:
+            self.front_hits += 1
+            self._front.move_to_end(key)
+            return set(self._front[key])
+
+        sols = frozenset(self.solve(get_equation(string, cache), n, cache, budget))
+        if self._put(self._front, key, sols, self.front_size):
+            self.front_evictions += 1
+        return set(sols)
+
+    def stats(self) -> dict:
+        """
+        Return a dict of the sizes and counters of this cache, and its overall hit rate rounded to 5 decimal places.
+        """
+        hits = self.hits + self.front_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {'size': len(self._entries), 'front_size': len(self._front), 'hits': self.hits,
+                'front_hits': self.front_hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'front_evictions': self.front_evictions,
+                'hit_rate': round(hits / lookups, 5) if lookups > 0 else 0.0}
+
+    def flush(self) -> None:
+        """
+        Write any solution sets not yet written to the database, if there is one.
+        """
+        if self._db is not None:
+            self._db.commit()
+
+    def close(self) -> None:
+        """
+        Flush this cache, and close its database, if there is one.
+        """
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def _put(self, table: OrderedDict, key: Any, sols: frozenset, maxsize: int) -> bool:
+        """
+        Add sols to table under key, evicting the least recently used entry if table has more than maxsize entries.
+        Return whether an entry was evicted.
+        """
+        table[key] = sols
+
+        if len(table) > maxsize:
+            table.popitem(last=False)
+            return True
+        return False
+
+    def _load(self, key: tuple) -> Optional[frozenset]:
+        """
+        Return the solution set stored in the database under key, or None if there is none.
+        """
+        if self._db is None:
+            return None
+
+        row = self._db.execute('SELECT sols FROM solutions WHERE key = ?', (json.dumps(key),)).fetchone()
+        return frozenset(json.loads(row[0])) if row is not None else None
+
+    def _save(self, key: tuple, sols: frozenset) -> None:
+        """
+        Store sols in the database under key, if there is a database.
+        """
+        if self._db is not None:
+            self._db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?)',
+                             (json.dumps(key), json.dumps(sorted(sols))))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0401'],
+        'extra-imports': ['parse', 'poly', 'collections', 'json', 'sqlite3'],
+        'max-nested-blocks': 4
+    })
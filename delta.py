@@ -0,0 +1,236 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Delta Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains the DeltaTrace class, a compact representation of the graphs of a trace
+(see Equation.solve and Equation.solve_iter). Instead of a full copy of the edges and labels
+of every graph, a delta trace stores each graph as the parts that are new since the earlier
+graphs, plus a reference to the parts that are not.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+from array import array
+from typing import Iterable, Iterator
+from parse import *
+
+# The number of bytes of each token in DeltaTrace.pool.
+WIDTH = array('I').itemsize
+
+
+class DeltaTrace:
+    """
+    A sequence of graphs (see Unit.get_graph and merge_graphs), stored as deltas of each other.
+
+    Each node of a graph is encoded as a token: the pair of its label and the offset from its
+    parent's id to its own id (0 for the root). Since the ids of a graph are given in pre-order,
+    a graph is determined by the tokens of its nodes in order of id, and the tokens of a subtree
+    are the same wherever it appears, e.g., in the graph of its parent. So when a unit's graph is
+    added after the graph of an ancestor, or an equation's graph after the graphs of its sides,
+    all of its tokens but the root's are already stored.
+
+    The tokens of all graphs share one pool, and the graph at index i is the token self.roots[i]
+    followed by the tokens in the range self.starts[i]:self.ends[i] of the pool. A graph only adds
+    the tokens to the pool that cannot be found there in order, i.e., a step of a trace adds the
+    nodes it created, and refers to the nodes it kept. Every graph can be rebuilt from the pool
+    directly, in time linear in its size, without replaying the steps before it.
+
+    Instance Attributes:
+        - labels: The label of each token.
+        - offsets: The offset of each token.
+        - pool: The ids of the tokens of all graphs, as WIDTH-byte unsigned ints.
+        - roots: The id of the root token of each graph.
+        - starts: The start in the pool (in tokens) of the non-root tokens of each graph.
+        - ends: The end in the pool (in tokens) of the non-root tokens of each graph.
+
+    Representation Invariants:
+        - len(self.labels) == len(self.offsets)
+        - len(self.roots) == len(self.starts) == len(self.ends)
+        - len(self.pool) % WIDTH == 0
+
+    >>> eqn = get_equation('((x + 1) * (x + 2)) = 3x')
+    >>> _, graphs = eqn.solve(5)
+    >>> trace = DeltaTrace(graphs)
+    >>> len(trace) == len(graphs) and list(trace) == graphs
+    True
+    >>> trace[2]
+    ([(0, 1), (0, 2)], {0: '+', 1: 'x', 2: '1'})
+    >>> len(trace.pool) // WIDTH < sum(len(graph[1]) for graph in graphs)
+    True
+    """
+    labels: list[str]
+    offsets: array
+    pool: bytearray
+    roots: array
+    starts: array
+    ends: array
+    _tokens: dict[tuple[str, int], int]
+
+    def __init__(self, graphs: Iterable[tuple] = ()) -> None:
+        """
+        Initialize a DeltaTrace of the given graphs, in order.
+
+        Preconditions:
+            - every graph in graphs is as in Unit.get_graph with root 0, or as returned by merge_graphs
+              with root '='
+        """
+        self.labels = []
+        self.offsets = array('I')
+        self.pool = bytearray()
+        self.roots = array('I')
+        self.starts = array('q')
+        self.ends = array('q')
+        self._tokens = {}
+
+        for graph in graphs:
+            self.append(graph)
+
+    def __len__(self) -> int:
+        """
+        Return the number of graphs in this trace.
+        """
+        return len(self.roots)
+
+    def __getitem__(self, index: int) -> tuple:
+        """
+        Return a new graph equal to the graph at the given index of this trace.
+
+        Preconditions:
+            - -len(self) <= index < len(self)
+        """
+        if index < 0:
+            index += len(self.roots)
+
+        ids = array('I')
+        ids.frombytes(self.pool[self.starts[index] * WIDTH:self.ends[index] * WIDTH])
+        root = self.labels[self.roots[index]]
+
+        if len(ids) == 0:
+            return ([] if root in {'+', '*'} else [(0, 0)], {0: root})
+
+        labels = {0: root}
+        edges = []
+        for i, token in enumerate(ids, 1):
+            labels[i] = self.labels[token]
+            edges.append((i - self.offsets[token], i))
+
+        if root == '=':  # merge_graphs adds the edges from the root last
+            edges = [e for e in edges if e[0] != 0] + [e for e in edges if e[0] == 0]
+
+        return (edges, labels)
+
+    def __iter__(self) -> Iterator[tuple]:
+        """
+        Return an iterator of the graphs in this trace, in order.
+        """
+        return (self[i] for i in range(len(self.roots)))
+
+    def nbytes(self) -> int:
+        """
+        Return the number of bytes used by the contents of the pool and arrays of this trace
+        (not counting the labels of the tokens).
+        """
+        return len(self.pool) + sum(a.itemsize * len(a) for a in (self.offsets, self.roots, self.starts, self.ends))
+
+    def append(self, graph: tuple) -> None:
+        """
+        Add graph to the end of this trace.
+
+        Preconditions:
+            - graph is as in Unit.get_graph with root 0, or as returned by merge_graphs with root '='
+        """
+        edges, labels = graph
+        offsets = [0] * len(labels)
+        for parent, child in edges:
+            offsets[child] = child - parent  # 0 for the circular edge of a monomial
+
+        ids = array('I', [self._token(labels[i], offsets[i]) for i in range(len(labels))])
+        self.roots.append(ids[0])
+
+        if len(ids) == 1:
+            self.starts.append(0)
+            self.ends.append(0)
+            return
+
+        data = ids[1:].tobytes()
+        start = self._find(data)
+        if start == -1:
+            start = len(self.pool) // WIDTH
+            self.pool.extend(data)
+
+        self.starts.append(start)
+        self.ends.append(start + len(ids) - 1)
+
+    def _token(self, label: str, offset: int) -> int:
+        """
+        Return the id of the token (label, offset), giving it a new id if it has none yet.
+        """
+        token = self._tokens.get((label, offset))
+
+        if token is None:
+            token = len(self.labels)
+            self._tokens[(label, offset)] = token
+            self.labels.append(label)
+            self.offsets.append(offset)
+
+        return token
+
+    def _find(self, data: bytes) -> int:
+        """
+        Return the start (in tokens) of the last occurrence of the tokens data in the pool, or -1 if
+        there is none. The pool is searched from the end, since a graph is most often a part of one
+        of the graphs just before it.
+        """
+        end = len(self.pool)
+        pos = self.pool.rfind(data, 0, end)
+
+        while pos % WIDTH != 0 and pos != -1:  # a match must start at the start of a token
+            end = pos + len(data) - 1
+            pos = self.pool.rfind(data, 0, end)
+
+        return pos if pos == -1 else pos // WIDTH
+
+
+def solve_trace(eqn: Equation, n: int, engine: str = 'tree') -> tuple[set[float], DeltaTrace]:
+    """
+    Return a tuple (sols, trace), where sols and the graphs in trace are the solutions and the trace
+    of eqn.solve(n, engine=engine). The graphs are added to trace as they are built (see Equation.solve_iter),
+    so that the full graphs are never all in memory at once.
+
+    Preconditions:
+        - eqn and n satisfy the preconditions of Equation.solve
+        - engine in {'tree', 'dense'}
+
+    >>> sols, trace = solve_trace(get_equation('(x * (x + 1)) = 2'), 5)
+    >>> sols == {-2.0, 1.0}
+    True
+    >>> list(trace) == get_equation('(x * (x + 1)) = 2').solve(5)[1]
+    True
+    """
+    trace = DeltaTrace()
+    sols = set()
+
+    for item in eqn.solve_iter(n, engine):
+        if isinstance(item, set):
+            sols = item
+        else:
+            trace.append(item)
+
+    return (sols, trace)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0401'],
+        'extra-imports': ['parse', 'array', 'typing'],
+        'max-nested-blocks': 4
+    })
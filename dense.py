@@ -0,0 +1,321 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Dense Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for simplifying units with dense coefficient arrays.
+A polynomial c_0 + c_1 x + ... + c_d x^d is represented by the NumPy array
+[c_0, c_1, ..., c_d], so that sums become array additions and products
+become convolutions.
+
+Also contains a vectorized version of equation.solve_reduced, which solves
+a whole batch of reduced equations of degree up to two at once.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import numpy as np
+from expr import *
+from poly import FFT_THRESHOLD
+
+# The largest degree that will be given a dense array. Larger degrees are
+# left to the tree-based simplification instead.
+MAX_DEGREE = 1 << 14
+
+# The largest product of the sums of the absolute values of the coefficients of two integer
+# polynomials that are multiplied by FFT. Below it, the rounding error of the FFT is far less
+# than 0.5, so rounding its result gives the exact integer coefficients.
+FFT_MAX_NORM = 2.0 ** 36
+
+
+def get_coeffs(unit: Unit) -> Optional[np.ndarray]:
+    """
+    Return the dense coefficient array of the polynomial represented by unit,
+    with trailing (highest-degree) zeroes removed.
+
+    Returns None if unit cannot be represented densely, i.e., if it contains an empty product,
+    or a monomial whose degree is not an integer in [0, MAX_DEGREE], or if its degree may be over MAX_DEGREE.
+
+    >>> get_coeffs(Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])]))
+    array([-1.,  0.,  1.])
+    >>> get_coeffs(Unit('+', [mono(2, 1), mono(-2, 1)]))
+    array([], dtype=float64)
+    >>> get_coeffs(mono(1, 0.5)) is None
+    True
+    >>> get_coeffs(Unit('^', [Unit('+', [mono(1, 1), mono(1, 0)]), mono(3, 0)]))
+    array([1., 3., 3., 1.])
+    """
+    if unit.op == 'x':
+        coeff, deg = unit.terms[0].value, unit.terms[1].value
+        if not (float(deg).is_integer() and 0 <= deg <= MAX_DEGREE):
+            return None
+
+        coeffs = np.zeros(int(deg) + 1)
+        coeffs[-1] = coeff
+        return trim(coeffs)
+
+    if unit.op == '^':
+        return _pow_coeffs(unit.terms[0], int(unit.terms[1].terms[0].value))
+
+    term_coeffs = []
+    for term in unit.terms:
+        coeffs = get_coeffs(term)
+        if coeffs is None:
+            return None
+        term_coeffs.append(coeffs)
+
+    if unit.op == '+':
+        coeffs = np.zeros(max((len(c) for c in term_coeffs), default=0))
+        for c in term_coeffs:
+            coeffs[:len(c)] += c
+        return trim(coeffs)
+
+    elif len(term_coeffs) == 0:  # unit.op == '*'
+        return None
+
+    else:  # unit.op == '*'
+        coeffs = term_coeffs[0]
+        for c in term_coeffs[1:]:
+            if len(coeffs) == 0 or len(c) == 0:  # a factor of zero
+                return np.zeros(0)
+            if len(coeffs) + len(c) - 2 > MAX_DEGREE:
+                return None
+            coeffs = trim(convolve(coeffs, c))
+        return coeffs
+
+
+def _pow_coeffs(base: Unit, k: int) -> Optional[np.ndarray]:
+    """
+    Return the dense coefficient array of the polynomial represented by base to the power k, by repeated
+    squaring, or None if it cannot be represented densely (see get_coeffs).
+
+    Preconditions:
+        - k >= 1
+    """
+    square = get_coeffs(base)
+    if square is None or len(square) <= 1:  # zero or a constant
+        return None if square is None else square ** k
+
+    if (len(square) - 1) * k > MAX_DEGREE:
+        return None
+
+    coeffs = None  # base to the power of the bits of k seen so far, as in poly.poly_pow
+    while k > 0:
+        if k % 2 == 1:
+            coeffs = square if coeffs is None else trim(convolve(coeffs, square))
+        k //= 2
+        if k > 0:
+            square = trim(convolve(square, square))
+
+    return coeffs
+
+
+def convolve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Return the coefficient array of the product of the polynomials with the coefficient arrays a and b.
+
+    If the arrays are large, their coefficients are integers, and FFT_MAX_NORM bounds the rounding error,
+    the product is computed by FFT in O(n log n) time and rounded to the same integers np.convolve gives.
+    Otherwise, it is computed by np.convolve.
+
+    Preconditions:
+        - len(a) >= 1 and len(b) >= 1
+
+    >>> a = np.arange(1., 101.)
+    >>> bool(np.array_equal(convolve(a, a), np.convolve(a, a)))
+    True
+    """
+    if len(a) * len(b) < FFT_THRESHOLD or not fits_fft(a, b):
+        return np.convolve(a, b)
+
+    n = len(a) + len(b) - 1
+    size = 1 << (n - 1).bit_length()  # FFTs of powers of 2 are fastest
+    product = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+    return np.round(product) + 0  # + 0 avoids the float -0
+
+
+def fits_fft(a: np.ndarray, b: np.ndarray) -> bool:
+    """
+    Return whether the product of the polynomials with the coefficient arrays a and b can be computed
+    exactly by FFT, i.e., whether their coefficients are integers, and the product of the sums of their
+    absolute values is at most FFT_MAX_NORM.
+
+    >>> fits_fft(np.array([1., -2., 0.]), np.array([3.])), fits_fft(np.array([1., 0.5]), np.array([3.]))
+    (True, False)
+    """
+    with np.errstate(over='ignore', invalid='ignore'):  # inf and nan fail the checks anyway
+        return bool(np.all(np.trunc(a) == a) and np.all(np.trunc(b) == b)
+                    and np.abs(a).sum() * np.abs(b).sum() <= FFT_MAX_NORM)
+
+
+def fft_mul(p1: dict[float, float], p2: dict[float, float]) -> Optional[dict[float, float]]:
+    """
+    Return the product of the polynomials p1 and p2 (see poly.py), computed by FFT (see convolve),
+    in the same form as poly.poly_mul. Returns None instead if the product is not worth computing
+    by FFT, i.e., if the polynomials are too sparse, or too large or not integral enough for
+    the result to be exact.
+
+    Preconditions:
+        - len(p1) >= 1 and len(p2) >= 1
+
+    >>> p = {float(deg): 1.0 for deg in range(100)}
+    >>> fft_mul(p, p) == {float(deg): float(min(deg, 198 - deg) + 1) for deg in range(199)}
+    True
+    >>> fft_mul({0.5: 1.0}, {1.0: 1.0}) is None
+    True
+    """
+    degs = list(p1) + list(p2)
+    if not all(float(deg).is_integer() and 0 <= deg <= MAX_DEGREE for deg in degs):
+        return None
+
+    # Check the norms first, since coefficients that are too large for FFT may not even fit in a float
+    if sum(abs(coeff) for coeff in p1.values()) * sum(abs(coeff) for coeff in p2.values()) > FFT_MAX_NORM:
+        return None
+
+    n = int(max(p1)) + int(max(p2)) + 1
+    if 8 * n > len(p1) * len(p2):  # too sparse for an FFT of n points to be worth it
+        return None
+
+    a, b = np.zeros(int(max(p1)) + 1), np.zeros(int(max(p2)) + 1)
+    a[[int(deg) for deg in p1]] = list(p1.values())
+    b[[int(deg) for deg in p2]] = list(p2.values())
+    if not fits_fft(a, b):
+        return None
+
+    return to_coeff_by_deg(convolve(a, b))
+
+
+def trim(coeffs: np.ndarray) -> np.ndarray:
+    """
+    Return coeffs without its trailing zeroes.
+
+    >>> trim(np.array([1., 0., 2., 0., 0.]))
+    array([1., 0., 2.])
+    """
+    nonzero = np.flatnonzero(coeffs)
+    return coeffs[:nonzero[-1] + 1] if len(nonzero) > 0 else coeffs[:0]
+
+
+def to_coeff_by_deg(coeffs: np.ndarray) -> dict[float, float]:
+    """
+    Return a dict mapping each degree with a nonzero coefficient in coeffs to that coefficient,
+    in nonincreasing order of degree.
+
+    >>> to_coeff_by_deg(np.array([-1., 0., 1.]))
+    {2.0: 1.0, 0.0: -1.0}
+    """
+    return {float(deg): float(coeffs[deg]) for deg in np.flatnonzero(coeffs)[::-1]}
+
+
+def solve_quadratics(a: np.ndarray, b: np.ndarray, c: np.ndarray, n: int) -> list[set[float]]:
+    """
+    Return the solutions of each equation a[i] x^2 + b[i] x + c[i] = 0, rounded to n decimal places,
+    as equation.solve_reduced would for the reduced equation with these coefficients,
+    or None where solve_reduced would raise an OverflowError. See quadratic_roots for how they are computed.
+
+    Preconditions:
+        - a, b and c are one-dimensional and have the same length
+
+    >>> a, b, c = np.array([1., 1., 1., 0., 0., 0.]), np.array([-3., 2., 0., 2., 0., 0.]), \
+                  np.array([2., 1., 1., -1., 0., 1.])
+    >>> solve_quadratics(a, b, c, 5) == [{1.0, 2.0}, {-1.0}, set(), {0.5}, {float('inf')}, set()]
+    True
+    >>> solve_quadratics(np.array([1., 0.]), np.array([1e200, 1e-300]), np.array([1., 1e300]), 5)
+    [None, None]
+    """
+    kinds, root_1, root_2 = quadratic_roots(a, b, c, n)
+
+    sols = []
+    for kind, r_1, r_2 in zip(kinds.tolist(), root_1.tolist(), root_2.tolist()):
+        if kind == 1:
+            sols.append({r_1, r_2})
+        elif kind == 3:
+            sols.append(None)
+        else:
+            sols.append(set() if kind == 0 else {float('inf')})
+
+    return sols
+
+
+def quadratic_roots(a: np.ndarray, b: np.ndarray, c: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Classify and solve each equation a[i] x^2 + b[i] x + c[i] = 0 with the same array operations at once.
+    Returns the tuple (kinds, root_1, root_2) of arrays, where kinds[i] is
+        - 0 if the ith equation has no solutions;
+        - 1 if its solutions are root_1[i] and root_2[i] (which are equal for a single solution);
+        - 2 if every value of x is a solution;
+        - 3 if b[i]^2 - 4 a[i] c[i] or a root is out of the range of a float (see solve_reduced).
+    The roots are rounded to n decimal places, and are meaningless where kinds[i] != 1.
+
+    Quadratics use the same stable form of the quadratic formula as solve_reduced, and every
+    operation is exactly rounded, so the unrounded roots match the scalar ones bit for bit,
+    and round_decimals rounds them exactly as round does.
+
+    Preconditions:
+        - a, b and c are one-dimensional and have the same length
+
+    >>> quadratic_roots(np.array([1., 0.]), np.array([-1., 0.]), np.array([-1., 0.]), 3)
+    (array([1, 2]), array([1.618,   nan]), array([-0.618,    nan]))
+    """
+    a, b, c = np.asarray(a, dtype=float), np.asarray(b, dtype=float), np.asarray(c, dtype=float)
+
+    quadratic = a != 0
+    linear = ~quadratic & (b != 0)
+
+    # ignore the lanes that np.where discards, and those that overflow, which are classified below
+    with np.errstate(all='ignore'):
+        discr_sq = b ** 2 - 4 * a * c
+        q = -(b + np.copysign(np.sqrt(discr_sq), b)) / 2
+        root_1 = np.where(quadratic, q / a, -c / b)
+        root_2 = np.where(quadratic & (q != 0), c / q, root_1)
+        solved = np.where(np.isfinite(root_1) & np.isfinite(root_2), 1, 3)
+
+    kinds = np.select([quadratic, linear], [np.where(discr_sq < 0, 0, solved), solved], np.where(c == 0, 2, 0))
+
+    # + 0 avoids the float -0
+    return (kinds, round_decimals(root_1, n) + 0, round_decimals(root_2, n) + 0)
+
+
+def round_decimals(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Return values rounded to n decimal places, exactly as round(value, n) rounds each value.
+
+    np.round computes rint(value * 10^n) / 10^n, where only the product can be inexact.
+    Its error is too small to matter unless value * 10^n is nearly halfway between two integers
+    or very large, so round is called on just those values.
+
+    >>> round_decimals(np.array([2.675, 0.125, -1.23456, float('nan')]), 2)  # 2.675 is really 2.67499999...
+    array([ 2.67,  0.12, -1.23,   nan])
+    """
+    values = np.asarray(values, dtype=float)
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        rounded = np.round(values, n)
+        scaled = values * 10.0 ** n
+        unsafe = ~(np.abs(scaled) < 2.0 ** 31) | (np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+
+    if n > 15:  # 10^n is no longer exact
+        unsafe[:] = True
+
+    unsafe &= np.isfinite(values)  # np.round already leaves nan and inf as they are
+
+    for i in np.flatnonzero(unsafe).tolist():
+        rounded[i] = round(values[i].item(), n)
+
+    return rounded
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0401'],
+        'extra-imports': ['expr', 'poly', 'numpy'],
+        'max-nested-blocks': 4
+    })
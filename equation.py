@@ -12,8 +12,13 @@ Copyright
 This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
 
 import math
+import time
+from typing import Generator, Iterator, Union
 from expr import *
 
+# The message of the OverflowError raised by solve_reduced when a root is out of the range of a float.
+OUT_OF_RANGE = 'a root is out of the range of a float'
+
 
 class Equation:
     """
@@ -39,7 +44,9 @@ class Equation:
         """
         return f'{self.left} = {self.right}'
 
-    def solve(self, n: int) -> tuple[set[float], list]:
+    def solve(self, n: int, trace: bool = True, engine: str = 'tree', cache: Optional[Any] = None,
+              stats: Optional[Any] = None, budget: Optional[Any] = None,
+              persistent: bool = False) -> tuple[set[float], list]:
         """
         Solve this equation if the degrees of left and right are in {0, 1, 2}.
         Returns the tuple (sols, graphs), where
@@ -48,58 +55,244 @@ class Equation:
                         if there are finitely-many solutions.
                 - equals {float('inf')} if there are infinitely-many solutions.
                 - equals {float('nan')} if the degrees of left or right are not in {0, 1, 2}.
+                  If this is known in advance (see Equation.is_unsupported), neither side is simplified,
+                  and graphs only represents self.
             - graphs is a list of graphs (see Unit.get_graph) representing self and its left/right sides
               at each stage of the solution in chronological order.
+        If trace is False, no graphs are built at any stage and graphs is returned as [].
+        This gives the same sols, and is much faster on deeply nested inputs.
+        Both sides are simplified with the given engine, or looked up in the given cache (see Unit.simplify).
+        If a SolveStats is given as stats (see stats.py), the time spent in each stage of the solution
+        and the counters of the simplification are recorded in it (with the count 'rejected' for
+        equations that are known to be unsupported in advance).
+        If a Budget is given as budget (see budget.py), a BudgetExceeded error is raised as soon as
+        reducing this equation exceeds one of its limits (see Equation.reduce).
+        If persistent is True, left and right are simplified without being mutated (see Unit.simplified),
+        so that self is left as it is, and can be solved again, or by several threads at once.
+
+        Preconditions:
+            - engine in {'tree', 'dense'}
 
         >>> left = Unit('+', [mono(2, 1), mono(1, 1), mono(1, 0)])  # 2x + x + 1
         >>> right = Unit('*', [mono(2, 1), mono(1, 1), mono(3, 0), mono(1, 0)])  # 2x * x * 3
         >>> eqn = Equation(left, right)  # 2x + x + 1 = 2x * x * 3  <==>  -6x^2 + 3x + 1 = 0
         >>> eqn.solve(5)[0] == {-0.22871, 0.72871}
         True
+
+        >>> eqn = Equation(Unit('+', [mono(2, 1), mono(1, 1), mono(1, 0)]), \
+                           Unit('*', [mono(2, 1), mono(1, 1), mono(3, 0), mono(1, 0)]))
+        >>> eqn.solve(5, trace=False) == ({-0.22871, 0.72871}, [])
+        True
+
+        >>> from stats import SolveStats
+        >>> stats = SolveStats()
+        >>> eqn = Equation(Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])]), \
+                           mono(3, 0))  # (x - 1)(x + 1) = 3
+        >>> eqn.solve(5, stats=stats)[0] == {-2.0, 2.0}
+        True
+        >>> stats.counts['distributions'], stats.counts['graphs'], stats.peaks['sum_terms']
+        (1, 15, 3)
+
+        >>> from budget import Budget, BudgetExceeded
+        >>> eqn = Equation(Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])]), \
+                           mono(3, 0))  # (x - 1)(x + 1) = 3
+        >>> try:
+        ...     eqn.solve(5, budget=Budget(max_graphs=10))
+        ... except BudgetExceeded as error:
+        ...     print(error)
+        over the limit of 10 graphs
+
+        >>> eqn = Equation(Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])]), \
+                           mono(3, 0))  # (x - 1)(x + 1) = 3
+        >>> eqn.solve(5, persistent=True) == eqn.solve(5, persistent=True)
+        True
+        >>> print(eqn)
+        ((x + -1) * (x + 1)) = 3
+        """
+        sols, graphs = collect_graphs(self._solve_steps(n, trace, engine, cache, stats, budget, persistent))
+        return (sols, graphs)
+
+    def solve_iter(self, n: int, engine: str = 'tree', cache: Optional[Any] = None, stats: Optional[Any] = None,
+                   budget: Optional[Any] = None, persistent: bool = False) -> Iterator[Union[tuple, set[float]]]:
+        """
+        Solve this equation as in Equation.solve (with a trace), but yield each graph as soon as it is built,
+        and finally yield the set sols, instead of returning them all at the end.
+        Only the graph being yielded is held (along with the last graph of each side, to merge them), so the
+        graphs can be consumed (e.g., drawn) while the equation is still being solved, in bounded memory.
+
+        If a SolveStats is given as stats, or a Budget is given as budget, the time spent consuming each
+        graph counts towards the stage it was built in, and towards max_seconds, respectively.
+
+        Preconditions:
+            - engine in {'tree', 'dense'}
+
+        >>> get_eqn = lambda: Equation(Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), \
+                                                  Unit('+', [mono(1, 1), mono(1, 0)])]), mono(3, 0))
+        >>> items = list(get_eqn().solve_iter(5))
+        >>> items[-1] == {-2.0, 2.0}
+        True
+        >>> items[:-1] == get_eqn().solve(5)[1]
+        True
+        """
+        sols = yield from self._solve_steps(n, True, engine, cache, stats, budget, persistent)
+        yield sols
+
+    def _solve_steps(self, n: int, trace: bool = True, engine: str = 'tree', cache: Optional[Any] = None,
+                     stats: Optional[Any] = None, budget: Optional[Any] = None,
+                     persistent: bool = False) -> Generator[tuple, None, set[float]]:
+        """
+        Solve this equation as in Equation.solve, yielding each graph as soon as it is built,
+        and return the set sols.
+        """
+        if stats is not None:
+            start = time.perf_counter()
+            unsupported = self.is_unsupported()
+            stats.add_time('bound', time.perf_counter() - start)
+        else:
+            unsupported = self.is_unsupported()
+
+        if unsupported:  # skip expanding both sides, since the result is known
+            if stats is not None:
+                stats.add_count('equations')
+                stats.add_count('rejected')
+            if trace:
+                yield merge_graphs(self.left.get_graph(stats=stats), self.right.get_graph(stats=stats), '=')
+            return {float('nan')}
+
+        coeff_by_deg = yield from self._reduce_steps(trace, engine, cache, stats, budget, persistent)
+
+        if stats is None:
+            return solve_reduced(coeff_by_deg, n)
+
+        start = time.perf_counter()
+        sols = solve_reduced(coeff_by_deg, n)
+        stats.add_time('solve', time.perf_counter() - start)
+        stats.add_count('equations')
+        return sols
+
+    def degree_bound(self) -> tuple[float, bool]:
+        """
+        Return a tuple (bound, exact) as in Unit.degree_bound, for the polynomial left - right that this
+        equation is reduced to (see Equation.reduce), without simplifying either side.
+
+        >>> get_eqn = lambda left, right: Equation(Unit('*', [mono(1, 1)] * left), Unit('*', [mono(1, 1)] * right))
+        >>> get_eqn(3, 1).degree_bound()  # x * x * x = x
+        (3, True)
+        >>> get_eqn(3, 3).degree_bound()  # x * x * x = x * x * x
+        (3, False)
+        """
+        return Unit('+', [self.left, Unit('*', [mono(-1, 0), self.right])]).degree_bound()
+
+    def is_unsupported(self) -> bool:
+        """
+        Return whether this equation is provably not supported by Equation.solve, i.e., whether its
+        degree_bound is exact and not in {0, 1, 2}. This takes time linear in the size of the
+        equation, whereas solving it may take time polynomial in its degree.
+        An equation may still be unsupported if this returns False, e.g., if its degree bound is not exact.
+
+        >>> Equation(Unit('*', [mono(1, 50), Unit('+', [mono(1, 1), mono(2, 0)])]), mono(0, 0)).is_unsupported()
+        True
+        >>> Equation(Unit('+', [mono(1, 3), mono(1, 2)]), mono(1, 3)).is_unsupported()  # x^3 + x^2 = x^3
+        False
+        """
+        bound, exact = self.degree_bound()
+        return exact and bound not in {0, 1, 2, float('-inf')}  # -inf is 0 = 0, which is supported
+
+    def reduce(self, trace: bool = True, engine: str = 'tree', cache: Optional[Any] = None,
+               stats: Optional[Any] = None, budget: Optional[Any] = None,
+               persistent: bool = False) -> tuple[dict[float, float], list]:
+        """
+        Reduce this equation to the form p(x) = 0, where p(x) is a sum of monomials of unique degrees.
+        Returns the tuple (coeff_by_deg, graphs), where
+            - coeff_by_deg maps the degree of each monomial in p(x) to its coefficient.
+            - graphs is as in Equation.solve.
+        Afterwards, self.left is p(x) and self.right is 0, unless persistent is True, in which case self
+        is not mutated at all (see Equation.solve).
+        If a SolveStats is given as stats, the time taken to simplify both sides (including their trace)
+        and to subtract right from left is recorded in it, as in Equation.solve.
+        If a Budget is given as budget, it is checked while both sides are simplified and their graphs
+        are built (see Unit.simplify). It is not started here, so its limits also cover any work done
+        since it was last started (see Budget.start), e.g., parsing this equation and bounding its degree.
+
+        Raises a ValueError if a side cannot be reduced to a sum of monomials, and a BudgetExceeded error
+        if budget is exceeded, in which case self is left partly reduced.
+
+        Preconditions:
+            - engine in {'tree', 'dense'}
+
+        >>> eqn = Equation(Unit('+', [mono(2, 1), mono(1, 1), mono(1, 0)]), mono(-1, 0))  # 2x + x + 1 = -1
+        >>> eqn.reduce(trace=False)
+        ({1: 3, 0: 2}, [])
+        """
+        coeff_by_deg, graphs = collect_graphs(self._reduce_steps(trace, engine, cache, stats, budget, persistent))
+        return (coeff_by_deg, graphs)
+
+    def _reduce_steps(self, trace: bool = True, engine: str = 'tree', cache: Optional[Any] = None,
+                      stats: Optional[Any] = None, budget: Optional[Any] = None,
+                      persistent: bool = False) -> Generator[tuple, None, dict[float, float]]:
         """
-        graphs = []
+        Reduce this equation as in Equation.reduce, yielding each graph as soon as it is built,
+        and return coeff_by_deg.
+        """
+        if stats is not None:
+            start = time.perf_counter()
 
         # Create initial equation graph
-        graphs.append(merge_graphs(self.left.get_graph(), self.right.get_graph(), '='))
+        if trace:
+            yield merge_graphs(self.left.get_graph(stats=stats, budget=budget),
+                               self.right.get_graph(stats=stats, budget=budget), '=')
 
         # Simplify both sides, and create left side, right side, and simplified equation graphs
-        left_graphs = self.left.simplify()
-        right_graphs = self.right.simplify()
-        eqn_graph_simple = merge_graphs(left_graphs[-1], right_graphs[-1], '=')
-
-        graphs.extend(left_graphs)
-        graphs.extend(right_graphs)
-        graphs.append(eqn_graph_simple)
-
-        # Subtract right from left, and simplify left one final time to collect like-terms
-        if self.left.op == 'x':  # if left is a monomial
-            self.left = Unit('+', [self.left])  # then set left to a single-term sum in prep
-
-        if self.right.op == 'x':  # if right is a monomial
-            self.right.terms[0].value *= -1
-            self.left.terms.append(self.right)
-        else:  # if right is a sum
-            while len(self.right.terms) > 0:
-                term = self.right.terms[0]
-                if term.op == 'x':
-                    term.terms[0].value *= -1
-                    self.right.terms.pop(0)
-                    self.left.terms.append(term)
-                else:  # if a non-monomial unit appears in right
-                    raise ValueError
-
-        self.right = mono(0, 0)
-        self.left.simplify()
+        if trace:
+            left, left_graph = yield from _relay(self.left.simplify_iter(engine, cache, stats, budget, persistent))
+            right, right_graph = yield from _relay(self.right.simplify_iter(engine, cache, stats, budget, persistent))
+            yield merge_graphs(left_graph, right_graph, '=')
+        elif persistent:
+            left = self.left.simplified(False, engine, cache, stats, budget)[0]
+            right = self.right.simplified(False, engine, cache, stats, budget)[0]
+        else:
+            self.left.simplify(False, engine, cache, stats, budget)
+            self.right.simplify(False, engine, cache, stats, budget)
+            left, right = self.left, self.right
+
+        if stats is not None:
+            stats.add_time('simplify', time.perf_counter() - start)
+            start = time.perf_counter()
+
+        # Subtract right from left, as a new sum of the terms of left and the negated terms of right,
+        # and simplify it one final time to collect like-terms
+        if right.op == 'x':  # if right is a monomial
+            negated = [mono(-right.terms[0].value, right.terms[1].value)]
+        elif right.op != '^' and all(term.op == 'x' for term in right.terms):  # if right is a sum of monomials
+            negated = [mono(-term.terms[0].value, term.terms[1].value) for term in right.terms]
+        else:  # if a non-monomial unit appears in right
+            raise ValueError
+
+        if left.op == 'x':  # if left is a monomial
+            left = Unit('+', [left] + negated)  # then make left a sum
+        elif left.op == '^':  # if left is a power that could not be multiplied out
+            raise ValueError
+        else:
+            left = Unit(left.op, left.terms + negated)
+
+        right = mono(0, 0)
+        if persistent:
+            left = left.simplified(False, stats=stats, budget=budget)[0]
+        else:
+            left.simplify(False, stats=stats, budget=budget)
+            self.left, self.right = left, right
 
         # Create final equation graph
-        graphs.append(merge_graphs(self.left.get_graph(), self.right.get_graph(), '='))
+        if trace:
+            yield merge_graphs(left.get_graph(stats=stats, budget=budget),
+                               right.get_graph(stats=stats, budget=budget), '=')
 
         # Look at the degree of left
         coeff_by_deg = {}
-        if self.left.op == 'x':  # if left is a monomial
-            coeff_by_deg[self.left.terms[1].value] = self.left.terms[0].value
+        if left.op == 'x':  # if left is a monomial
+            coeff_by_deg[left.terms[1].value] = left.terms[0].value
         else:  # if left is a sum
-            for term in self.left.terms:
+            for term in left.terms:
                 if term.op == 'x':
                     if term.terms[1].value in coeff_by_deg:
                         coeff_by_deg[term.terms[1].value] += term.terms[0].value
@@ -108,45 +301,100 @@ class Equation:
                 else:  # if a non-monomial unit appears in left
                     raise ValueError
 
-        # Handle unsupported equations
-        if any(deg not in {0, 1, 2} for deg in coeff_by_deg):
-            sols = {float('nan')}
+        if stats is not None:
+            stats.add_time('subtract', time.perf_counter() - start)
+
+        return coeff_by_deg
 
-        # Solve quadratic equations
-        elif 2 in coeff_by_deg:
-            a = coeff_by_deg[2]
-            b = coeff_by_deg.get(1, 0)
-            c = coeff_by_deg.get(0, 0)
 
-            discr_sq = b ** 2 - 4 * a * c
+def solve_reduced(coeff_by_deg: dict[float, float], n: int) -> set[float]:
+    """
+    Return the solutions of the reduced equation sum(coeff_by_deg[deg] x^deg) = 0, as described
+    under sols in Equation.solve.
 
-            if discr_sq < 0:
-                sols = set()
+    Quadratic roots are computed with the numerically stable form of the quadratic formula,
+    which never subtracts the nearly-equal quantities -b and ±sqrt(b^2 - 4ac).
+    Raises an OverflowError if b^2 - 4ac or a root of a linear or quadratic equation is out of
+    the range of a float, rather than returning an infinite root (which would mean every x is a solution).
+
+    Preconditions:
+        - coeff_by_deg is as returned by Equation.reduce
+
+    >>> solve_reduced({2: 1, 1: -3, 0: 2}, 5) == {1.0, 2.0}
+    True
+    >>> solve_reduced({2: 1, 1: -1e9, 0: 1}, 12) == {1e9, 1e-9}  # the textbook formula gives 0 for 1e-9
+    True
+    >>> solve_reduced({1: 3, 0: 0}, 5)  # 3x = 0 has the solution 0, not -0
+    {0.0}
+    >>> solve_reduced({2: 1, 1: 1e200, 0: 1}, 5)
+    Traceback (most recent call last):
+    ...
+    OverflowError: a root is out of the range of a float
+    """
+    # Handle unsupported equations
+    if any(deg not in {0, 1, 2} for deg in coeff_by_deg):
+        sols = {float('nan')}
+
+    # Solve quadratic equations
+    elif 2 in coeff_by_deg:
+        a = coeff_by_deg[2]
+        b = coeff_by_deg.get(1, 0)
+        c = coeff_by_deg.get(0, 0)
+
+        discr_sq = b * b - 4 * a * c  # b * b, unlike b ** 2, overflows to inf like every other operation here
+
+        if discr_sq < 0:
+            sols = set()
+        else:
+            # q = -(b ± sqrt(b^2 - 4ac)) / 2 with the sign of b, so that the roots are q/a and c/q
+            q = -(b + math.copysign(math.sqrt(discr_sq), b)) / 2
+            if q == 0:  # b = c = 0, so 0 is a double root
+                sols = {0.0}
             else:
-                root_1 = (-b + math.sqrt(discr_sq)) / (2 * a)
-                root_2 = (-b - math.sqrt(discr_sq)) / (2 * a)
-                sols = {round(root_1, n), round(root_2, n)}
+                sols = {round(q / a, n), round(c / q, n)}
 
-        # Solve linear equations
-        elif 1 in coeff_by_deg:
-            a = coeff_by_deg[1]
-            b = coeff_by_deg.get(0, 0)
+            if not all(math.isfinite(s) for s in sols):
+                raise OverflowError(OUT_OF_RANGE)
 
-            sols = {round((-b / a), n)}
+    # Solve linear equations
+    elif 1 in coeff_by_deg:
+        a = coeff_by_deg[1]
+        b = coeff_by_deg.get(0, 0)
 
-        # Solve constant equations
-        elif 0 in coeff_by_deg:
-            a = coeff_by_deg[0]
+        root = -b / a
+        if not math.isfinite(root):
+            raise OverflowError(OUT_OF_RANGE)
 
-            if a == 0:
-                sols = {float('inf')}
-            else:
-                sols = set()
+        sols = {round(root, n)}
+
+    # Solve constant equations
+    elif 0 in coeff_by_deg:
+        a = coeff_by_deg[0]
 
-        else:  # if left is the empty unit
+        if a == 0:
             sols = {float('inf')}
+        else:
+            sols = set()
+
+    else:  # if left is the empty unit
+        sols = {float('inf')}
+
+    return {s + 0 for s in sols}  # + 0 avoids the float -0
+
+
+def _relay(steps: Generator[tuple, None, Any]) -> Generator[tuple, None, tuple[Any, Optional[tuple]]]:
+    """
+    Yield the graphs yielded by the generator steps, and return the tuple (value, graph), where value is
+    the value that steps returns, and graph is the last graph it yielded (or None if there were none).
+    """
+    graph = None
 
-        return ({s + 0 for s in sols}, graphs)  # + 0 avoids the float -0
+    while True:
+        try:
+            graph = next(steps)
+        except StopIteration as done:
+            return (done.value, graph)
+        yield graph
 
 
 def merge_graphs(g1: tuple, g2: tuple, root: str) -> tuple:
@@ -190,6 +438,6 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'max-line-length': 120,
         'disable': ['E1136', 'E1101', 'W0401', 'R0912', 'R0915', 'C9103'],
-        'extra-imports': ['expr', 'math'],
+        'extra-imports': ['expr', 'math', 'time', 'typing'],
         'max-nested-blocks': 4
     })
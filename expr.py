@@ -11,13 +11,18 @@ Copyright
 
 This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
 
-from typing import Any
+import time
+from typing import Any, Generator, Optional, Union
+from poly import poly_pow, poly_prod, poly_sum
 
 
 class Expr:
     """
     An abstract class that represents a mathematical expression.
     """
+    # Expressions are created in large numbers, so their subclasses declare __slots__ instead of
+    # giving every instance its own __dict__.
+    __slots__ = ()
 
 
 class MonoData(Expr):
@@ -32,7 +37,10 @@ class MonoData(Expr):
 
     Representation Invariants:
         - type in {'coeff', 'deg'}
+
+    A MonoData is not changed once it is a term of a Unit, since the Unit caches its string (see Unit.__repr__).
     """
+    __slots__ = ('type', 'value')
     type: str
     value: float
 
@@ -52,22 +60,34 @@ class MonoData(Expr):
 
 class Unit(Expr):
     """
-    An expression that represents either a sum, product, or monomial.
+    An expression that represents either a sum, product, power, or monomial.
 
     Instance Attributes:
         - op: Which operation self represents:
-              '+' - sum, '*' - product, 'x' - monomial.
+              '+' - sum, '*' - product, '^' - power, 'x' - monomial.
         - terms: The terms within the sum or product, if op is '+' or '*'.
+                 A list [p, k] where p is the sum or product raised to the power and k is the constant monomial
+                 whose coefficient is the power, if op is '^'.
                  A list [a, n] where a, n are coefficient, degree MonoData objects, respectively, if op is 'x'.
 
     Representation Invariants:
-        - op in {'+', '*', 'x'}
+        - op in {'+', '*', '^', 'x'}
         - (op == 'x') == (len(self.terms) == 2
                           and isinstance(self.terms[0], MonoData) and self.terms[0].type == 'coeff'
                           and isinstance(self.terms[1], MonoData) and self.terms[1].type == 'deg')
           # self is a monomial if and only if self.terms consists of one coefficient and one degree MonoData.
         - (op == 'x') or all(isinstance(t, Unit) for t in self.terms)
           # if self is not a monomial, then each of its terms is a Unit.
+        - op != '^' or (len(self.terms) == 2 and self.terms[0].op in {'+', '*'} and self.terms[1].op == 'x'
+                        and self.terms[1].terms[1].value == 0 and self.terms[1].terms[0].value >= 1
+                        and float(self.terms[1].terms[0].value).is_integer())
+          # a power raises a sum or product to a positive integer power, so it takes constant space for any power.
+        - op not in {'+', '*'} or all(_order(t1) >= _order(t2) for t1, t2 in zip(self.terms, self.terms[1:]))
+          # the terms of a sum or product are in canonical order (see _canonical).
+
+    The terms of a sum or product are put in canonical order when it is created, and its string is cached the first
+    time it is needed (see Unit.__repr__). The cache is cleared whenever a unit is rewritten by Unit.simplify
+    or Unit.add_term; op and terms must not be changed otherwise once the string of a unit is built.
 
     >>> sum = Unit('+', [mono(2, 1), mono(1, 1), mono(1, 0), mono(0, 0)])  # 2x + x + 1 + 0
     >>> _ = sum.simplify()
@@ -97,20 +117,53 @@ class Unit(Expr):
     >>> _ = quad.simplify()
     >>> print(quad)
     (x^2 + 6x + 10)
+
+    >>> Unit('+', [mono(1, 0), mono(2, 2), Unit('*', [mono(1, 1), mono(1, 1)])]).terms  # in canonical order
+    [2x^2, (x * x), 1]
     """
+    __slots__ = ('op', 'terms', '_str')
     op: str
     terms: list[Expr]
+    _str: Optional[str]
 
     def __init__(self, op: str, terms: list[Expr]) -> None:
         """
         Initialize a new Unit.
         """
         self.op = op
-        self.terms = terms
+        self.terms = _canonical(terms) if op == '+' or op == '*' else terms
+        self._str = None
 
     def __repr__(self) -> str:
         """
-        Return a string representing this Unit.
+        Return a string representing this Unit. The string is only built the first time it is needed,
+        and then cached until self is rewritten.
+        """
+        if self._str is None:
+            self._str = self._format()
+        return self._str
+
+    def add_term(self, term: 'Unit') -> None:
+        """
+        Insert term among the terms of this unit, after any terms of the same canonical order (see _canonical).
+
+        Preconditions:
+            - self.op in {'+', '*'}
+
+        >>> unit = Unit('+', [mono(1, 2), mono(1, 0)])
+        >>> unit.add_term(mono(3, 1))
+        >>> print(unit)
+        (x^2 + 3x + 1)
+        """
+        i = len(self.terms)
+        while i > 0 and _order(self.terms[i - 1]) < _order(term):
+            i -= 1
+        self.terms.insert(i, term)
+        self._str = None
+
+    def _format(self) -> str:
+        """
+        Return a new string representing this Unit, using the cached strings of its terms.
         """
         if self.op == 'x':
             coeff, deg = self.terms[0].value, self.terms[1].value
@@ -128,174 +181,536 @@ class Unit(Expr):
                 return f'{normalize_fstr(coeff_str)}x'
             else:
                 return f'{normalize_fstr(coeff_str)}x^{normalize_fstr(str(deg))}'
+        elif self.op == '^':
+            return f'{self.terms[0]}^{self.terms[1]}'
         else:
-            # Prioritize monomials, in nonincreasing order of degree.
-            # After monomials, prioritize products, and then sums.
-            self.terms.sort(key=lambda t: (t.terms[1].value if t.op == 'x' else 0,
-                                           int(t.op == '*'),
-                                           int(t.op == '+')), reverse=True)
-            return f'({f" {self.op} ".join([str(t) for t in self.terms])})'
+            return f'({f" {self.op} ".join([str(t) for t in self.terms])})'  # already in canonical order
 
-    def simplify(self) -> list[tuple]:
+    def simplify(self, trace: bool = True, engine: str = 'tree', cache: Optional[Any] = None,
+                 stats: Optional[Any] = None, budget: Optional[Any] = None) -> list[tuple]:
         """
         Simplify the terms in this unit.
         The algorithm aims to *expand* the terms, so that the result is a sum of monomials
         of unique degrees.
+
+        The engine determines how the terms are expanded:
+            - 'tree': distribute and collect terms within the tree itself, one stage at a time.
+            - 'dense': convert the whole tree to a coefficient array at once (see dense.py).
+        If a SubtreeCache is given as cache (see cache.py), the engine is ignored, and the simplified
+        polynomial is looked up in the cache instead, so that repeated subtrees are only expanded once.
         
         Returns a list of graphs (see Unit.get_graph) representing self and its children at 
         each stage of the simplification in chronological order.
+        If trace is False, no graphs are built and an empty list is returned instead.
+        If a SolveStats is given as stats (see stats.py), the time spent in each stage of the
+        simplification, and the counters of the tree engine, are recorded in it.
+        If a Budget is given as budget (see budget.py), its limits are checked between the steps of the
+        tree engine, and a BudgetExceeded error is raised as soon as one is exceeded, leaving self partly
+        simplified. The dense engine and the cache only check the number of terms of the result.
+        To simplify a unit without mutating it, see Unit.simplified.
+
+        Preconditions:
+            - engine in {'tree', 'dense'}
+
+        >>> prod = Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])])
+        >>> len(prod.simplify(engine='dense'))  # the graphs of prod before and after
+        2
+        >>> print(prod)
+        (x^2 + -1)
+        """
+        return collect_graphs(self._simplify_steps_of(trace, engine, cache, stats, budget, False))[1]
+
+    def simplified(self, trace: bool = True, engine: str = 'tree', cache: Optional[Any] = None,
+                   stats: Optional[Any] = None, budget: Optional[Any] = None) -> tuple['Unit', list[tuple]]:
+        """
+        Simplify this unit as in Unit.simplify, but without mutating self or any of its subtrees.
+        Returns the tuple (unit, graphs), where unit is the simplified unit, and graphs is as in Unit.simplify.
+
+        Each step of the simplification returns a new unit instead of rewriting the old one in place,
+        and shares the parts of the old unit that it did not change: monomials, and units that are already
+        simplified, are shared rather than copied. So unit may share subtrees with self (and so must not be
+        mutated either), and since self is only read, it can be simplified again, or by several threads at once.
+
+        Preconditions:
+            - engine in {'tree', 'dense'}
+
+        >>> prod = Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])])
+        >>> unit, graphs = prod.simplified()
+        >>> print(unit)
+        (x^2 + -1)
+        >>> print(prod)
+        ((x + -1) * (x + 1))
+        >>> graphs == prod.simplify()
+        True
+        >>> poly = Unit('+', [mono(1, 2), mono(1, 0)])  # x^2 + 1 is already simplified, so it is shared
+        >>> poly.simplified(False)[0] is poly
+        True
+        >>> unit = Unit('+', [poly, mono(2, 1)]).simplified(False)[0]  # a new sum of the same monomials
+        >>> print(unit)
+        (x^2 + 2x + 1)
+        >>> unit.terms[0] is poly.terms[0]
+        True
+        """
+        return collect_graphs(self._simplify_steps_of(trace, engine, cache, stats, budget, True))
+
+    def simplify_iter(self, engine: str = 'tree', cache: Optional[Any] = None, stats: Optional[Any] = None,
+                      budget: Optional[Any] = None, persistent: bool = False) -> Generator[tuple, None, 'Unit']:
+        """
+        Simplify the terms in this unit as in Unit.simplify (with a trace), but yield each graph as soon as
+        it is built, instead of returning them all at the end. Only the graph being yielded is held, so
+        the graphs can be consumed (e.g., drawn) while self is still being simplified, in bounded memory.
+        self is only fully simplified once this generator is exhausted.
+        If persistent is True, self is not mutated, and the simplified unit (see Unit.simplified) is
+        returned by this generator instead, i.e., it is the value of a yield from expression.
+
+        Preconditions:
+            - engine in {'tree', 'dense'}
+
+        >>> prod = Unit('*', [Unit('+', [mono(1, 1), mono(-1, 0)]), Unit('+', [mono(1, 1), mono(1, 0)])])
+        >>> graphs = prod.simplify_iter()
+        >>> next(graphs)  # the graph of prod before it is simplified
+        ([(0, 1), (1, 2), (1, 3), (0, 4), (4, 5), (4, 6)], {0: '*', 1: '+', 2: 'x', 3: '-1', 4: '+', 5: 'x', 6: '1'})
+        >>> print(prod)
+        ((x + -1) * (x + 1))
+        >>> len(list(graphs))  # the remaining graphs
+        9
+        >>> print(prod)
+        (x^2 + -1)
+        """
+        return (yield from self._simplify_steps_of(True, engine, cache, stats, budget, persistent))
+
+    def _simplify_steps_of(self, trace: bool, engine: str, cache: Optional[Any], stats: Optional[Any],
+                           budget: Optional[Any], persistent: bool) -> Generator[tuple, None, 'Unit']:
+        """
+        Simplify this unit with the given engine or cache, as in Unit.simplify if persistent is False, or
+        as in Unit.simplified if persistent is True. Yields the graphs of the simplification as soon as
+        they are built, and returns the simplified unit (self, if persistent is False).
+        """
+        if cache is not None and self.op != 'x':  # monomials are already simple
+            return (yield from self._assign_poly(cache.poly(self), trace, stats, budget, persistent))
+        elif engine == 'dense':
+            return (yield from self._simplify_dense(trace, stats, budget, persistent))
+
+        return (yield from self._simplify_tree(trace, stats, budget, persistent))
+
+    def _simplify_tree(self, trace: bool = True, stats: Optional[Any] = None, budget: Optional[Any] = None,
+                       persistent: bool = False) -> Generator[tuple, None, 'Unit']:
+        """
+        Simplify this unit with the tree engine, yield the graphs of Unit.simplify in chronological order,
+        and return the simplified unit (see Unit._simplify_steps_of).
+        """
+        # Rather than recursing once per nesting level, each unit's simplification is a generator
+        # that yields the units it needs simplified first, and the graphs it builds, and returns the
+        # simplified unit. The generators of the units being simplified are kept on an explicit stack,
+        # and each simplified unit is sent back to the generator that yielded it.
+        if budget is not None:
+            budget.add_node()
+        stack = [self._simplify_steps(trace, stats, budget, persistent)]
+        units = [self]  # the unit of each generator on the stack
+        result = None  # the simplified unit to send to the generator on top of the stack, if any
+
+        while len(stack) > 0:
+            try:
+                item = stack[-1].send(result)
+            except StopIteration as done:  # the unit on top of the stack is simplified
+                if not persistent:
+                    _clear_ancestors(units)
+                stack.pop()
+                units.pop()
+                result = done.value
+                continue
+
+            if not persistent:  # the unit on top of the stack may have been rewritten before this item
+                _clear_ancestors(units)
+
+            result = None
+            if isinstance(item, Unit):
+                if budget is not None:
+                    budget.add_node()
+                stack.append(item._simplify_steps(trace, stats, budget, persistent))
+                units.append(item)
+            else:
+                yield item
+
+        return result
+
+    def _simplify_steps(self, trace: bool = True, stats: Optional[Any] = None, budget: Optional[Any] = None,
+                        persistent: bool = False) -> Generator[Union['Unit', tuple], Optional['Unit'], 'Unit']:
+        """
+        Simplify this unit with the tree engine, to obtain a result as in Unit.simplify (or Unit.simplified,
+        if persistent is True), and return the simplified unit.
+
+        Yields each unit that must be simplified before the rest of self can be (see Unit._simplify_tree),
+        which is sent back once it is simplified, and each graph of the simplification of self
+        (see Unit.simplify) as soon as it is built.
         """
         match self.op:
             case '+':
-                return self._simplify_sum()
+                return (yield from self._simplify_sum(trace, stats, budget, persistent))
             case '*':
-                return self._simplify_prod()
+                return (yield from self._simplify_prod(trace, stats, budget, persistent))
+            case '^':
+                return (yield from self._simplify_pow(trace, stats, budget, persistent))
             case 'x':
-                return [self.get_graph()]
+                if trace:
+                    yield self.get_graph(stats=stats, budget=budget)
+                return self
             case _:  # we should never hit this case due to the representation invariant
                 raise ValueError
 
-    def _simplify_sum(self) -> list[tuple]:
+    def _simplify_sum(self, trace: bool = True, stats: Optional[Any] = None, budget: Optional[Any] = None,
+                      persistent: bool = False) -> Generator[Union['Unit', tuple], Optional['Unit'], 'Unit']:
         """
-        Simplify this sum to obtain a result as in Unit.simplify.
-
-        Returns a list of graphs (see Unit.get_graph) representing self and its children at 
-        each stage of the simplification in chronological order.
+        Simplify this sum to obtain a result as in Unit.simplify, and return the simplified unit.
+        Yields the units to be simplified first, and the graphs (see Unit.get_graph) representing self
+        and its children at each stage of the simplification in chronological order (none if trace is False),
+        as in Unit._simplify_steps.
 
         Preconditions:
             - self.op = '+'
         """
-        graphs = [self.get_graph()]
+        if trace:
+            yield self.get_graph(stats=stats, budget=budget)
 
         # Simplify the terms
+        terms = []
+
         for term in self.terms:
-            graphs.append(term.simplify())
+            if term.op == 'x':  # monomials are already simple
+                if trace:
+                    yield term.get_graph(stats=stats, budget=budget)
+                terms.append(term)
+            else:
+                terms.append((yield term))
 
         # FLatten the sum (promote nested sums)
-        self._flatten_sum()
+        if stats is not None:
+            start = time.perf_counter()
+            terms = _flatten_sum(terms)
+            stats.add_time('flatten', time.perf_counter() - start)
+            stats.add_peak('sum_terms', len(terms))
+            start = time.perf_counter()
+        else:
+            terms = _flatten_sum(terms)
+
+        if budget is not None:
+            budget.check_terms(len(terms))
 
         # Collect like terms
         coeff_by_deg = {}
-        i = 0
+        monos = {}  # the monomial of each degree, or None if there are several (a lone one is kept as it is)
+        other_terms = []  # rebuilt rather than popped from, so that collecting is linear
 
-        while i < len(self.terms):
-            term = self.terms[i]
+        for term in terms:
             if term.op == 'x':
                 if term.terms[1].value in coeff_by_deg:
                     coeff_by_deg[term.terms[1].value] += term.terms[0].value
+                    monos[term.terms[1].value] = None
                 else:
                     coeff_by_deg[term.terms[1].value] = term.terms[0].value
-                self.terms.pop(i)
+                    monos[term.terms[1].value] = term
             else:
-                i += 1
+                other_terms.append(term)
+
+        terms = other_terms
 
         for deg in coeff_by_deg:
             if coeff_by_deg[deg] != 0:  # ignore (+ 0x^)'s
-                self.terms.append(mono(coeff_by_deg[deg], deg))
+                terms.append(monos[deg] if monos[deg] is not None else mono(coeff_by_deg[deg], deg))
 
-        if len(self.terms) == 0:  # handle (0x^ + ... + 0x^)'s
-            self.terms = [MonoData('coeff', 0), MonoData('deg', 0)]
-            self.op = 'x'
+        if len(terms) == 0:  # handle (0x^ + ... + 0x^)'s
+            simple = mono(0, 0)
+        elif len(terms) == 1 and terms[0].op == 'x':  # promote a single-term sum consisting of a monomial
+            simple = terms[0]
+        else:
+            simple = Unit('+', terms)
 
-        # Promote a single-term sum consisting of a monomial
-        if len(self.terms) == 1 and self.terms[0].op == 'x':
-            self.terms = self.terms[0].terms
-            self.op = 'x'
+        result = self._replace(simple, persistent)
 
-        graphs.append(self.get_graph())
+        if stats is not None:
+            stats.add_time('collect', time.perf_counter() - start)
 
-        return flatten_list(graphs)
+        if trace:
+            yield result.get_graph(stats=stats, budget=budget)
 
+        return result
 
-    def _flatten_sum(self) -> None:
+    def _replace(self, simple: 'Unit', persistent: bool) -> 'Unit':
+        """
+        Return the unit that this unit simplifies to, given a unit simple that is equal to it.
+        If persistent is False, self is rewritten in place to have the op and terms of simple, and returned.
+        Otherwise, self is returned if simple has the same op and the very same terms (i.e., self was
+        already simplified), so that it is shared, and simple is returned if not.
         """
-        Flatten this sum so the resulting self.terms does not contain any sums.
+        if not persistent:
+            self.op, self.terms, self._str = simple.op, simple.terms, None
+            return self
+        elif simple.op == self.op and len(simple.terms) == len(self.terms) \
+                and all(t1 is t2 for t1, t2 in zip(simple.terms, self.terms)):
+            return self
+        else:
+            return simple
+
+    def _simplify_prod(self, trace: bool = True, stats: Optional[Any] = None, budget: Optional[Any] = None,
+                       persistent: bool = False) -> Generator[Union['Unit', tuple], Optional['Unit'], 'Unit']:
+        """
+        Simplify this product to obtain a result as in Unit.simplify, and return the simplified unit.
+        Yields the units to be simplified first, and the graphs (see Unit.get_graph) representing self
+        and its children at each stage of the simplification in chronological order (none if trace is False),
+        as in Unit._simplify_steps. An empty product is left as it is, without any graphs.
+
+        Each factor is simplified to a polynomial first, and then the polynomials are multiplied
+        pairwise, collecting like terms after each multiplication (see poly.poly_prod). This takes
+        polynomial rather than exponential time in the number of factors that are sums.
+        Factors that are the same Unit (e.g., interned subtrees, see SubtreeCache.intern_terms) are only
+        simplified once, and equal polynomials are raised to their power by repeated squaring (see poly.poly_pow).
 
         Preconditions:
-            - self.op = '+'
+            - self.op = '*'
         """
-        flat_terms = []
+        if len(self.terms) == 0:
+            return self
+
+        if trace:
+            yield self.get_graph(stats=stats, budget=budget)
+
+        # Simplify the factors, only once for each distinct Unit
+        factors = []
+        simplified = {}  # maps the id of each distinct sum or product factor to its simplified unit
 
-        while len(self.terms) > 0:
-            term = self.terms.pop(0)
-            if term.op == '+':
-                term._flatten_sum()
-                flat_terms.extend(term.terms)
+        for term in self.terms:
+            if term.op == 'x':  # monomials are already simple
+                if trace:
+                    yield term.get_graph(stats=stats, budget=budget)
+                factors.append(term)
             else:
-                flat_terms.append(term)
+                if id(term) not in simplified:
+                    simplified[id(term)] = yield term
+                factors.append(simplified[id(term)])
+
+        # Multiply the factors that are now polynomials, raising equal polynomials to their power
+        if stats is not None:
+            start = time.perf_counter()
+
+        powers = {}  # maps each distinct polynomial (as a sorted tuple of its terms) to [poly, power]
+        other_terms = []  # the factors that cannot be multiplied out (i.e., empty products)
+
+        for term in factors:
+            poly = term._get_poly()
+            if poly is None:
+                other_terms.append(term)
+            else:
+                key = tuple(sorted(poly.items()))
+                if key in powers:
+                    powers[key][1] += 1
+                else:
+                    powers[key] = [poly, 1]
 
-        self.terms = flat_terms
+        product = poly_prod([poly_pow(poly, k, budget) for poly, k in powers.values()], budget)
 
-    def _simplify_prod(self) -> list[tuple]:
+        if len(product) == 0:  # handle (0x^ * ...)'s
+            simple = mono(0, 0)
+        elif len(other_terms) == 0:
+            simple = poly_unit(product)
+        elif product == {0: 1}:  # ignore non-isolated (* 1)'s
+            simple = Unit('*', other_terms)
+        else:
+            simple = Unit('*', other_terms + [poly_unit(product)])
+
+        result = self._replace(simple, persistent)
+
+        if stats is not None:
+            stats.add_time('distribute', time.perf_counter() - start)
+            # poly_prod multiplies the powers len(powers) - 1 times, and poly_pow squares bit_length - 1 times
+            # and multiplies in the other 1 bits
+            muls = max(len(powers) - 1, 0) + sum(k.bit_length() + bin(k).count('1') - 2 for _, k in powers.values())
+            stats.add_count('distributions', muls)
+            stats.add_count('distributed_terms', len(product))
+
+        if trace:
+            yield result.get_graph(stats=stats, budget=budget)
+
+        return result
+
+    def _simplify_pow(self, trace: bool = True, stats: Optional[Any] = None, budget: Optional[Any] = None,
+                      persistent: bool = False) -> Generator[Union['Unit', tuple], Optional['Unit'], 'Unit']:
         """
-        Simplify this product to obtain a result as in Unit.simplify.
+        Simplify this power to obtain a result as in Unit.simplify, and return the simplified unit.
+        Yields the unit to be simplified first (its base), and the graphs (see Unit.get_graph) representing self
+        and its children at each stage of the simplification in chronological order (none if trace is False),
+        as in Unit._simplify_steps.
 
-        Returns a list of graphs (see Unit.get_graph) representing self and its children at 
-        each stage of the simplification in chronological order.
+        The base is simplified once, and its polynomial is raised to the power by repeated squaring
+        (see poly.poly_pow), so this takes O(log k) polynomial multiplications for the power k.
+        A base that cannot be multiplied out (i.e., an empty product) is left raised to the power.
 
         Preconditions:
-            - self.op = '*'
+            - self.op = '^'
         """
-        graphs = [self.get_graph()]
+        if trace:
+            yield self.get_graph(stats=stats, budget=budget)
 
-        # Search for the first sum
-        if len(self.terms) == 0:
-            return []
+        base, power = (yield self.terms[0]), self.terms[1]
 
-        i = 0
-        term = self.terms[0]
+        if stats is not None:
+            start = time.perf_counter()
 
-        while not (i + 1 >= len(self.terms) or term.op == '+'):
-            i += 1
-            term = self.terms[i]
+        poly = base._get_poly()
+        k = int(power.terms[0].value)
+
+        if poly is None:
+            result = self._replace(Unit('^', [base, power]), persistent)
+        else:
+            product = poly_pow(poly, k, budget)
+            result = self._replace(poly_unit(product), persistent)
+
+            if stats is not None:
+                stats.add_time('distribute', time.perf_counter() - start)
+                stats.add_count('distributions', k.bit_length() + bin(k).count('1') - 2)  # as in Unit._simplify_prod
+                stats.add_count('distributed_terms', len(product))
 
-        # If self.terms contains a sum
-        if term.op == '+':
-            # Distribute self.terms - [term] over term
-            self.terms.pop(i)
-            expansion_terms = []
-            for subterm in term.terms:
-                expansion_terms.append(Unit('*', self.terms + [subterm]))
+        if trace:
+            yield result.get_graph(stats=stats, budget=budget)
 
-            # The product becomes a sum
-            self.terms = expansion_terms
-            self.op = '+'
+        return result
 
-            # Recursively simplify the sum (which may distribute again if necessary)
-            graphs.append(self.simplify())
+    def _get_poly(self) -> Optional[dict[float, float]]:
+        """
+        Return the polynomial (see poly.py) represented by this unit, or None if it is not a
+        monomial or a sum of monomials.
 
-        # If self.terms only contains products
+        >>> Unit('+', [mono(2, 1), mono(1, 1), mono(-1, 0)])._get_poly()
+        {1: 3, 0: -1}
+        """
+        if self.op == 'x':
+            return {self.terms[1].value: self.terms[0].value} if self.terms[0].value != 0 else {}
+        elif self.op == '+' and all(term.op == 'x' for term in self.terms):
+            return poly_sum([{term.terms[1].value: term.terms[0].value} for term in self.terms])
         else:
-            # Collect like factors
-            i = 0
-            coeff = 1
-            deg = 0
-
-            while not (i >= len(self.terms) or coeff == 0):
-                term = self.terms[i]
-                if term.op == 'x':
-                    coeff *= term.terms[0].value
-                    deg += term.terms[1].value
-                    self.terms.pop(i)
+            return None
+
+    def degree_bound(self) -> tuple[float, bool]:
+        """
+        Return a tuple (bound, exact), where bound is an upper bound on the degree of the polynomial
+        that self simplifies to, computed bottom-up without simplifying anything: the bound of a sum is
+        the largest bound of its terms, the bound of a product is the sum of the bounds of its factors,
+        and the bound of a power is the bound of its base times the power.
+        The zero polynomial has the bound float('-inf').
+
+        exact is True if bound is the degree of the simplified polynomial, i.e., if its leading terms
+        cannot cancel. This is the case unless a sum has several terms of the largest bound whose leading
+        coefficients might have opposite signs (e.g., (x^3 + -x^3)); only then might the degree be lower.
+
+        This takes time linear in the number of distinct units in self, even if they are shared
+        (e.g., interned subtrees, see SubtreeCache.intern_terms), and does not depend on the powers in self.
+
+        >>> Unit('*', [mono(1, 50), Unit('+', [mono(1, 1), mono(2, 0)])]).degree_bound()  # x^50 * (x + 2)
+        (51, True)
+        >>> Unit('+', [mono(2, 3), mono(-1, 3), mono(1, 0)]).degree_bound()  # 2x^3 + -x^3 + 1
+        (3, False)
+        >>> Unit('+', [mono(2, 3), mono(1, 3), mono(0, 5)]).degree_bound()  # 2x^3 + x^3 + 0x^5
+        (3, True)
+        >>> Unit('^', [Unit('+', [mono(-1, 2), mono(1, 0)]), mono(3, 0)]).degree_bound()  # (-x^2 + 1)^3
+        (6, True)
+        """
+        if self.op == 'x':  # the degree of a monomial is exact
+            return (self.terms[1].value if self.terms[0].value != 0 else float('-inf'), True)
+
+        # Evaluate the bounds in post-order onto a stack of (bound, sign), where sign is that of the leading
+        # coefficient, or 0 if the bound is not exact. Monomials are evaluated as soon as their parent is
+        # reached (the order of the terms does not matter), and shared units are only evaluated once.
+        zero = (float('-inf'), 1)  # the (bound, sign) of the zero polynomial
+        values = []
+        shared = {}  # maps the id of each sum or product evaluated so far to its (bound, sign)
+        stack = [self]  # the units yet to be evaluated; None means the terms of the last unit in ready are
+        ready = []
+
+        while len(stack) > 0:
+            unit = stack.pop()
+
+            if unit is None:  # combine the bounds of the terms on top of values
+                unit = ready.pop()
+                i = len(values) - (1 if unit.op == '^' else len(unit.terms))
+
+                if unit.op == '^':  # only the base was evaluated
+                    k = unit.terms[1].terms[0].value
+                    top, top_sign = values[i][0] * k, values[i][1] ** int(k)
+                elif unit.op == '*':
+                    top, top_sign = 0, 1
+                    for bound, sign in values[i:]:
+                        top, top_sign = top + bound, top_sign * sign
                 else:
-                    i += 1
+                    top, top_sign = zero
+                    for bound, sign in values[i:]:
+                        if bound > top:
+                            top, top_sign = bound, sign
+                        elif bound == top and sign != top_sign:  # the leading terms might cancel
+                            top_sign = 0
 
-            if coeff == 0:  # handle (0x^ * ...)'s
-                self.terms = [MonoData('coeff', 0), MonoData('deg', 0)]
-                self.op = 'x'
-            elif not (deg == 0 and coeff == 1 and len(self.terms) > 0):  # ignore non-isolated (* 1)'s
-                self.terms.append(mono(coeff, deg))
+                del values[i:]
+                # a product with a zero factor, or a sum of zeros, is zero
+                values.append((top, top_sign) if top != zero[0] else zero)
+                shared[id(unit)] = values[-1]
 
-            # Promote a single-term product consisting of a monomial
-            if len(self.terms) == 1 and self.terms[0].op == 'x':
-                self.terms = self.terms[0].terms
-                self.op = 'x'
+            elif id(unit) in shared:
+                values.append(shared[id(unit)])
 
-            graphs.append(self.get_graph())
+            else:
+                ready.append(unit)
+                stack.append(None)
+                for term in (unit.terms[:1] if unit.op == '^' else unit.terms):
+                    if term.op != 'x':
+                        stack.append(term)
+                    elif term.terms[0].value != 0:
+                        values.append((term.terms[1].value, 1 if term.terms[0].value > 0 else -1))
+                    else:
+                        values.append(zero)
+
+        bound, sign = values[0]
+        return (bound, sign != 0)
+
+    def _simplify_dense(self, trace: bool = True, stats: Optional[Any] = None, budget: Optional[Any] = None,
+                        persistent: bool = False) -> Generator[tuple, None, 'Unit']:
+        """
+        Simplify this unit to obtain a result as in Unit.simplify, by adding and convolving
+        dense coefficient arrays instead of distributing terms within the tree.
+        Falls back to the tree engine if self cannot be represented densely (see dense.get_coeffs).
+
+        Yields the graphs (see Unit.get_graph) of self before and after the simplification
+        (none if trace is False), and returns the simplified unit (see Unit._simplify_steps_of).
+        """
+        from dense import get_coeffs, to_coeff_by_deg  # import NumPy only when the engine is used
 
-        return flatten_list(graphs)
+        coeffs = get_coeffs(self) if self.op != 'x' else None
+        if coeffs is None:  # monomials are already simple
+            return (yield from self._simplify_tree(trace, stats, budget, persistent))
 
-    def get_graph(self, root: int = 0) -> tuple:
+        return (yield from self._assign_poly(to_coeff_by_deg(coeffs), trace, stats, budget, persistent))
+
+    def _assign_poly(self, coeff_by_deg: dict[float, float], trace: bool = True, stats: Optional[Any] = None,
+                     budget: Optional[Any] = None, persistent: bool = False) -> Generator[tuple, None, 'Unit']:
+        """
+        Replace the terms of this unit with the sum of the monomials coeff_by_deg[deg] x^deg,
+        in the simplified form given by poly_unit (or, if persistent is True, return that sum
+        without changing self).
+
+        Yields the graphs (see Unit.get_graph) of self before and after the replacement
+        (none if trace is False), and returns the simplified unit.
+        """
+        if trace:
+            yield self.get_graph(stats=stats, budget=budget)
+
+        if budget is not None:
+            budget.check_terms(len(coeff_by_deg))
+
+        result = self._replace(poly_unit(coeff_by_deg), persistent)
+
+        if trace:
+            yield result.get_graph(stats=stats, budget=budget)
+
+        return result
+
+    def get_graph(self, root: int = 0, stats: Optional[Any] = None, budget: Optional[Any] = None) -> tuple:
         """
         Return a graph that represents self. The returned value is a tuple (edges, labels), where
             - edges is a list of tuples referring to unique int ids >= root for every term that is a child of self.
@@ -303,26 +718,41 @@ class Unit(Expr):
             - labels is a dict mapping int ids to str representations of the terms.
         If the graph has a single vertex (i.e., self is a monomial), then edges = (root, root) is returned.
         Otherwise, the returned graph is a tree (i.e., an acyclic connected graph).
+        If a SolveStats is given as stats, the graph and the time taken to build it are recorded in it.
+        If a Budget is given as budget, the graph counts towards its limit on graphs (see budget.py).
         """
+        if budget is not None:
+            budget.add_graph()
+
+        if stats is not None:
+            start = time.perf_counter()
+            graph = self.get_graph(root)
+            stats.add_graph(graph, time.perf_counter() - start)
+            return graph
+
         if self.op == 'x':
             return ([(root, root)], {root: str(self)})
-        else:
-            edges = []
-            labels = {root: self.op}
-            i = root + 1
-
-            for term in self.terms:
-                edges.append((root, i))
-                if term.op == 'x':
-                    labels[i] = str(term)
-                    i += 1
-                else:
-                    sub_edges, sub_labels = term.get_graph(i)
-                    edges.extend(sub_edges)
-                    labels.update(sub_labels)
-                    i += len(sub_labels)
 
-            return (edges, labels)
+        # Give the ids in pre-order, so that each subtree has consecutive ids
+        edges = []
+        labels = {}
+        stack = [(self, None)]  # the units yet to be given ids, and the ids of their parents
+        i = root
+
+        while len(stack) > 0:
+            unit, parent = stack.pop()
+            if parent is not None:
+                edges.append((parent, i))
+
+            if unit.op == 'x':
+                labels[i] = str(unit)
+            else:
+                labels[i] = unit.op
+                stack.extend((term, i) for term in reversed(unit.terms))
+
+            i += 1
+
+        return (edges, labels)
 
 
 def mono(coeff: float, deg: float) -> Unit:
@@ -332,6 +762,113 @@ def mono(coeff: float, deg: float) -> Unit:
     return Unit('x', [MonoData('coeff', coeff), MonoData('deg', deg)])
 
 
+def poly_unit(coeff_by_deg: dict[float, float]) -> Unit:
+    """
+    Return a Unit representing the sum of the monomials coeff_by_deg[deg] x^deg, in the form
+    produced by Unit.simplify, i.e.,
+        - the monomial 0, if every coefficient is zero;
+        - a monomial, if exactly one coefficient is nonzero;
+        - a sum of monomials of unique degrees, otherwise.
+
+    >>> print(poly_unit({2: 1, 1: 0, 0: -1}))
+    (x^2 + -1)
+    >>> print(poly_unit({1: 0}))
+    0
+    """
+    terms = [mono(coeff_by_deg[deg], deg) for deg in coeff_by_deg if coeff_by_deg[deg] != 0]
+
+    if len(terms) == 0:
+        return mono(0, 0)
+    elif len(terms) == 1:
+        return terms[0]
+    else:
+        return Unit('+', terms)
+
+
+# The rank of each op among terms of the same degree in the canonical order (see _canonical).
+RANKS = {'x': 0, '+': 1, '*': 2, '^': 3}
+
+
+def _order(term: Unit) -> tuple[float, int]:
+    """
+    Return the key of term in the canonical order of the terms of a unit (see _canonical).
+    """
+    return (term.terms[1].value if term.op == 'x' else 0, RANKS[term.op])
+
+
+def _canonical(terms: list[Unit]) -> list[Unit]:
+    """
+    Return the terms of a sum or product in canonical order: monomials of positive degree first, in nonincreasing
+    order of degree, then powers, then products, then sums, and then the other monomials, in nonincreasing order
+    of degree.
+    Terms of the same order are kept in the order they were given. terms itself is returned if it is
+    already in that order, and a new sorted list otherwise.
+
+    >>> _canonical([mono(1, 0), mono(1, 1), Unit('+', [])])
+    [x, (), 1]
+    """
+    last_deg, last_rank = float('inf'), 0
+
+    for term in terms:  # the key of _order, inlined, since this runs for every new sum and product
+        rank = RANKS[term.op]
+        deg = term.terms[1].value if rank == 0 else 0
+        if deg > last_deg or (deg == last_deg and rank > last_rank):
+            return sorted(terms, key=_order, reverse=True)  # a reverse sort is still stable
+        last_deg, last_rank = deg, rank
+
+    return terms
+
+
+def _clear_ancestors(units: list[Unit]) -> None:
+    """
+    Clear the cached strings of the units in units but the last, which are the ancestors of the last unit,
+    since it may have been rewritten in place (see Unit._replace), and so their strings may be out of date.
+
+    If a unit has a cached string, then so does every unit below it whose string was not cleared since,
+    so the units are cleared from the innermost outwards, stopping at the first one without a cached string.
+    So each string is cleared at most once, and this takes constant time if no strings were built.
+    """
+    i = len(units) - 2
+
+    while i >= 0 and units[i]._str is not None:
+        units[i]._str = None
+        i -= 1
+
+
+def _flatten_sum(terms: list[Unit]) -> list[Unit]:
+    """
+    Return the terms of a sum with the given terms, flattened so that none of them is a sum.
+    The terms of nested sums are promoted in their place, in the same order.
+    """
+    flat_terms = []
+    stack = [iter(terms)]  # the terms of each enclosing sum that are yet to be flattened
+
+    while len(stack) > 0:
+        term = next(stack[-1], None)
+        if term is None:
+            stack.pop()
+        elif term.op == '+':
+            stack.append(iter(term.terms))
+        else:
+            flat_terms.append(term)
+
+    return flat_terms
+
+
+def collect_graphs(steps: Generator[tuple, None, Any]) -> tuple[Any, list[tuple]]:
+    """
+    Run the generator steps to the end, and return the tuple (value, graphs), where value is the value
+    it returns, and graphs is the list of graphs it yields, in order.
+    """
+    graphs = []
+
+    while True:
+        try:
+            graphs.append(next(steps))
+        except StopIteration as done:
+            return (done.value, graphs)
+
+
 def normalize_fstr(s: str) -> str:
     """
     Return a normalized string for a float by removing any trailing zeroes after the decimal.
@@ -348,13 +885,20 @@ def flatten_list(lst: Any) -> list:
         - lst, if lst is not a list; or
         - the same elements as lst, if list is a list.
     """
-    if not isinstance(lst, list):
-        return [lst]
-    else:
-        flat_lst = []
-        for sublst in lst:
-            flat_lst.extend(flatten_list(sublst))
-        return flat_lst
+    flat_lst = []
+    stack = [iter([lst])]  # the elements of each enclosing list that are yet to be flattened
+    done = object()
+
+    while len(stack) > 0:
+        item = next(stack[-1], done)
+        if item is done:
+            stack.pop()
+        elif isinstance(item, list):
+            stack.append(iter(item))
+        else:
+            flat_lst.append(item)
+
+    return flat_lst
 
 
 if __name__ == '__main__':
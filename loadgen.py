@@ -0,0 +1,220 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Load Generator Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for sending requests to a SolveServer (see server.py), and a load generator
+that solves random equations (see suite.generate_equation) on a running server from many
+concurrent connections, and reports the latency percentiles and throughput it observed.
+
+Run it against a server on localhost (e.g., started by python main.py --serve 8111) with
+    python loadgen.py --port 8111 --concurrency 64 --requests 5000
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, Optional
+from suite import generate_equation
+
+
+class Connection:
+    """
+    A keep-alive HTTP connection to a SolveServer, which sends one request at a time.
+
+    Instance Attributes:
+        - host: The host of the server.
+        - port: The port of the server.
+    """
+    host: str
+    port: int
+    _reader: Optional[asyncio.StreamReader]
+    _writer: Optional[asyncio.StreamWriter]
+
+    def __init__(self, host: str, port: int) -> None:
+        """
+        Initialize a Connection to the server at host and port, which is opened on its first request.
+        """
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, payload: Optional[Any] = None,
+                      keep_alive: bool = True) -> tuple[int, Any]:
+        """
+        Send a request with the given method and path, and with payload as its JSON body (or no body if
+        payload is None), and return the tuple (status, body) of the response, where body is decoded from JSON.
+        If keep_alive is False, the connection is closed after the response.
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        body = b'' if payload is None else json.dumps(payload).encode()
+        head = (f'{method} {path} HTTP/1.1\r\n'
+                f'Host: {self.host}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        self._writer.write(head.encode() + body)
+        await self._writer.drain()
+
+        status = int((await self._reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if line in {b'\r\n', b''}:
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+
+        data = json.loads(await self._reader.readexactly(length))
+        if not keep_alive:
+            await self.close()
+        return (status, data)
+
+    async def close(self) -> None:
+        """
+        Close this connection, if it is open.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader = self._writer = None
+
+
+async def post_json(host: str, port: int, path: str, payload: Any) -> tuple[int, Any]:
+    """
+    Send payload as JSON to path on the server at host and port on a new connection, and return the tuple
+    (status, body) of the response (see Connection.request).
+    """
+    return await Connection(host, port).request('POST', path, payload, keep_alive=False)
+
+
+async def get_json(host: str, port: int, path: str) -> tuple[int, Any]:
+    """
+    Send a GET request for path to the server at host and port on a new connection, and return the tuple
+    (status, body) of the response (see Connection.request).
+    """
+    return await Connection(host, port).request('GET', path, keep_alive=False)
+
+
+async def run_load(host: str, port: int, equations: list[str], concurrency: int, n: int = 5) -> dict:
+    """
+    Solve each equation in equations on the server at host and port, with roots rounded to n decimal places,
+    from concurrency connections at once (each sending its next request as soon as it gets a response),
+    and return a report of the run, i.e., a dict with the keys
+        - 'requests', 'concurrency': the number of requests and connections;
+        - 'seconds': the time taken by the whole run;
+        - 'throughput': the number of responses per second;
+        - 'p50', 'p90', 'p99', 'max': percentiles of the latency of the requests, in seconds (see percentile);
+        - 'statuses': the number of responses with each status code.
+
+    Preconditions:
+        - equations != []
+        - concurrency >= 1
+    """
+    latencies = []
+    statuses = {}
+    remaining = iter(equations)
+
+    async def client() -> None:
+        connection = Connection(host, port)
+        try:
+            for equation in remaining:  # the connections share the iterator, so each equation is sent once
+                start = time.perf_counter()
+                status, _ = await connection.request('POST', '/solve', {'equation': equation, 'decimals': n})
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    seconds = time.perf_counter() - start
+    latencies.sort()
+
+    return {'requests': len(latencies), 'concurrency': concurrency, 'seconds': seconds,
+            'throughput': len(latencies) / seconds, 'p50': percentile(latencies, 50), 'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99), 'max': latencies[-1], 'statuses': dict(sorted(statuses.items()))}
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Return the q-th percentile of values by the nearest-rank method, i.e., the smallest value
+    that is at least q percent of values.
+
+    Preconditions:
+        - values is sorted and non-empty
+        - 0 < q <= 100
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    >>> percentile([1, 2, 3, 4], 99)
+    4
+    """
+    rank = -(-len(values) * q // 100)  # the ceiling of len(values) * q / 100
+    return values[max(int(rank), 1) - 1]
+
+
+def generate_equations(count: int, seed: int = 111, depth: int = 1) -> list[str]:
+    """
+    Return count random equations of the given depth (see suite.generate_equation), which are mostly
+    quadratic, and some of which are unsupported.
+
+    >>> len(generate_equations(10))
+    10
+    """
+    rng = random.Random(seed)
+    return [generate_equation(rng, depth, 2, 2, 2) for _ in range(count)]
+
+
+def print_report(report: dict) -> None:
+    """
+    Print report (see run_load) as one line.
+    """
+    print(f'{report["concurrency"]:>5} clients, {report["requests"]} requests in {report["seconds"]:.3f} s: '
+          f'{report["throughput"]:.0f} req/s, p50 {report["p50"] * 1000:.2f} ms, p90 {report["p90"] * 1000:.2f} ms, '
+          f'p99 {report["p99"] * 1000:.2f} ms, max {report["max"] * 1000:.2f} ms, statuses {report["statuses"]}')
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Return the command-line arguments of the load generator.
+    """
+    parser = argparse.ArgumentParser(description='Send random equations to a running solve server.')
+    parser.add_argument('--host', default='127.0.0.1', help='the host of the server (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8111, help='the port of the server (default: 8111)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 64],
+                        help='run once with each of these numbers of concurrent connections (default: 1 8 64)')
+    parser.add_argument('--requests', type=int, default=2000, help='the number of requests per run (default: 2000)')
+    parser.add_argument('--depth', type=int, default=1, help='the depth of the random equations (default: 1)')
+    parser.add_argument('--seed', type=int, default=111, help='the seed of the random equations (default: 111)')
+    return parser.parse_args()
+
+
+async def run_loadgen(args: argparse.Namespace) -> None:
+    """
+    Run the load generator with the given command-line arguments, and print a report of each run,
+    and the metrics of the server afterwards.
+    """
+    equations = generate_equations(args.requests, args.seed, args.depth)
+
+    for concurrency in args.concurrency:
+        print_report(await run_load(args.host, args.port, equations, concurrency))
+
+    _, metrics = await get_json(args.host, args.port, '/metrics')
+    print(f'server: {metrics["batches"]} batches of {metrics["mean_batch_size"]:.1f} equations on average, '
+          f'responses {metrics["responses"]}')
+
+
+if __name__ == '__main__':
+    asyncio.run(run_loadgen(get_args()))
@@ -8,18 +8,189 @@ Runs the main loop of the equation solver. The user inputs an equation according
 to the format provided in parse.py / get_unit. If the equation is constant,
 linear, or quadratic, then the solution set is printed. The user is then asked
 to view a visualization of the solution process. To view the next step in the
-visualization, the user must close the current window.
+visualization, the user must close the current window. The steps are shown as soon
+as they are built (see Equation.solve_iter), so the first one appears right away.
+
+Alternatively, run with --batch FILE to solve every equation in FILE (or stdin,
+if FILE is -), one per line, without any prompts. The results are written as
+JSON Lines (see batch.py) to stdout, or to the file given by --output.
+Use --workers to solve them in parallel, or --cache-size (and --cache-file)
+to cache the solutions of repeated equations when solving them serially.
+Use --stats FILE to write stats on where the time went (see stats.py) to FILE;
+it cannot be combined with --workers or --cache-size. Use --max-terms, --max-nodes and
+--timeout to limit the work done on each equation (see budget.py); equations
+that exceed a limit get the status 'aborted'.
+
+Use --render EQUATION to render each step of solving EQUATION to numbered image files
+without a display (see render.py), in the directory given by --render-to, or to an
+animated GIF if --render-to ends in .gif. Use --workers to render them in parallel,
+and --max-graphs to stop once that many graphs are built for the steps (a graph per side
+of the equation, so the first step takes two).
+
+Use --serve PORT to run a long-lived HTTP/JSON service on localhost that solves
+equations sent to it in micro-batches (see server.py), with --workers processes.
+--timeout sets how long a request may take, and --max-queue how many requests may
+wait before new ones are refused. See loadgen.py to measure its latency under load.
 
 Copyright
 ===============================
 
 This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
 
+import argparse
+import itertools
+import sys
+from typing import Iterator
 from parse import *
-from visualize import *
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Return the command-line arguments of the equation solver.
+    """
+    parser = argparse.ArgumentParser(description='Solve polynomial equations of degree up to two.')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='solve the equations in FILE (- for stdin), one per line, without prompts')
+    parser.add_argument('--output', metavar='FILE', default='-',
+                        help='write batch results as JSON Lines to FILE (default: stdout)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='solve batch or served equations (or render steps) across this many processes '
+                             '(default: 1)')
+    parser.add_argument('--chunksize', type=int, default=256,
+                        help='send batch equations to the processes this many at a time (default: 256)')
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help='cache the solutions of up to this many batch equations (default: 0, no cache)')
+    parser.add_argument('--cache-file', metavar='FILE',
+                        help='also store cached solutions in the SQLite database FILE, across runs')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write stats on the time spent in each stage of solving the batch as JSON to FILE')
+    parser.add_argument('--max-terms', type=int,
+                        help='abort a batch equation once a sum or product has more than this many terms')
+    parser.add_argument('--max-nodes', type=int,
+                        help='abort a batch equation once more than this many sums and products are simplified')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='abort a batch equation once it has taken more than this many seconds '
+                             '(when serving, answer a request with 504 instead; default: 5)')
+    parser.add_argument('--render', metavar='EQUATION',
+                        help='render each step of solving EQUATION to images, without a display')
+    parser.add_argument('--max-graphs', type=int,
+                        help='stop rendering once more than this many graphs are built for the steps, one per side '
+                             'of the equation (at least 2, for the first step; see budget.py)')
+    parser.add_argument('--render-to', metavar='PATH', default='trace',
+                        help='write the rendered steps as numbered images to the directory PATH, '
+                             'or as an animated GIF to PATH if it ends in .gif (default: trace)')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png',
+                        help='the format of the numbered images of the rendered steps (default: png)')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='serve POST /solve and GET /metrics as JSON over HTTP on PORT of localhost')
+    parser.add_argument('--window', type=float, default=0.002, metavar='SECONDS',
+                        help='when serving, batch the requests that arrive within this many seconds (default: 0.002)')
+    parser.add_argument('--max-queue', type=int, default=1024,
+                        help='when serving, refuse requests with 503 while this many are waiting (default: 1024)')
+    parser.add_argument('-n', '--decimals', type=int, default=5,
+                        help='round solutions to this many decimal places (default: 5)')
+    args = parser.parse_args()
+
+    if args.stats is not None and (args.workers > 1 or args.cache_size > 0):
+        parser.error('--stats only times serial batches without a cache, so it cannot be used with --workers '
+                     'or --cache-size')
+    elif args.cache_size > 0 and args.workers > 1:
+        parser.error('--cache-size only applies to serial batches, so it cannot be used with --workers')
+    elif args.cache_file is not None and args.cache_size == 0:
+        parser.error('--cache-file requires --cache-size')
+    elif args.max_graphs is not None and args.render is None:
+        parser.error('--max-graphs only limits the trace of --render, so it requires --render')
+    elif args.max_graphs is not None and args.max_graphs < 2:
+        parser.error('--max-graphs must be at least 2, since the first step takes a graph for each side')
+
+    return args
 
 
 if __name__ == '__main__':
+    args = get_args()
+
+    if args.batch is not None:
+        from batch import solve_file
+
+        budget = None
+        if args.max_terms is not None or args.max_nodes is not None or args.timeout is not None:
+            from budget import Budget
+            budget = Budget(args.max_terms, args.max_nodes, max_seconds=args.timeout)
+
+        if args.stats is not None:
+            from stats import SolveStats
+            stats = SolveStats()
+            solve_file(args.batch, args.output, args.decimals, stats=stats, budget=budget)
+            stats.dump(args.stats)
+        elif args.cache_size > 0:
+            from cache import SolutionCache
+            with SolutionCache(args.cache_size, args.cache_file, args.cache_size) as solutions:
+                solve_file(args.batch, args.output, args.decimals, solutions=solutions, budget=budget)
+        else:
+            solve_file(args.batch, args.output, args.decimals, args.workers, args.chunksize, budget=budget)
+        sys.exit()
+
+    if args.serve is not None:
+        import asyncio
+        from budget import Budget
+        from server import SolveServer
+
+        async def serve() -> None:
+            """
+            Serve requests on localhost until interrupted.
+            """
+            timeout = 5.0 if args.timeout is None else args.timeout
+            server = SolveServer(args.workers, args.window, max_queue=args.max_queue, timeout=timeout,
+                                 budget=Budget(args.max_terms, args.max_nodes, max_seconds=timeout))
+            await server.start(port=args.serve)
+            print(f'Serving on http://127.0.0.1:{server.port} with {args.workers} worker(s)')
+            try:
+                await server.serve_forever()
+            finally:
+                await server.close()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        sys.exit()
+
+    if args.render is not None:
+        from budget import Budget, BudgetExceeded
+        from render import render_files, render_gif
+
+        budget = None if args.max_graphs is None else Budget(max_graphs=args.max_graphs)
+
+        try:
+            eqn = get_equation(args.render)
+        except ParseError as error:
+            print(f'Incorrect format: {error.message}. See parse.py / get_unit.')
+            sys.exit(1)
+
+        def get_graphs() -> Iterator[tuple]:
+            """
+            Yield each graph of the trace of solving eqn, until budget is exceeded.
+            """
+            try:
+                for graph in eqn.solve_iter(args.decimals, budget=budget):
+                    if isinstance(graph, tuple):  # the last item is the set of solutions
+                        yield graph
+            except BudgetExceeded as error:
+                print(f'Stopped early: {error.message}.')
+
+        graphs = get_graphs()
+        first = next(graphs, None)
+        if first is None:
+            print('There are no steps to render.')
+            sys.exit(1)
+        graphs = itertools.chain([first], graphs)
+        if args.render_to.endswith('.gif'):
+            count = render_gif(graphs, args.render_to, workers=args.workers)
+        else:
+            count = len(render_files(graphs, args.render_to, args.format, args.workers))
+        print(f'Rendered {count} steps to {args.render_to}')
+        sys.exit()
+
     string = input('Equation?\n> ')
 
     # =============================== EXAMPLES ===============================
@@ -39,13 +210,19 @@ if __name__ == '__main__':
     while string != '':
         try:
             eqn = get_equation(string)
-        except:  # since error types can be unexpected for bad inputs,
-                 # we assume get_equation satisfies its specifications
-            print('Incorrect format. See parse.py / get_unit.')
+        except ParseError as error:
+            print(f'Incorrect format: {error.message}. See parse.py / get_unit.')
+            print(f'> {string}\n  {" " * error.offset}^')
         else:
-            sols, graphs = eqn.solve(5)
+            # Solve without mutating eqn, so that it can be solved again to be visualized
+            try:
+                sols = eqn.solve(args.decimals, trace=False, persistent=True)[0]
+            except OverflowError:
+                sols = None
 
-            if len(sols) == 0:
+            if sols is None:
+                print('The solutions are out of the range of a float.')
+            elif len(sols) == 0:
                 print('No solutions.')
             elif any(math.isnan(s) for s in sols):
                 print('This equation is not supported.')
@@ -56,7 +233,12 @@ if __name__ == '__main__':
                 print(f'x = {sols_str}')
 
                 if input('Visualize? (Y/N)\n> ') == 'Y':
-                    for graph in graphs:
-                        visualize(graph)
+                    # only load the visualization stack when needed
+                    from visualize import LayoutCache, visualize
+                    layouts = LayoutCache()
+                    # Solve the equation again, drawing each step as it is built, rather than holding every step
+                    for graph in eqn.solve_iter(args.decimals, persistent=True):
+                        if isinstance(graph, tuple):  # the last item is the set of solutions
+                            visualize(graph, layouts)
 
         string = input('Equation?\n> ')
@@ -11,12 +11,51 @@ Copyright
 
 This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
 
+import re
+from typing import Any, Iterator, Optional
 from equation import *
 
+# A monomial is a (possibly negative) coefficient, optionally followed by x and a degree,
+# or a bare x or -x optionally followed by a degree. See the base cases under get_unit.
+# A power is ^ followed by a nonnegative integer, and may only follow a ')'.
+_NUMBER = r'(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?'
+_MONOMIAL = rf'-?{_NUMBER}(?:x(?:\^[+-]?{_NUMBER})?)?|-?x(?:\^[+-]?{_NUMBER})?'
+_TOKEN = re.compile(rf'\s*(?:(?P<symbol>[()+*])|(?P<monomial>{_MONOMIAL})|\^(?P<power>\d+))')
+_SPACE = re.compile(r'\s*')
 
-def get_equation(string: str) -> Equation:
+# The largest power p^k accepted by get_unit. Every integer up to it is exactly a float, as it is stored
+# (see Unit), and a power is raised by repeated squaring, so even the largest takes only 53 squarings.
+MAX_POWER = 2 ** 53
+
+
+class ParseError(ValueError):
+    """
+    An error raised when a string does not satisfy the preconditions of get_equation or get_unit.
+
+    Instance Attributes:
+        - message: A description of what went wrong.
+        - offset: The index in the string of the character at which the error was found.
+    """
+    message: str
+    offset: int
+
+    def __init__(self, message: str, offset: int) -> None:
+        """
+        Initialize a ParseError.
+        """
+        super().__init__(f'{message} at offset {offset}')
+        self.message = message
+        self.offset = offset
+
+
+def get_equation(string: str, cache: Optional[Any] = None) -> Equation:
     """
     Returns an Equation representing the given string.
+    Raises a ParseError if string does not satisfy the preconditions below.
+    If a SubtreeCache is given as cache (see cache.py), the terms of both sides are interned
+    (see SubtreeCache.intern_terms), so that identical subtrees share one node. The equation must then
+    only be simplified with the same cache, or persistently (see Equation.solve), since interned nodes
+    must never be rewritten.
 
     Preconditions:
         - string is of the form 'left = right',
@@ -25,14 +64,36 @@ def get_equation(string: str) -> Equation:
     >>> eqn = get_equation('(2x + x + 1) = (2x * x * 3)')
     >>> print(eqn)
     (2x + x + 1) = (2x * x * 3)
+
+    >>> try:
+    ...     get_equation('x = 1 = 2')
+    ... except ParseError as error:
+    ...     print(error)
+    unexpected '=' at offset 6
     """
-    left, right = string.split(' = ')
-    return Equation(get_unit(left), get_unit(right))
+    eq_pos = string.find('=')
+
+    if eq_pos == -1:
+        raise ParseError("expected '='", len(string))
+    elif string.find('=', eq_pos + 1) != -1:
+        raise ParseError("unexpected '='", string.find('=', eq_pos + 1))
+
+    left, right = _parse_unit(string, 0, eq_pos), _parse_unit(string, eq_pos + 1, len(string))
+
+    if cache is not None:
+        left, right = cache.intern_terms(left), cache.intern_terms(right)
+
+    return Equation(left, right)
 
 
 def get_unit(string: str) -> Unit:
     """
     Returns a Unit representing the given string.
+    Raises a ParseError, whose offset is the index of the offending character,
+    if string does not satisfy the preconditions below.
+
+    The string is read in a single pass (see tokenize), and nested units are built
+    with an explicit stack, so this takes time linear in len(string) at any depth.
 
     Preconditions:
         - string ∈ S, where the set S is defined recursively as follows:
@@ -47,6 +108,10 @@ def get_unit(string: str) -> Unit:
                 If p1, ..., pk ∈ S, then
                 1. (p1 + ... + pk) ∈ S
                 2. (p1 * ... * pk) ∈ S
+                If p ∈ S by constructor case 1 or 2, then
+                3. p^k ∈ S for all integers 0 <= k <= MAX_POWER
+    A power p^k is represented by a power Unit whose terms are p and the monomial k (or by the monomial 1,
+    if k = 0), so that it takes constant space, and p is only simplified once (see Unit._simplify_pow).
     
     >>> bc_1 = get_unit('37')
     >>> print(bc_1)
@@ -79,63 +144,163 @@ def get_unit(string: str) -> Unit:
     >>> quad = get_unit('(((x + 3) * (x + 3)) + 1)')
     >>> print(quad)
     (((x + 3) * (x + 3)) + 1)
+
+    >>> cc_3 = get_unit('((x + 3)^2 + 1)')
+    >>> print(cc_3)
+    ((x + 3)^2 + 1)
+
+    >>> try:
+    ...     get_unit('((x + 1) * 2')
+    ... except ParseError as error:
+    ...     print(error)
+    unclosed '(' at offset 0
+
+    >>> try:
+    ...     get_unit('(x + 1 * 2)')
+    ... except ParseError as error:
+    ...     print(error)
+    cannot mix '+' and '*' in one unit at offset 7
+
+    >>> try:
+    ...     get_unit('(x + 1^2)')
+    ... except ParseError as error:
+    ...     print(error)
+    expected '^' only after ')' at offset 6
+
+    >>> try:
+    ...     get_unit('(x + 1)^10000000000000000')
+    ... except ParseError as error:
+    ...     print(error)
+    power over 9007199254740992 at offset 8
+    """
+    return _parse_unit(string, 0, len(string))
+
+
+def tokenize(string: str, start: int = 0, end: Optional[int] = None) -> Iterator[tuple[str, int, Any]]:
+    """
+    Yield the tokens of string[start:end] in order, in a single pass and without slicing string.
+    Each token is a tuple (kind, offset, value), where
+        - kind is one of '(', ')', '+', '*', 'x' (a monomial) or '^' (a power);
+        - offset is the index in string of the token's first character;
+        - value is the monomial's Unit if kind == 'x', the int power if kind == '^', and None otherwise.
+    Whitespace between tokens is skipped.
+    Raises a ParseError at the first character that does not start a token, or at a power over MAX_POWER.
+
+    >>> [(kind, offset) for kind, offset, _ in tokenize('(-x + 2x^3)^2')]
+    [('(', 0), ('x', 1), ('+', 4), ('x', 6), (')', 10), ('^', 11)]
+    """
+    pos = start
+    end = len(string) if end is None else end
+
+    while True:
+        match = _TOKEN.match(string, pos, end)
+
+        if match is None:
+            pos = _SPACE.match(string, pos, end).end()
+            if pos == end:
+                return
+            raise ParseError(f'unexpected {string[pos]!r}', pos)
+
+        if match.group('symbol') is not None:
+            yield (match.group('symbol'), match.start('symbol'), None)
+        elif match.group('power') is not None:
+            digits = match.group('power').lstrip('0')
+            if len(digits) > len(str(MAX_POWER)) or int(digits or '0') > MAX_POWER:  # int() of a long string is slow
+                raise ParseError(f'power over {MAX_POWER}', match.start('power'))
+            yield ('^', match.start('power') - 1, int(digits or '0'))
+        else:
+            yield ('x', match.start('monomial'), _get_monomial(match.group('monomial')))
+
+        pos = match.end()
+
+
+def _get_monomial(token: str) -> Unit:
+    """
+    Return the monomial represented by token, which is one of the base cases under get_unit.
+    """
+    coeff_str, x, deg_str = token.partition('x')
+
+    if x == '':  # 1
+        return mono(float(coeff_str), 0.0)
+
+    if coeff_str == '':  # 2 or 5
+        coeff = 1.0
+    elif coeff_str == '-':  # 3
+        coeff = -1.0
+    else:  # 4 or 6
+        coeff = float(coeff_str)
+
+    return mono(coeff, float(deg_str[1:]) if deg_str != '' else 1.0)
+
+
+def _parse_unit(string: str, start: int, end: int) -> Unit:
     """
-    # Base cases
-    if '+' not in string and '*' not in string:
-        x_pos = string.find('x')
-        if x_pos == -1:  # 1
-            coeff = string
-            deg = 0
-        elif x_pos == 0:  # 2 or 5
-            coeff = 1
-            if len(string) == 1:  # 2
-                deg = 1
-            else:  # 4
-                deg = string[x_pos + 2:]
-        elif string == '-x':  # 3
-            coeff = -1
-            deg = 1
-        else:  # 4 or 6
-            coeff = string[:x_pos]
-            if x_pos == len(string) - 1:  # 4
-                deg = 1
-            else:  # 6
-                deg = string[x_pos + 2:]
-
-        return mono(float(coeff), float(deg))
-
-    # Constructor cases
-    else:
-        op_looking_for = ''
-        ops_found = []
-        depth = 0
-
-        for i in range(len(string)):
-            c = string[i]
-            if c == '(':
-                depth += 1
-            elif c == ')':
-                depth -= 1
-            elif depth == 1 and c == op_looking_for:
-                ops_found.append(i)
-            elif depth == 1 and op_looking_for == '' and c in {'+', '*'}:
-                op_looking_for = c
-                ops_found.append(i)
-
-        term_strings = [
-            string[1:ops_found[0] - 1],
-            string[ops_found[len(ops_found) - 1] + 2:-1]
-        ]
-
-        for i in range(1, len(ops_found)):
-            term_strings.append(string[ops_found[i - 1] + 2:ops_found[i] - 1])
-
-        terms = []
-
-        for term_string in term_strings:
-            terms.append(get_unit(term_string))
-
-        return Unit(op_looking_for, terms)
+    Return a Unit representing string[start:end] as in get_unit, whose ParseErrors
+    report offsets into the whole string.
+    """
+    # Each open unit is a list [op, terms, offset of its '(']; op is '' until the first operator
+    stack = []
+    root = None
+    expect_term = True
+    last_kind = ''
+
+    for kind, offset, value in tokenize(string, start, end):
+        if kind == '^':
+            if last_kind != ')':
+                raise ParseError("expected '^' only after ')'", offset)
+
+            # Replace the unit that was just closed with its power
+            unit = Unit('^', [unit, mono(float(value), 0.0)]) if value > 0 else mono(1.0, 0.0)
+            if len(stack) > 0:
+                stack[-1][1][-1] = unit
+            else:
+                root = unit
+            last_kind = kind
+            continue
+
+        elif kind in {'(', 'x'}:
+            if not expect_term:
+                raise ParseError("expected '+', '*' or ')'", offset)
+
+            if kind == '(':
+                stack.append(['', [], offset])
+                last_kind = kind
+                continue
+
+            expect_term = False
+            unit = value
+
+        elif expect_term or len(stack) == 0:
+            raise ParseError(f'unexpected {kind!r}', offset)
+
+        elif kind in {'+', '*'}:
+            if stack[-1][0] == '':
+                stack[-1][0] = kind
+            elif stack[-1][0] != kind:
+                raise ParseError("cannot mix '+' and '*' in one unit", offset)
+            expect_term = True
+            last_kind = kind
+            continue
+
+        else:  # kind == ')'
+            op, terms, open_offset = stack.pop()
+            if op == '':
+                raise ParseError("expected '+' or '*' inside parentheses", open_offset)
+            unit = Unit(op, terms)
+
+        # Add the completed unit to the innermost open unit, or make it the result
+        if len(stack) > 0:
+            stack[-1][1].append(unit)
+        else:
+            root = unit
+        last_kind = kind
+
+    if len(stack) > 0:
+        raise ParseError("unclosed '('", stack[-1][2])
+    elif root is None:
+        raise ParseError('expected a term', _SPACE.match(string, start, end).end())
+
+    return root
 
 
 if __name__ == '__main__':
@@ -146,6 +311,6 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'max-line-length': 120,
         'disable': ['E1136', 'E1101', 'W0401', 'R0912'],
-        'extra-imports': ['equation'],
+        'extra-imports': ['equation', 're', 'typing'],
         'max-nested-blocks': 4
     })
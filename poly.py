@@ -0,0 +1,168 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Poly Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for adding and multiplying polynomials in sparse form.
+A polynomial is represented by a dict mapping each degree to its coefficient,
+as in the coeff_by_deg dicts built by Equation.solve. Zero coefficients are
+never stored, so the zero polynomial is the empty dict.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+from typing import Any, Optional
+
+# The least number of pairs of terms for which poly_mul tries to multiply by FFT (see dense.fft_mul).
+FFT_THRESHOLD = 1 << 10
+
+
+def poly_add(p1: dict[float, float], p2: dict[float, float]) -> dict[float, float]:
+    """
+    Return the sum of the polynomials p1 and p2.
+
+    >>> poly_add({1: 2, 0: 1}, {1: -2, 2: 3})
+    {0: 1, 2: 3}
+    """
+    total = dict(p1)
+
+    for deg in p2:
+        coeff = total.get(deg, 0) + p2[deg]
+        if coeff != 0:
+            total[deg] = coeff
+        else:
+            total.pop(deg, None)
+
+    return total
+
+
+def poly_sum(polys: list[dict[float, float]]) -> dict[float, float]:
+    """
+    Return the sum of the polynomials in polys, collecting like terms in a single dict.
+
+    >>> poly_sum([{1: 2}, {1: 1, 0: 1}, {1: -3}])
+    {0: 1}
+    """
+    total = {}
+
+    for p in polys:
+        for deg in p:
+            total[deg] = total.get(deg, 0) + p[deg]
+
+    return {deg: total[deg] for deg in total if total[deg] != 0}
+
+
+def poly_mul_size(p1: dict[float, float], p2: dict[float, float]) -> int:
+    """
+    Return an upper bound on the number of terms of the product of the polynomials p1 and p2,
+    without multiplying them: the number of pairs of terms, or, if every degree is an integer,
+    the number of degrees between the least and the greatest degree of the product.
+
+    >>> poly_mul_size({2: 1, 1: 1, 0: 1}, {2: 1, 1: 1, 0: 1})
+    5
+    >>> poly_mul_size({0.5: 1, 0: 1}, {2: 1})
+    2
+    """
+    pairs = len(p1) * len(p2)
+
+    if pairs == 0 or not all(float(deg).is_integer() for p in (p1, p2) for deg in p):
+        return pairs
+
+    return min(pairs, int(max(p1) + max(p2) - min(p1) - min(p2)) + 1)
+
+
+def poly_mul(p1: dict[float, float], p2: dict[float, float], budget: Optional[Any] = None) -> dict[float, float]:
+    """
+    Return the product of the polynomials p1 and p2, collecting like terms as they are produced.
+    Large products of polynomials with integer degrees and coefficients are computed by FFT instead
+    (see dense.fft_mul), with the same result.
+    If a Budget is given as budget (see budget.py), its limit on terms is checked against poly_mul_size
+    before multiplying, and a BudgetExceeded error is raised if the product might be too large.
+
+    >>> poly_mul({1: 1, 0: -1}, {1: 1, 0: 1})
+    {2: 1, 0: -1}
+    """
+    if budget is not None:
+        budget.check_terms(poly_mul_size(p1, p2))
+
+    if len(p1) * len(p2) >= FFT_THRESHOLD:
+        from dense import fft_mul  # import NumPy only when a product is large enough to need it
+
+        product = fft_mul(p1, p2)
+        if product is not None:
+            return product
+
+    product = {}
+
+    for deg_1 in p1:
+        for deg_2 in p2:
+            deg = deg_1 + deg_2
+            product[deg] = product.get(deg, 0) + p1[deg_1] * p2[deg_2]
+
+    return {deg: product[deg] for deg in product if product[deg] != 0}
+
+
+def poly_pow(p: dict[float, float], k: int, budget: Optional[Any] = None) -> dict[float, float]:
+    """
+    Return the polynomial p to the power k, by repeated squaring, i.e., with O(log k) calls to poly_mul
+    rather than k - 1. The budget, if given, is checked before each call to poly_mul.
+
+    Preconditions:
+        - k >= 0
+
+    >>> poly_pow({1: 1, 0: 1}, 3) == {3: 1, 2: 3, 1: 3, 0: 1}
+    True
+    >>> poly_pow({1: 2}, 0)
+    {0: 1}
+    """
+    power = None  # p to the power of the bits of k seen so far, or None for p^0
+    square = p  # p to the power of the current bit of k
+
+    while k > 0:
+        if k % 2 == 1:
+            power = square if power is None else poly_mul(power, square, budget)
+        k //= 2
+        if k > 0:
+            square = poly_mul(square, square, budget)
+
+    return {0: 1} if power is None else dict(power)
+
+
+def poly_prod(polys: list[dict[float, float]], budget: Optional[Any] = None) -> dict[float, float]:
+    """
+    Return the product of the polynomials in polys, multiplying them pairwise: first polys[0] by polys[1],
+    polys[2] by polys[3], and so on, then those products pairwise, and so on. This keeps the polynomials
+    being multiplied about the same size, so that large products can be computed by FFT (see poly_mul).
+    The budget, if given, is checked before each call to poly_mul.
+
+    >>> poly_prod([{1: 1, 0: 1}, {1: 1, 0: -1}, {0: 3}])
+    {2: 3, 0: -3}
+    >>> poly_prod([])
+    {0: 1}
+    """
+    if len(polys) == 0:
+        return {0: 1}
+
+    while len(polys) > 1:
+        products = [poly_mul(polys[i], polys[i + 1], budget) for i in range(0, len(polys) - 1, 2)]
+        if len(polys) % 2 == 1:
+            products.append(polys[-1])
+        polys = products
+
+    return dict(polys[0])
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101'],
+        'extra-imports': ['dense', 'typing'],
+        'max-nested-blocks': 4
+    })
@@ -0,0 +1,204 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Render Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for rendering the graphs of a trace (see Equation.solve_iter) to image files,
+without a display: each graph is drawn (see visualize.draw) on a matplotlib Figure that is not
+attached to any window, and saved as a numbered PNG or SVG file, or as a frame of an animated GIF.
+
+The graphs are drawn across a pool of worker processes, each of which makes one Figure and
+reuses it for every graph it draws, along with one LayoutCache (see visualize.py), so that
+graphs of the same shape are only laid out once per process.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import io
+import os
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+# The size, in inches, and the resolution, in dots per inch, of each rendered graph.
+FIGSIZE = (6.4, 4.8)
+DPI = 100
+
+# The Axes of the Figure of this process and its LayoutCache (see _init_figure), made once and
+# reused for every graph.
+_axes = None
+_layouts = None
+
+
+def render_files(graphs: Iterable[tuple], directory: str, fmt: str = 'png', workers: Optional[int] = 1,
+                 chunksize: int = 8) -> list[str]:
+    """
+    Render each graph in graphs to a file step_0000.fmt, step_0001.fmt, etc. in directory (which is made
+    if it does not exist), and return the paths of the files, in order. See render_all for workers and chunksize.
+
+    Preconditions:
+        - every graph in graphs is as in Unit.get_graph
+        - fmt in {'png', 'svg'}
+        - workers is None or workers >= 1
+        - chunksize >= 1
+
+    >>> import tempfile
+    >>> from parse import get_equation
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     paths = render_files(get_equation('(x + x) = 4').solve(5)[1], directory, 'svg')
+    ...     [os.path.basename(path) for path in paths] == sorted(os.listdir(directory))
+    True
+    >>> [os.path.basename(path) for path in paths][:3]
+    ['step_0000.svg', 'step_0001.svg', 'step_0002.svg']
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+
+    for i, data in enumerate(render_all(graphs, fmt, workers, chunksize)):
+        paths.append(os.path.join(directory, f'step_{i:04d}.{fmt}'))
+        with open(paths[-1], 'wb') as f:
+            f.write(data)
+
+    return paths
+
+
+def render_gif(graphs: Iterable[tuple], path: str, duration: int = 1000, workers: Optional[int] = 1,
+               chunksize: int = 8) -> int:
+    """
+    Render graphs as the frames of an animated GIF, shown for duration milliseconds each, to the file at path,
+    and return the number of frames. If graphs is empty, no file is written, as in render_files.
+    See render_all for workers and chunksize.
+
+    Preconditions:
+        - every graph in graphs is as in Unit.get_graph
+        - duration > 0
+        - workers is None or workers >= 1
+        - chunksize >= 1
+
+    >>> import tempfile
+    >>> from parse import get_equation
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     render_gif(get_equation('(x + x) = 4').solve(5)[1], os.path.join(directory, 'trace.gif'))
+    8
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     render_gif([], os.path.join(directory, 'trace.gif')), os.listdir(directory)
+    (0, [])
+    """
+    from PIL import Image  # Pillow is a dependency of matplotlib
+
+    # The frames are rendered as raw RGBA pixels, so that they are not compressed to PNG only to be
+    # decompressed here, and kept in palette mode, which takes a quarter of the memory
+    size = (round(FIGSIZE[0] * DPI), round(FIGSIZE[1] * DPI))
+    frames = [Image.frombytes('RGBA', size, data).convert('P', palette=Image.Palette.ADAPTIVE)
+              for data in render_all(graphs, 'raw', workers, chunksize)]
+    if len(frames) == 0:
+        return 0
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=duration, loop=0)
+    return len(frames)
+
+
+def render_all(graphs: Iterable[tuple], fmt: str = 'png', workers: Optional[int] = 1,
+               chunksize: int = 8) -> Iterator[bytes]:
+    """
+    Yield the contents of an image file in the format fmt of each graph in graphs, in order
+    (or, if fmt is 'raw', the RGBA values of its pixels, row by row).
+
+    If workers is 1, the graphs are drawn in this process. Otherwise, they are drawn chunksize graphs
+    at a time across a pool of worker processes (one per CPU if workers is None). As in batch.solve_parallel,
+    graphs are read lazily, and at most two chunks per worker are queued or being drawn at once.
+
+    Preconditions:
+        - every graph in graphs is as in Unit.get_graph
+        - fmt in {'png', 'svg', 'raw'}
+        - workers is None or workers >= 1
+        - chunksize >= 1
+    """
+    if workers == 1:
+        _init_figure()
+        for graph in graphs:
+            yield _render(graph, fmt)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor  # import multiprocessing only when it is used
+
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    with ProcessPoolExecutor(workers, initializer=_init_figure) as executor:
+        pending = deque()
+
+        for chunk in _chunks(graphs, chunksize):
+            pending.append(executor.submit(_render_chunk, chunk, fmt))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+
+        while len(pending) > 0:
+            yield from pending.popleft().result()
+
+
+def _init_figure() -> None:
+    """
+    Make the Figure and LayoutCache of this process, if it has none yet. The Figure is made directly, rather than
+    through matplotlib.pyplot, so that it is not attached to a window, and is saved by the non-interactive
+    Agg (or SVG) backend no matter which backend matplotlib is set to use.
+    """
+    global _axes, _layouts
+
+    if _axes is None:
+        from matplotlib.figure import Figure
+        from visualize import LayoutCache
+        _axes = Figure(figsize=FIGSIZE, dpi=DPI).add_subplot()
+        _layouts = LayoutCache()
+
+
+def _render(graph: tuple, fmt: str) -> bytes:
+    """
+    Return the contents of an image file in the format fmt of graph, drawn on the Figure of this process.
+
+    Preconditions:
+        - _init_figure has been called in this process
+    """
+    from visualize import draw
+
+    draw(graph, _axes, _layouts)
+    data = io.BytesIO()
+    _axes.figure.savefig(data, format=fmt)
+    return data.getvalue()
+
+
+def _render_chunk(chunk: list[tuple], fmt: str) -> list[bytes]:
+    """
+    Return the contents of an image file in the format fmt of each graph in chunk. This runs in a worker process.
+    """
+    return [_render(graph, fmt) for graph in chunk]
+
+
+def _chunks(graphs: Iterable[tuple], chunksize: int) -> Iterator[list[tuple]]:
+    """
+    Yield consecutive lists of chunksize graphs from graphs (the last may be shorter).
+    """
+    chunk = []
+
+    for graph in graphs:
+        chunk.append(graph)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0603'],
+        'extra-imports': ['io', 'os', 'collections', 'typing', 'concurrent.futures', 'matplotlib.figure',
+                          'PIL', 'visualize'],
+        'max-nested-blocks': 4
+    })
@@ -0,0 +1,345 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Serialize Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains functions for encoding parsed equations (see parse.get_equation) in a compact binary form,
+so that a corpus of equations only has to be parsed once, and can then be loaded many times (or sent
+to a worker process) without parsing its text or pickling its trees.
+
+Each tree is encoded as its nodes in pre-order (as in arena.Arena):
+    - a sum, product or power as its op code (see arena.OPCODES) and its number of terms, as the struct '<BI';
+    - a monomial as its op code, coefficient and degree, as the struct '<Bdd';
+    - a unit that already appeared earlier in the tree (e.g., an interned subtree, see cache.SubtreeCache)
+      as the op code REF and the index of its first appearance among the nodes of the tree, as the struct '<BI',
+      so that it is still shared, rather than copied, once decoded.
+An equation is encoded as its left side followed by its right side.
+
+A file of equations starts with MAGIC, followed by one record per equation (its length in bytes, as the
+struct '<I', and its encoding), and ends with an index: the offset of each record, as unsigned 64-bit ints,
+followed by the offset of the index and the number of records, as the struct '<QQ'. So a file can be read
+in bulk (see read_equations), or opened without reading it (see EquationFile), so that each equation
+is only decoded when it is needed, no matter how large the file is.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import gc
+import mmap
+import struct
+import sys
+from array import array
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+from arena import OPCODES, OPS
+from parse import *
+
+# The first bytes of every file of equations, including the version of the format.
+MAGIC = b'EQTREE02'
+
+# The op code of a reference to an earlier node of the same tree.
+REF = len(OPCODES)
+
+_NODE = struct.Struct('<BI')  # the op code, and the number of terms (or the index of the node referred to)
+_MONO = struct.Struct('<Bdd')  # the op code, coefficient and degree of a monomial
+_LENGTH = struct.Struct('<I')  # the length of a record
+_FOOTER = struct.Struct('<QQ')  # the offset of the index and the number of records
+
+
+def encode_equation(eqn: Equation) -> bytes:
+    """
+    Return the encoding of eqn (see the description of this module).
+
+    >>> data = encode_equation(get_equation('(x + 1)^2 = 3x'))
+    >>> len(data)  # a power, a sum and four monomials
+    78
+    >>> print(decode_equation(data))
+    (x + 1)^2 = 3x
+    >>> from cache import SubtreeCache
+    >>> data = encode_equation(get_equation('((x + 1) * (x + 1)) = 3x', SubtreeCache(10)))
+    >>> len(data)  # a product, a sum, two monomials, a reference and a monomial
+    66
+    >>> eqn = decode_equation(data)
+    >>> print(eqn)
+    ((x + 1) * (x + 1)) = 3x
+    >>> eqn.left.terms[0] is eqn.left.terms[1]
+    True
+    """
+    out = bytearray()
+    _encode_tree(eqn.left, out)
+    _encode_tree(eqn.right, out)
+    return bytes(out)
+
+
+def decode_equation(data: Any, pos: int = 0, monos: Optional[dict[bytes, Unit]] = None) -> Equation:
+    """
+    Return a new Equation decoded from the bytes-like object data (e.g., bytes, or an mmap), starting at pos.
+
+    Equal monomials are decoded as the same Unit, since monomials are never rewritten in place
+    (see Unit._replace). If a dict is given as monos, it maps the encoding of the coefficient and degree
+    of each monomial decoded so far to its Unit, and is updated, so that monomials are also shared
+    between equations decoded with the same dict.
+
+    Preconditions:
+        - data[pos:] starts with an encoding returned by encode_equation
+    """
+    monos = {} if monos is None else monos
+    left, pos = _decode_tree(data, pos, monos)
+    right, _ = _decode_tree(data, pos, monos)
+    return Equation(left, right)
+
+
+def write_equations(path: str, equations: Iterable[Equation]) -> int:
+    """
+    Write the encodings of the given equations, in order, to a new file at path (see the description of
+    this module), and return the number of equations written. The equations are read lazily, so only the
+    offsets of the records are held in memory.
+
+    >>> import os, tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'corpus.eqt')
+    ...     write_equations(path, [get_equation('x^2 = 4'), get_equation('((x + 1) * (x + -1)) = 0')])
+    ...     [str(eqn) for eqn in read_equations(path)]
+    2
+    ['x^2 = 4', '((x + 1) * (x + -1)) = 0']
+    """
+    offsets = array('Q')
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        pos = len(MAGIC)
+
+        for eqn in equations:
+            data = encode_equation(eqn)
+            offsets.append(pos)
+            f.write(_LENGTH.pack(len(data)))
+            f.write(data)
+            pos += _LENGTH.size + len(data)
+
+        _write_index(f, offsets, pos)
+
+    return len(offsets)
+
+
+def read_equations(path: str) -> list[Equation]:
+    """
+    Return the equations in the file at path (see write_equations), in order, reading the whole file at once.
+
+    Preconditions:
+        - path is a file written by write_equations
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    _check_magic(data, path)
+    _, count = _FOOTER.unpack_from(data, len(data) - _FOOTER.size)
+    equations = []
+    monos = {}  # shared by every equation, since they are all kept
+    pos = len(MAGIC)
+
+    # Decoded trees have no reference cycles, so the cyclic garbage collector is paused while they are
+    # built, rather than scanning the growing list of equations again and again
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(count):
+            length = _LENGTH.unpack_from(data, pos)[0]
+            equations.append(decode_equation(data, pos + _LENGTH.size, monos))
+            pos += _LENGTH.size + length
+    finally:
+        if enabled:
+            gc.enable()
+
+    return equations
+
+
+class EquationFile:
+    """
+    A file of equations (see write_equations) that is memory-mapped rather than read, so that opening it
+    takes constant time, and each equation is only decoded when it is accessed, by its index.
+
+    Instance Attributes:
+        - path: The path of the file.
+
+    >>> import os, tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'corpus.eqt')
+    ...     _ = write_equations(path, (get_equation(f'(x + {i}) = 0') for i in range(1000)))
+    ...     with EquationFile(path) as corpus:
+    ...         print(len(corpus), corpus[999], corpus[-1].solve(5, trace=False)[0])
+    1000 (x + 999) = 0 {-999.0}
+    """
+    path: str
+    _file: BinaryIO
+    _map: mmap.mmap
+    _offsets: memoryview
+
+    def __init__(self, path: str) -> None:
+        """
+        Open the file of equations at path.
+
+        Preconditions:
+            - path is a file written by write_equations
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_magic(self._map, path)
+
+        index, count = _FOOTER.unpack_from(self._map, len(self._map) - _FOOTER.size)
+        if sys.byteorder == 'little':  # the offsets are used in place
+            self._offsets = memoryview(self._map)[index:index + 8 * count].cast('Q')
+        else:
+            offsets = array('Q')
+            offsets.frombytes(self._map[index:index + 8 * count])
+            offsets.byteswap()
+            self._offsets = memoryview(offsets)
+
+    def __enter__(self) -> 'EquationFile':
+        """
+        Return this file.
+        """
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """
+        Close this file.
+        """
+        self.close()
+
+    def __len__(self) -> int:
+        """
+        Return the number of equations in this file.
+        """
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> Equation:
+        """
+        Return a new Equation decoded from the equation at the given index of this file.
+
+        Preconditions:
+            - -len(self) <= index < len(self)
+        """
+        return decode_equation(self._map, self._offsets[index] + _LENGTH.size)
+
+    def __iter__(self) -> Iterator[Equation]:
+        """
+        Return an iterator of the equations in this file, in order, each decoded as it is reached.
+        """
+        return (self[i] for i in range(len(self._offsets)))
+
+    def close(self) -> None:
+        """
+        Close this file. The equations decoded from it remain valid.
+        """
+        self._offsets.release()
+        self._map.close()
+        self._file.close()
+
+
+def _encode_tree(root: Unit, out: bytearray) -> None:
+    """
+    Append the encoding of the tree represented by root to out (see the description of this module).
+    """
+    indices = {}  # maps the id of each unit written so far to the index of its first node
+    stack = [root]
+    i = 0  # the index of the next node
+
+    while len(stack) > 0:
+        unit = stack.pop()
+
+        if id(unit) in indices:
+            out += _NODE.pack(REF, indices[id(unit)])
+        else:
+            indices[id(unit)] = i
+            if unit.op == 'x':
+                out += _MONO.pack(OPCODES['x'], unit.terms[0].value, unit.terms[1].value)
+            else:
+                out += _NODE.pack(OPCODES[unit.op], len(unit.terms))
+                stack.extend(reversed(unit.terms))
+
+        i += 1
+
+
+def _decode_tree(data: Any, pos: int, monos: dict[bytes, Unit]) -> tuple[Unit, int]:
+    """
+    Return the tuple (unit, end), where unit is a new Unit decoded from the tree encoded in the bytes-like
+    object data starting at pos, and end is the position just after its encoding. Its monomials are
+    looked up in, and added to, monos (see decode_equation).
+    """
+    nodes = []  # every node decoded so far, in pre-order; None for sums, products and powers not yet complete
+    stack = []  # the [op, number of terms, terms, index in nodes] of each sum, product or power still being decoded
+
+    while True:
+        code = data[pos]
+
+        if code == OPCODES['x']:
+            key = data[pos + 1:pos + _MONO.size]
+            unit = monos.get(key)
+            if unit is None:
+                _, coeff, deg = _MONO.unpack_from(data, pos)
+                unit = monos[key] = mono(coeff, deg)
+            pos += _MONO.size
+            nodes.append(unit)
+        else:
+            _, value = _NODE.unpack_from(data, pos)
+            pos += _NODE.size
+
+            if code == REF:
+                unit = nodes[value]
+                nodes.append(unit)
+            elif value > 0:  # its terms follow
+                stack.append([OPS[code], value, [], len(nodes)])
+                nodes.append(None)
+                continue
+            else:
+                unit = Unit(OPS[code], [])
+                nodes.append(unit)
+
+        # unit is complete, and so may be the last term of its ancestors
+        while len(stack) > 0:
+            frame = stack[-1]
+            frame[2].append(unit)
+            if len(frame[2]) < frame[1]:
+                break
+            stack.pop()
+            unit = Unit(frame[0], frame[2])
+            nodes[frame[3]] = unit
+
+        if len(stack) == 0:
+            return (unit, pos)
+
+
+def _write_index(f: BinaryIO, offsets: array, pos: int) -> None:
+    """
+    Write the index of a file of equations, whose records start at offsets and end at pos, to f.
+    """
+    if sys.byteorder != 'little':
+        offsets = array('Q', offsets)
+        offsets.byteswap()
+
+    f.write(offsets.tobytes())
+    f.write(_FOOTER.pack(pos, len(offsets)))
+
+
+def _check_magic(data: Any, path: str) -> None:
+    """
+    Raise a ValueError if data does not start with MAGIC.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a file of equations')
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101', 'W0401', 'R1732'],
+        'extra-imports': ['gc', 'mmap', 'struct', 'sys', 'array', 'typing', 'arena', 'parse'],
+        'max-nested-blocks': 4
+    })
@@ -0,0 +1,576 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Server Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains the SolveServer class, a long-lived HTTP/JSON service that solves equations, so that
+the cost of starting the interpreter and importing the solver is only paid once, rather than
+once per equation. It has two endpoints:
+    - POST /solve, with a JSON object {"equation": EQUATION} (and optionally "decimals": N) as its body,
+      responds with the record of EQUATION (see batch.solve_line);
+    - GET /metrics responds with the metrics of the server (see ServerMetrics.to_dict).
+
+Requests that arrive within a short window of each other are solved together as one micro-batch
+(see batch.solve_batch) by a pool of worker processes, with at most one batch per worker at once.
+At most max_queue requests wait for a worker; any more are refused with the status 503 until the
+queue drains, rather than piling up. A request that is not answered within timeout seconds gets the
+status 504, and each equation is solved within a Budget (see budget.py) of the same time. A batch also
+has to finish by the earliest deadline of its requests, after which its remaining equations are aborted,
+so that one slow equation cannot make the rest of its batch time out too, nor hold up a worker for long.
+If a worker process dies, the requests of its batch get the status 'error', and the pool is replaced.
+
+The server only uses asyncio streams, and speaks just enough HTTP/1.1 for JSON clients, with
+keep-alive connections (see loadgen.py).
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import asyncio
+import json
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Optional
+from batch import solve_batch
+from budget import Budget
+
+# The upper bounds, in seconds, of the buckets of the latency histogram of ServerMetrics.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The number of seconds over which ServerMetrics measures the recent throughput.
+RATE_WINDOW = 10
+
+# The share of the timeout that a batch leaves before the earliest deadline of its requests, for the step
+# it was on to finish (the Budget is only checked between steps) and for its records to be sent back.
+DEADLINE_MARGIN = 0.1
+
+# The largest request body, in bytes, and the most header lines, accepted by the server.
+MAX_BODY = 1 << 16
+MAX_HEADERS = 100
+
+# The reason phrase of each status code sent by the server.
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class RequestError(Exception):
+    """
+    An error raised when a request cannot be served.
+
+    Instance Attributes:
+        - status: The status code of the response.
+        - message: A description of what went wrong.
+
+    Representation Invariants:
+        - self.status in REASONS
+    """
+    status: int
+    message: str
+
+    def __init__(self, status: int, message: str) -> None:
+        """
+        Initialize a RequestError.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ServerMetrics:
+    """
+    Metrics of a running SolveServer.
+
+    Instance Attributes:
+        - started: The time.perf_counter() at which the server started.
+        - responses: The number of responses to /solve sent with each status code.
+        - latencies: The number of responses to /solve whose latency was at most each bound in LATENCY_BUCKETS
+                     (and above the bound before it), followed by the number above every bound.
+        - latency_sum: The total latency, in seconds, of the responses to /solve.
+        - batches: The number of micro-batches solved.
+        - batched: The total number of equations in those batches.
+        - recent: The number of responses to /solve sent in each of the last RATE_WINDOW seconds,
+                  as pairs [second, count], oldest first.
+
+    Representation Invariants:
+        - len(self.latencies) == len(LATENCY_BUCKETS) + 1
+
+    >>> metrics = ServerMetrics()
+    >>> metrics.add_response(200, 0.003)
+    >>> metrics.add_response(504, 20.0)
+    >>> metrics.add_batch(1)
+    >>> data = metrics.to_dict(queue_depth=0, in_flight=0)
+    >>> data['responses'], data['latency']['buckets']['0.005'], data['latency']['buckets']['+Inf']
+    ({'200': 1, '504': 1}, 1, 2)
+    """
+    started: float
+    responses: dict[int, int]
+    latencies: list[int]
+    latency_sum: float
+    batches: int
+    batched: int
+    recent: deque
+
+    def __init__(self) -> None:
+        """
+        Initialize empty ServerMetrics, starting now.
+        """
+        self.started = time.perf_counter()
+        self.responses = {}
+        self.latencies = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.batches = 0
+        self.batched = 0
+        self.recent = deque()
+
+    def add_response(self, status: int, latency: float) -> None:
+        """
+        Record a response to /solve with the given status code, sent latency seconds after its request was read.
+        """
+        self.responses[status] = self.responses.get(status, 0) + 1
+        self.latency_sum += latency
+
+        i = 0
+        while i < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[i]:
+            i += 1
+        self.latencies[i] += 1
+
+        second = int(time.perf_counter())
+        if len(self.recent) > 0 and self.recent[-1][0] == second:
+            self.recent[-1][1] += 1
+        else:
+            self.recent.append([second, 1])
+            while self.recent[0][0] <= second - RATE_WINDOW:
+                self.recent.popleft()
+
+    def add_batch(self, size: int) -> None:
+        """
+        Record a micro-batch of size equations.
+        """
+        self.batches += 1
+        self.batched += size
+
+    def to_dict(self, queue_depth: int, in_flight: int) -> dict:
+        """
+        Return a dict of these metrics, as sent by the /metrics endpoint, given the number of requests
+        waiting for a worker (queue_depth) and being solved (in_flight). The latency histogram is cumulative,
+        i.e., each bound maps to the number of responses whose latency was at most that bound.
+        """
+        uptime = time.perf_counter() - self.started
+        count = sum(self.latencies)
+        buckets = {}
+        total = 0
+        for bound, k in zip(LATENCY_BUCKETS + ('+Inf',), self.latencies):
+            total += k
+            buckets[str(bound)] = total
+
+        now = int(time.perf_counter())
+        recent = sum(k for second, k in self.recent if second > now - RATE_WINDOW)
+
+        return {
+            'uptime': uptime,
+            'queue_depth': queue_depth,
+            'in_flight': in_flight,
+            'responses': {str(status): k for status, k in sorted(self.responses.items())},
+            'latency': {'count': count, 'sum': self.latency_sum, 'buckets': buckets},
+            'batches': self.batches,
+            'mean_batch_size': self.batched / self.batches if self.batches > 0 else 0.0,
+            'throughput': count / uptime if uptime > 0 else 0.0,
+            'recent_throughput': recent / min(uptime, RATE_WINDOW) if uptime > 0 else 0.0
+        }
+
+
+class SolveServer:
+    """
+    An HTTP/JSON service that solves equations in micro-batches across a pool of worker processes.
+
+    Instance Attributes:
+        - workers: The number of worker processes, and the most batches being solved at once.
+        - window: The most time, in seconds, that the first request of a batch waits for more requests.
+        - max_batch: The most requests in a batch.
+        - max_queue: The most requests waiting for a worker; any more are refused with the status 503.
+        - timeout: The most time, in seconds, that a request may take before it is answered with the status 504.
+        - budget: The Budget within which each equation is solved.
+        - metrics: The metrics of this server.
+        - port: The port this server listens on, once it is started.
+
+    Representation Invariants:
+        - self.workers >= 1
+        - self.window >= 0
+        - self.max_batch >= 1
+        - self.max_queue >= 1
+        - self.timeout > 0
+
+    >>> from loadgen import post_json
+    >>> async def demo() -> list:
+    ...     async with SolveServer(workers=1) as server:
+    ...         return await asyncio.gather(post_json('127.0.0.1', server.port, '/solve', {'equation': 'x^2 = 4'}),
+    ...                                     post_json('127.0.0.1', server.port, '/solve', {'equation': '(x = 1'}),
+    ...                                     post_json('127.0.0.1', server.port, '/solve', {'equ': 'x = 1'}))
+    >>> for status, body in asyncio.run(demo()):
+    ...     print(status, body)
+    200 {'input': 'x^2 = 4', 'status': 'finite', 'roots': [-2.0, 2.0]}
+    200 {'input': '(x = 1', 'status': 'invalid', 'roots': [], 'error': "unclosed '('", 'offset': 0}
+    400 {'error': "the body must be a JSON object with a string 'equation'"}
+
+    A worker that dies only fails the batch it was solving:
+    >>> import multiprocessing, os, signal
+    >>> async def kill_worker() -> list:
+    ...     async with SolveServer(workers=1) as server:
+    ...         os.kill(multiprocessing.active_children()[0].pid, signal.SIGKILL)
+    ...         first = await post_json('127.0.0.1', server.port, '/solve', {'equation': 'x = 1'})
+    ...         second = await post_json('127.0.0.1', server.port, '/solve', {'equation': 'x = 2'})
+    ...         return [first[1]['status'], second[1]['status']]
+    >>> asyncio.run(kill_worker())
+    ['error', 'finite']
+    """
+    workers: int
+    window: float
+    max_batch: int
+    max_queue: int
+    timeout: float
+    budget: Budget
+    metrics: ServerMetrics
+    port: Optional[int]
+    _queue: Optional[asyncio.Queue]
+    _slots: Optional[asyncio.Semaphore]
+    _in_flight: int
+    _executor: Any
+    _server: Any
+    _batcher: Optional[asyncio.Task]
+    _tasks: set
+
+    def __init__(self, workers: int = 1, window: float = 0.002, max_batch: int = 256, max_queue: int = 1024,
+                 timeout: float = 5.0, budget: Optional[Budget] = None) -> None:
+        """
+        Initialize a SolveServer, which is not started yet. If budget is None, each equation is solved
+        within timeout seconds (and within the deadline of its batch, either way).
+        """
+        self.workers = workers
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.budget = Budget(max_seconds=timeout) if budget is None else budget
+        self.metrics = ServerMetrics()
+        self.port = None
+        self._queue = None
+        self._slots = None
+        self._in_flight = 0
+        self._executor = None
+        self._server = None
+        self._batcher = None
+        self._tasks = set()
+
+    async def __aenter__(self) -> 'SolveServer':
+        """
+        Start this server on an unused port of localhost, and return it.
+        """
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """
+        Stop this server.
+        """
+        await self.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        """
+        Start the worker processes of this server, and start listening on the given host and port
+        (an unused port if port is 0), which is stored in self.port.
+        The workers solve a first equation before the server listens, so that the first request
+        does not pay for starting them.
+        """
+        from concurrent.futures import ProcessPoolExecutor  # import multiprocessing only when it is used
+
+        loop = asyncio.get_running_loop()
+        self._executor = ProcessPoolExecutor(self.workers)
+        await asyncio.gather(*[loop.run_in_executor(self._executor, solve_batch, ['x = 0'])
+                               for _ in range(self.workers)])
+
+        self._queue = asyncio.Queue(self.max_queue)
+        self._slots = asyncio.Semaphore(self.workers)
+        self.metrics = ServerMetrics()
+        self._batcher = asyncio.create_task(self._batch_forever())
+        # Accept as many pending connections as there may be queued requests, so that clients are not refused
+        # by the kernel before they are by the queue
+        self._server = await asyncio.start_server(self._handle, host, port, backlog=self.max_queue)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """
+        Serve requests until this server is closed.
+
+        Preconditions:
+            - self has been started
+        """
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stop listening, stop solving batches, and shut down the worker processes of this server.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, *self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self._server = self._batcher = self._executor = None
+
+    async def solve(self, equation: str, n: int = 5) -> tuple[int, dict]:
+        """
+        Return the tuple (status, body) of the response to a request to solve equation, with its roots
+        rounded to n decimal places, where body is the record of equation (see batch.solve_line).
+        The request waits in the queue until it is solved in a batch, and is refused with the
+        status 503 if the queue is full, or answered with the status 504 after self.timeout seconds.
+
+        Preconditions:
+            - self has been started
+            - equation.strip() != ''
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        try:
+            self._queue.put_nowait((equation, n, future, loop.time() + self.timeout))
+        except asyncio.QueueFull:
+            return (503, {'error': f'over the limit of {self.max_queue} queued requests'})
+
+        try:
+            return (200, await asyncio.wait_for(future, self.timeout))
+        except asyncio.TimeoutError:  # the future is cancelled, so its batch skips it
+            return (504, {'error': f'took over the limit of {self.timeout} seconds'})
+
+    async def _batch_forever(self) -> None:
+        """
+        Take the requests in the queue in micro-batches, and solve each batch on a worker.
+        Once a worker is free, a batch starts with the first request in the queue, and takes every request
+        that is waiting or arrives in the next self.window seconds, up to self.max_batch requests.
+        While every worker is busy, requests wait in the queue (or are refused, if it is full).
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                elif loop.time() < deadline:
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    break
+
+            task = asyncio.create_task(self._solve_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _solve_batch(self, batch: list[tuple[str, int, asyncio.Future, float]]) -> None:
+        """
+        Solve the requests in batch, which are tuples (equation, n, future, deadline), on a worker process,
+        and set the result of each future to the record of its equation. Requests that timed out are skipped,
+        and requests of different n are solved as separate batches, each by a little before (see DEADLINE_MARGIN)
+        the earliest deadline (a loop.time()) of its requests (see batch.solve_batch).
+        If the worker process dies, the pool is replaced, so that later batches are still solved.
+
+        Preconditions:
+            - a slot of self._slots has been acquired for this batch
+        """
+        loop = asyncio.get_running_loop()
+        batch = [request for request in batch if not request[2].done()]
+        self._in_flight += len(batch)
+
+        try:
+            by_n = {}
+            for request in batch:
+                by_n.setdefault(request[1], []).append(request)
+
+            for n, requests in by_n.items():
+                self.metrics.add_batch(len(requests))
+                lines = [equation for equation, _, _, _ in requests]
+                deadline = min(deadline for _, _, _, deadline in requests) - DEADLINE_MARGIN * self.timeout
+                timeout = max(deadline - loop.time(), 0.0)
+                executor = self._executor
+                try:
+                    records = await loop.run_in_executor(executor, partial(solve_batch, lines, n, budget=self.budget,
+                                                                           timeout=timeout))
+                except Exception as error:  # isolate the failure to this batch
+                    from concurrent.futures.process import BrokenProcessPool  # as in start
+
+                    if isinstance(error, BrokenProcessPool) and self._executor is executor:
+                        self._replace_executor()
+                    records = [{'input': line, 'status': 'error', 'roots': [],
+                                'error': f'{type(error).__name__}: {error}'} for line in lines]
+
+                for (_, _, future, _), record in zip(requests, records):
+                    if not future.done():
+                        future.set_result(record)
+        finally:
+            self._in_flight -= len(batch)
+            self._slots.release()
+
+    def _replace_executor(self) -> None:
+        """
+        Replace the pool of worker processes of this server, which is broken (i.e., a worker died),
+        with a new one. The batches still running on the broken pool fail on their own.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = ProcessPoolExecutor(self.workers)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve the requests sent on one connection, in order, until the client closes it
+        (or asks for it to be closed).
+        """
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except RequestError as error:  # the rest of the connection cannot be read, so close it
+                    _write_response(writer, error.status, {'error': error.message}, False)
+                    await writer.drain()
+                    break
+
+                if request is None:
+                    break
+
+                method, path, body, keep_alive = request
+                start = time.perf_counter()
+                try:
+                    status, payload = await self._route(method, path, body)
+                except RequestError as error:
+                    status, payload = error.status, {'error': error.message}
+
+                if path == '/solve':
+                    self.metrics.add_response(status, time.perf_counter() - start)
+
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):  # the client went away
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        """
+        Return the tuple (status, body) of the response to a request with the given method, path and body.
+        Raise a RequestError if the request is not valid.
+        """
+        if path == '/metrics':
+            if method != 'GET':
+                raise RequestError(405, 'use GET for /metrics')
+            return (200, self.metrics.to_dict(self._queue.qsize(), self._in_flight))
+        elif path == '/solve':
+            if method != 'POST':
+                raise RequestError(405, 'use POST for /solve')
+            equation, n = _parse_solve(body)
+            return await self.solve(equation, n)
+        else:
+            raise RequestError(404, f'no such endpoint: {path}')
+
+
+def _parse_solve(body: bytes) -> tuple[str, int]:
+    """
+    Return the tuple (equation, n) of the body of a request to /solve, or raise a RequestError
+    if it is not valid.
+
+    >>> _parse_solve(b'{"equation": "x = 1", "decimals": 2}')
+    ('x = 1', 2)
+    >>> _parse_solve(b'{"equation": "x = 1", "decimals": 99}')
+    Traceback (most recent call last):
+    server.RequestError: 'decimals' must be an integer from 0 to 15
+    """
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise RequestError(400, 'the body must be JSON')
+
+    if not isinstance(data, dict) or not isinstance(data.get('equation'), str) or data['equation'].strip() == '':
+        raise RequestError(400, "the body must be a JSON object with a string 'equation'")
+
+    n = data.get('decimals', 5)
+    if not isinstance(n, int) or isinstance(n, bool) or not 0 <= n <= 15:
+        raise RequestError(400, "'decimals' must be an integer from 0 to 15")
+
+    return (data['equation'], n)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[tuple[str, str, bytes, bool]]:
+    """
+    Read an HTTP request from reader, and return the tuple (method, path, body, keep_alive), where
+    keep_alive is whether the connection should be kept open after the response, or None if the
+    client closed the connection. Raise a RequestError if the request cannot be read.
+    """
+    line = await reader.readline()
+    if line == b'':
+        return None
+
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+        raise RequestError(400, 'malformed request line')
+    method, path, version = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in {b'\r\n', b'\n', b''}:
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise RequestError(400, 'too many headers')
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise RequestError(400, 'malformed Content-Length')
+    if length > MAX_BODY:
+        raise RequestError(413, f'the body is over the limit of {MAX_BODY} bytes')
+    elif length < 0:
+        raise RequestError(400, 'malformed Content-Length')
+
+    body = await reader.readexactly(length)
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' and (version != 'HTTP/1.0' or connection == 'keep-alive')
+    return (method, path.split('?')[0], body, keep_alive)
+
+
+def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+    """
+    Write an HTTP response with the given status code and payload, as JSON, to writer.
+    """
+    body = json.dumps(payload).encode()
+    head = (f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    writer.write(head.encode() + body)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101'],
+        'extra-imports': ['asyncio', 'json', 'time', 'collections', 'functools', 'typing', 'concurrent.futures',
+                          'batch', 'budget', 'loadgen'],
+        'max-nested-blocks': 4
+    })
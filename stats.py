@@ -0,0 +1,166 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Stats Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains the SolveStats class, which records where the time of Equation.solve goes.
+Instrumentation is opt-in: a SolveStats object is only updated when it is passed as
+the stats argument of Equation.solve (or Unit.simplify, Unit.get_graph, batch.solve_lines,
+etc.), and the solver does nothing extra when stats is None.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import json
+from typing import Iterable
+
+# The stages timed by SolveStats. 'parse', 'bound', 'simplify', 'subtract' and 'solve' are the
+# consecutive stages of solving an equation string (see Equation.solve and Equation.reduce), while
+# 'distribute', 'flatten', 'collect' and 'graph' are finer stages whose time is part of those stages.
+STAGES = ('parse', 'bound', 'simplify', 'subtract', 'solve', 'distribute', 'flatten', 'collect', 'graph')
+
+
+class SolveStats:
+    """
+    Statistics about solving one or more equations.
+
+    Instance Attributes:
+        - times: The total time, in seconds, spent in each stage in STAGES.
+        - counts: The total of each counter, i.e.,
+            - 'equations': the number of equations solved;
+            - 'rejected': the number of those that were known to be unsupported without being
+                          simplified (see Equation.is_unsupported);
+            - 'distributions': the number of times two factors of a product were multiplied out;
+            - 'distributed_terms': the number of terms in the expanded products;
+            - 'graphs': the number of graphs built (see Unit.get_graph);
+            - 'graph_nodes': the total number of nodes in those graphs.
+        - peaks: The largest value seen of each peak, i.e.,
+            - 'sum_terms': the most terms in a flattened sum, before its like terms are collected.
+
+    Representation Invariants:
+        - all(stage in STAGES for stage in self.times)
+
+    >>> stats = SolveStats()
+    >>> stats.add_count('distributions', 2)
+    >>> stats.add_peak('sum_terms', 4)
+    >>> other = SolveStats()
+    >>> other.add_peak('sum_terms', 3)
+    >>> other.add_time('solve', 0.5)
+    >>> stats.merge(other)
+    >>> stats.to_dict()
+    {'times': {'solve': 0.5}, 'counts': {'distributions': 2}, 'peaks': {'sum_terms': 4}}
+    """
+    times: dict[str, float]
+    counts: dict[str, int]
+    peaks: dict[str, int]
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty SolveStats.
+        """
+        self.times = {}
+        self.counts = {}
+        self.peaks = {}
+
+    def __repr__(self) -> str:
+        """
+        Return a string representing this SolveStats.
+        """
+        return f'SolveStats({self.to_dict()})'
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """
+        Add seconds to the time spent in the given stage.
+
+        Preconditions:
+            - stage in STAGES
+        """
+        self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def add_count(self, name: str, k: int = 1) -> None:
+        """
+        Add k to the counter with the given name.
+        """
+        self.counts[name] = self.counts.get(name, 0) + k
+
+    def add_peak(self, name: str, value: int) -> None:
+        """
+        Record value as a candidate for the peak with the given name.
+        """
+        if value > self.peaks.get(name, value - 1):
+            self.peaks[name] = value
+
+    def add_graph(self, graph: tuple, seconds: float) -> None:
+        """
+        Record that the given graph (see Unit.get_graph) was built in the given number of seconds.
+        """
+        self.add_time('graph', seconds)
+        self.add_count('graphs')
+        self.add_count('graph_nodes', len(graph[1]))
+
+    def merge(self, other: 'SolveStats') -> None:
+        """
+        Add the times and counts of other to this SolveStats, and keep the larger of each peak.
+        """
+        for stage in other.times:
+            self.add_time(stage, other.times[stage])
+        for name in other.counts:
+            self.add_count(name, other.counts[name])
+        for name in other.peaks:
+            self.add_peak(name, other.peaks[name])
+
+    def to_dict(self) -> dict:
+        """
+        Return a JSON-serializable dict with the keys 'times', 'counts' and 'peaks' of this SolveStats.
+        """
+        return {'times': dict(self.times), 'counts': dict(self.counts), 'peaks': dict(self.peaks)}
+
+    def dump(self, path: str) -> None:
+        """
+        Write this SolveStats as JSON (see to_dict) to the file at path.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def from_dict(data: dict) -> SolveStats:
+    """
+    Return the SolveStats represented by data, as returned by SolveStats.to_dict.
+
+    >>> from_dict({'times': {'parse': 0.25}, 'counts': {}, 'peaks': {'sum_terms': 2}})
+    SolveStats({'times': {'parse': 0.25}, 'counts': {}, 'peaks': {'sum_terms': 2}})
+    """
+    stats = SolveStats()
+    stats.times.update(data['times'])
+    stats.counts.update(data['counts'])
+    stats.peaks.update(data['peaks'])
+    return stats
+
+
+def merge_all(all_stats: Iterable[SolveStats]) -> SolveStats:
+    """
+    Return a new SolveStats that merges every SolveStats in all_stats (see SolveStats.merge),
+    e.g., to aggregate the stats of a batch that was solved in separate parts.
+    """
+    total = SolveStats()
+
+    for stats in all_stats:
+        total.merge(stats)
+
+    return total
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
+
+    import python_ta
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'disable': ['E1136', 'E1101'],
+        'extra-imports': ['json', 'typing'],
+        'max-nested-blocks': 4
+    })
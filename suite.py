@@ -0,0 +1,307 @@
+"""Tree-Based Equation Solver by Areez Chishtie: Suite Module
+(CSC111 Winter 2024 Project 2)
+
+Description
+===============================
+
+Contains a reproducible benchmark suite for the main stages of the equation solver:
+parsing (get_equation), simplifying (Unit.simplify), solving (Equation.solve) and
+building graphs (Unit.get_graph).
+
+Every case of the suite solves the same seeded random equations on every run, so the
+results of two runs can be compared. Run this module to print the results of the suite,
+save them with --output FILE, and flag regressions against an earlier run with --compare FILE.
+
+Copyright
+===============================
+
+This file is Copyright © 2024 Areez Chishtie. All rights reserved."""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+from parse import *
+
+# The parameters of the base case of the suite (see generate_equation). Every other case
+# changes exactly one of them to each of the values in AXES.
+BASE_CASE = {'depth': 4, 'width': 4, 'arity': 4, 'degree': 2}
+AXES = {
+    'depth': (1, 16, 64),
+    'width': (2, 16, 64),
+    'arity': (2, 6, 10),
+    'degree': (0, 1, 3)
+}
+
+# The stages timed by the suite, in order.
+STAGES = ('get_equation', 'simplify', 'solve', 'get_graph')
+
+# The least time, in seconds, spent timing each stage of each case. Short stages are run
+# many times, so that their best time is not thrown off by noise.
+MIN_TIME = 0.2
+
+
+def generate_unit(rng: random.Random, depth: int, width: int, arity: int, degree: int) -> str:
+    """
+    Return a random string representing a unit with the given shape:
+        - depth nested sums, each of width terms: width - 1 random monomials of degree at most one,
+          and the next sum (the innermost sum has a product instead);
+        - the product has arity factors, of which degree are binomials (x + c), and the rest are
+          constant sums (c + c), so that the product has the given degree after expansion.
+    The coefficients c are random nonzero integers. Only rng is used for randomness.
+
+    Preconditions:
+        - depth >= 0
+        - width >= 2
+        - arity >= 2
+        - 0 <= degree <= arity
+
+    >>> generate_unit(random.Random(111), 1, 2, 2, 1)
+    '(((2 + 7) * (x + -3)) + -4x)'
+    """
+    factors = [f'(x + {_coeff(rng)})' for _ in range(degree)] + \
+              [f'({_coeff(rng)} + {_coeff(rng)})' for _ in range(arity - degree)]
+    rng.shuffle(factors)
+    unit = f'({" * ".join(factors)})'
+
+    for _ in range(depth):  # build the sums from the inside out
+        terms = [f'{_coeff(rng)}x' if rng.random() < 0.5 else f'{_coeff(rng)}' for _ in range(width - 1)]
+        terms.insert(rng.randrange(width), unit)
+        unit = f'({" + ".join(terms)})'
+
+    return unit
+
+
+def generate_equation(rng: random.Random, depth: int, width: int, arity: int, degree: int) -> str:
+    """
+    Return a random string representing an equation whose left side is generated by
+    generate_unit with the given parameters, and whose right side is a constant.
+
+    Preconditions:
+        - the parameters satisfy the preconditions of generate_unit
+
+    >>> generate_equation(random.Random(111), 0, 2, 2, 2)
+    '((x + -3) * (x + 2)) = -3'
+    >>> get_equation(generate_equation(random.Random(111), 0, 2, 2, 2)).solve(5, trace=False)[0] == {-1.30278, 2.30278}
+    True
+    """
+    return f'{generate_unit(rng, depth, width, arity, degree)} = {_coeff(rng)}'
+
+
+def _coeff(rng: random.Random) -> int:
+    """
+    Return a random nonzero integer in [-9, 9].
+    """
+    return rng.choice([c for c in range(-9, 10) if c != 0])
+
+
+def get_cases() -> dict[str, dict[str, int]]:
+    """
+    Return a dict mapping the name of each case of the suite to its parameters (see BASE_CASE and AXES).
+
+    >>> get_cases()['arity=6']
+    {'depth': 4, 'width': 4, 'arity': 6, 'degree': 2}
+    """
+    cases = {'base': dict(BASE_CASE)}
+
+    for axis in AXES:
+        for value in AXES[axis]:
+            cases[f'{axis}={value}'] = dict(BASE_CASE, **{axis: value})
+
+    return cases
+
+
+def get_stage(stage: str, strings: list[str]) -> tuple[list, Callable[[Any], Any]]:
+    """
+    Return a tuple (inputs, run) for the given stage, where run(x) runs the stage on each x in inputs,
+    and inputs are freshly made from strings (since simplifying and solving mutate their inputs).
+    Simplifying and solving are timed without a trace, since building the graphs is its own stage.
+
+    Preconditions:
+        - stage in STAGES
+    """
+    if stage == 'get_equation':
+        return (strings, get_equation)
+    elif stage == 'simplify':
+        return ([get_equation(s).left for s in strings], lambda unit: unit.simplify(trace=False))
+    elif stage == 'solve':
+        return ([get_equation(s) for s in strings], lambda eqn: eqn.solve(5, trace=False))
+    else:
+        return ([get_equation(s).left for s in strings], lambda unit: unit.get_graph())
+
+
+def time_stage(stage: str, strings: list[str], repeat: int, min_time: float = MIN_TIME) -> dict[str, float]:
+    """
+    Return the results of running the given stage on each equation represented by strings,
+    as a dict with the keys
+        - 'seconds': the best time in seconds over at least repeat runs, and as many more as
+                     it takes for the runs to add up to min_time seconds;
+        - 'ops_per_sec': the number of equations per second in the best run;
+        - 'peak_bytes': the most memory, in bytes, allocated at once during a separate run.
+
+    Preconditions:
+        - stage in STAGES
+        - len(strings) >= 1
+        - repeat >= 1
+    """
+    best = float('inf')
+    runs, total = 0, 0.0
+
+    while runs < repeat or total < min_time:
+        inputs, run = get_stage(stage, strings)
+        gc.collect()
+        gc.disable()  # as in timeit, so that a collection does not land in a single run
+        start = time.perf_counter()
+        for x in inputs:
+            run(x)
+        elapsed = time.perf_counter() - start
+        gc.enable()
+        best, runs, total = min(best, elapsed), runs + 1, total + elapsed
+
+    inputs, run = get_stage(stage, strings)
+    gc.collect()
+    tracemalloc.start()  # tracing slows everything down, so the memory is measured in its own run
+    for x in inputs:
+        run(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': best, 'ops_per_sec': len(strings) / best, 'peak_bytes': peak}
+
+
+def run_suite(seed: int = 111, count: int = 50, repeat: int = 3,
+              cases: Optional[dict[str, dict[str, int]]] = None) -> dict:
+    """
+    Run every stage in STAGES on count equations generated for each case in cases (by default, get_cases()),
+    and return the results as a dict with the keys
+        - 'meta': the settings of the run, and the Python version and platform it ran on;
+        - 'cases': a dict mapping the name of each case to a dict with its 'params', and the
+                   results of each stage (see time_stage).
+    The equations of each case depend only on seed and the case's parameters.
+
+    Preconditions:
+        - count >= 1
+        - repeat >= 1
+    """
+    cases = get_cases() if cases is None else cases
+    results = {
+        'meta': {
+            'seed': seed,
+            'count': count,
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'cases': {}
+    }
+
+    for name in cases:
+        params = cases[name]
+        rng = random.Random(f'{seed}:{sorted(params.items())}')
+        strings = [generate_equation(rng, **params) for _ in range(count)]
+        results['cases'][name] = {'params': params}
+        for stage in STAGES:
+            results['cases'][name][stage] = time_stage(stage, strings, repeat)
+
+    return results
+
+
+def compare(old: dict, new: dict, threshold: float = 0.2) -> list[str]:
+    """
+    Return a description of each regression in the results new (see run_suite), compared to old:
+    a stage of a case is slower if its ops/sec fell by more than threshold (as a fraction of the old value),
+    and larger if its peak memory grew by more than threshold.
+    Only the cases with the same parameters in both results are compared.
+
+    Preconditions:
+        - 0 <= threshold < 1
+
+    >>> old = {'cases': {'base': {'params': {}, 'solve': {'ops_per_sec': 1000.0, 'peak_bytes': 100}}}}
+    >>> new = {'cases': {'base': {'params': {}, 'solve': {'ops_per_sec': 700.0, 'peak_bytes': 110}}}}
+    >>> compare(old, new)
+    ['base solve: 1000.0 -> 700.0 ops/sec (-30.0%)']
+    """
+    regressions = []
+
+    for name in new['cases']:
+        if name not in old['cases'] or old['cases'][name]['params'] != new['cases'][name]['params']:
+            continue
+
+        for stage in STAGES:
+            if stage not in old['cases'][name] or stage not in new['cases'][name]:
+                continue
+
+            old_stage, new_stage = old['cases'][name][stage], new['cases'][name][stage]
+            old_ops, new_ops = old_stage['ops_per_sec'], new_stage['ops_per_sec']
+            old_peak, new_peak = old_stage['peak_bytes'], new_stage['peak_bytes']
+
+            if new_ops < old_ops * (1 - threshold):
+                regressions.append(f'{name} {stage}: {old_ops:.1f} -> {new_ops:.1f} ops/sec '
+                                   f'({(new_ops / old_ops - 1) * 100:+.1f}%)')
+            if new_peak > old_peak * (1 + threshold):
+                regressions.append(f'{name} {stage}: {old_peak} -> {new_peak} peak bytes '
+                                   f'({(new_peak / old_peak - 1) * 100:+.1f}%)')
+
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    """
+    Print a table of the ops/sec and peak memory of every stage of every case in results (see run_suite).
+    """
+    print(f'Suite: seed {results["meta"]["seed"]}, {results["meta"]["count"]} equations per case, '
+          f'best of {results["meta"]["repeat"]}')
+    print(f'{"case":>12}' + ''.join(f'{stage:>26}' for stage in STAGES))
+    print(f'{"":>12}' + f'{"ops/sec":>14}{"peak KiB":>12}' * len(STAGES))
+
+    for name in results['cases']:
+        case = results['cases'][name]
+        print(f'{name:>12}' + ''.join(f'{case[stage]["ops_per_sec"]:>14.1f}{case[stage]["peak_bytes"] / 1024:>12.1f}'
+                                      for stage in STAGES))
+
+
+def get_args() -> argparse.Namespace:
+    """
+    Return the command-line arguments of the benchmark suite.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the equation solver.')
+    parser.add_argument('--seed', type=int, default=111, help='seed of the generated equations (default: 111)')
+    parser.add_argument('--count', type=int, default=50, help='equations per case (default: 50)')
+    parser.add_argument('--repeat', type=int, default=3, help='time the best of this many runs (default: 3)')
+    parser.add_argument('--output', metavar='FILE', help='save the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='flag regressions against the results saved in FILE, and exit with status 1 if any')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='the fraction by which a stage may get slower or larger before it is flagged '
+                             '(default: 0.2)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    suite_results = run_suite(args.seed, args.count, args.repeat)
+    print_results(suite_results)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(suite_results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, encoding='utf-8') as f:
+            old_results = json.load(f)
+
+        if old_results['meta']['seed'] != args.seed or old_results['meta']['count'] != args.count:
+            print(f'Warning: {args.compare} was run with different settings, so its times may not be comparable.')
+
+        regressions = compare(old_results, suite_results, args.threshold)
+        print(f'{len(regressions)} regression(s) against {args.compare}')
+        for regression in regressions:
+            print(f'  {regression}')
+        if len(regressions) > 0:
+            sys.exit(1)
@@ -17,17 +17,111 @@ The remainder of this file is Copyright © 2024 Areez Chishtie. All
 rights reserved."""
 
 import random
-import networkx as nx
-import matplotlib.pyplot as plt
+from collections import OrderedDict
+from typing import Any, Optional
 
 
-def visualize(graph: tuple):
+class LayoutCache:
+    """
+    A bounded table of the layouts (see tree_pos) of whole graphs, by their shape.
+
+    The layout of a graph only depends on its shape, i.e., the parent of each id, and not on its labels.
+    So the steps of a trace whose whole graph has the same shape (e.g., the steps before and after the terms
+    of a sum were simplified but not combined) are laid out once, and get the same positions.
+    Layouts are not kept for subtrees: a step whose shape differs anywhere is laid out again in full,
+    even if most of its subtrees were laid out before. (Keying every subtree by its shape would take
+    about as long as laying out the whole graph, which tree_pos does in a few vectorized passes.)
+    When there are more than maxsize layouts, the least recently used layout is evicted.
+
+    Instance Attributes:
+        - maxsize: The maximum number of layouts.
+        - hits: The number of graphs whose layout was found.
+        - misses: The number of graphs whose layout had to be computed.
+
+    Representation Invariants:
+        - self.maxsize >= 1
+        - len(self._layouts) <= self.maxsize
+
+    >>> layouts = LayoutCache()
+    >>> p1 = tree_pos(([(0, 1), (0, 2)], {0: '+', 1: 'x', 2: '1'}), layouts)
+    >>> p2 = tree_pos(([(0, 1), (0, 2)], {0: '*', 1: '2', 2: 'x'}), layouts)
+    >>> p1 == p2, layouts.hits, layouts.misses
+    (True, 1, 1)
+    >>> p3 = tree_pos(([(0, 1), (0, 2), (2, 3), (2, 4)], {0: '+', 1: 'x', 2: '*', 3: '2', 4: 'x'}), layouts)
+    >>> layouts.hits, layouts.misses  # a new shape, although its root has the same children as before
+    (1, 2)
+    """
+    maxsize: int
+    hits: int
+    misses: int
+    # Private Instance Attributes:
+    #     - _layouts: The x and y coordinates of each id, by the shape of the graph, from least to
+    #                 most recently used.
+    _layouts: OrderedDict
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        """
+        Initialize an empty LayoutCache with at most maxsize layouts.
+
+        Preconditions:
+            - maxsize >= 1
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._layouts = OrderedDict()
+
+    def get(self, key: bytes) -> Optional[tuple]:
+        """
+        Return the layout of the graphs with the shape key, or None if it is not in this cache.
+        """
+        layout = self._layouts.get(key)
+
+        if layout is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._layouts.move_to_end(key)
+
+        return layout
+
+    def put(self, key: bytes, layout: tuple) -> None:
+        """
+        Store the layout of the graphs with the shape key, evicting the least recently used layout if needed.
+        """
+        self._layouts[key] = layout
+        if len(self._layouts) > self.maxsize:
+            self._layouts.popitem(last=False)
+
+
+def visualize(graph: tuple, layouts: Optional[LayoutCache] = None):
     """
     Open a visualization of the given graph.
+    If a LayoutCache is given as layouts, the layout of the graph is looked up in it (see tree_pos).
 
     Preconditions:
         - the graph is given as in Unit.get_graph.
     """
+    # networkx and matplotlib take most of a second to import, so they are only
+    # imported once a graph is actually visualized
+    import matplotlib.pyplot as plt
+
+    draw(graph, plt.gca(), layouts)
+    plt.show()
+
+
+def draw(graph: tuple, ax: Any, layouts: Optional[LayoutCache] = None) -> None:
+    """
+    Draw the given graph on the matplotlib Axes ax, in place of anything drawn on it before.
+    The Axes itself is kept (only what was drawn is removed), so that ax can be reused for many graphs
+    without setting it up again each time.
+    If a LayoutCache is given as layouts, the layout of the graph is looked up in it (see tree_pos).
+
+    Preconditions:
+        - the graph is given as in Unit.get_graph.
+    """
+    import networkx as nx  # imported lazily, as in visualize
+
     edges, labels = graph
     g = nx.Graph()
 
@@ -36,10 +130,114 @@ def visualize(graph: tuple):
     else:
         g.add_edges_from(edges)
 
-    pos = hierarchy_pos(g, 0)
-    nx.draw_networkx(g, pos, None, False)
-    nx.draw_networkx_labels(g, pos, labels)
-    plt.show()
+    for artist in [*ax.collections, *ax.patches, *ax.lines, *ax.texts]:
+        artist.remove()
+    ax.ignore_existing_data_limits = True  # fit the limits to the new graph only
+
+    pos = tree_pos(graph, layouts)
+    nx.draw_networkx(g, pos, None, False, ax=ax)
+    nx.draw_networkx_labels(g, pos, labels, ax=ax)
+
+
+def tree_pos(graph: tuple, layouts: Optional[LayoutCache] = None) -> dict[int, tuple[float, float]]:
+    """
+    Return a dict mapping each id of the given graph to its position in a hierarchical layout:
+    the same layout as hierarchy_pos(g, 0), where g is the networkx graph of graph (as in draw),
+    but computed from graph directly, without networkx or recursion.
+
+    As in hierarchy_pos, the root is at (0.5, 0), each level is 0.2 below the last, and each node
+    splits its width (1 for the root) evenly between its children, in order of id. So the width
+    of a node is the product of the shares of its ancestors, its x-coordinate is the sum of the
+    offsets of its ancestors from their parents, and its depth is the number of its ancestors.
+    These sums and products along the paths to the root are computed for every node at once
+    with NumPy, by pointer jumping (see _path_reduce), in O(log(height)) vectorized passes.
+
+    If a LayoutCache is given as layouts, the layout is looked up in it by the shape of the whole graph,
+    and only computed (and stored in it) if it is not found.
+
+    Preconditions:
+        - the graph is given as in Unit.get_graph, with root 0, or as returned by merge_graphs
+
+    >>> graph = ([(0, 1), (0, 2), (2, 3), (2, 4)], {0: '+', 1: 'x', 2: '*', 3: '2', 4: 'x'})
+    >>> {i: (round(x, 3), round(y, 3)) for i, (x, y) in tree_pos(graph).items()}
+    {0: (0.5, 0.0), 1: (0.25, -0.2), 2: (0.75, -0.2), 3: (0.625, -0.4), 4: (0.875, -0.4)}
+    """
+    import numpy as np  # imported lazily, as in visualize
+
+    edges, labels = graph
+    parent = np.full(len(labels), -1, dtype=np.int64)
+    pairs = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    parent[pairs[:, 1]] = np.where(pairs[:, 0] != pairs[:, 1], pairs[:, 0], -1)  # no parent for a circular edge
+
+    key = parent.tobytes()
+    layout = None if layouts is None else layouts.get(key)
+
+    if layout is None:
+        layout = _tree_layout(parent)
+        if layouts is not None:
+            layouts.put(key, layout)
+
+    return dict(enumerate(zip(*layout)))
+
+
+def _tree_layout(parent: Any) -> tuple[list[float], list[float]]:
+    """
+    Return the lists of the x- and y-coordinates of each id in the layout of tree_pos, for the tree
+    in which parent[i] is the parent of id i (-1 for the root).
+
+    Preconditions:
+        - parent is a NumPy array of ints that represents a tree
+    """
+    import numpy as np
+
+    n = len(parent)
+    nodes = np.nonzero(parent >= 0)[0]  # every id but the root's, in order
+    count = np.bincount(parent[nodes], minlength=n)  # the number of children of each id
+
+    # The rank of each id among its siblings: group the ids by parent, keeping them in order within each group
+    grouped = nodes[np.argsort(parent[nodes], kind='stable')]
+    rank = np.zeros(n)
+    rank[grouped] = np.arange(len(grouped)) - (np.cumsum(count) - count)[parent[grouped]]
+
+    share = np.ones(n)
+    share[nodes] = 1 / count[parent[nodes]]
+    width = _path_reduce(share, parent, np.multiply)
+
+    offset = np.zeros(n)
+    offset[nodes] = width[nodes] * (rank[nodes] + 0.5) - width[parent[nodes]] / 2
+    depth = np.zeros(n)
+    depth[nodes] = 1
+
+    x = 0.5 + _path_reduce(offset, parent, np.add)
+    y = 0 - 0.2 * _path_reduce(depth, parent, np.add)
+    return (x.tolist(), y.tolist())
+
+
+def _path_reduce(values: Any, parent: Any, op: Any) -> Any:
+    """
+    Return a new array whose value at each id i is op applied to values at i and at every ancestor of i,
+    where op is an associative NumPy ufunc (e.g., np.add), and parent is as in _tree_layout.
+
+    Each pass combines the value at every id with the value at its current ancestor (at first, its parent),
+    and then jumps the ancestor of every id to its ancestor's ancestor, so that after k passes each id
+    has combined the 2 ** k - 1 closest ids on its path to the root.
+
+    >>> import numpy as np
+    >>> _path_reduce(np.array([1, 2, 3, 4]), np.array([-1, 0, 1, 0]), np.add).tolist()
+    [1, 3, 6, 5]
+    """
+    import numpy as np
+
+    values = values.copy()
+    ancestor = parent.copy()
+    live = np.nonzero(ancestor >= 0)[0]  # the ids whose ancestor is not past the root
+
+    while len(live) > 0:
+        values[live] = op(values[live], values[ancestor[live]])
+        ancestor[live] = ancestor[ancestor[live]]
+        live = live[ancestor[live] >= 0]
+
+    return values
 
 ###########################################################################
 # THE FOLLOWING CODE IS NOT MINE. SOURCES ARE INCLUDED IN THE DOCSTRINGS. #
@@ -72,6 +270,8 @@ def hierarchy_pos(G, root = None, width = 1., vert_gap = 0.2, vert_loc = 0, xcen
     
     xcenter: horizontal location of root
     '''
+    import networkx as nx  # imported lazily, as in visualize
+
     if not nx.is_tree(G):
         raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
 
@@ -119,6 +319,6 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'max-line-length': 120,
         'disable': ['E1136', 'E1101'],
-        # 'extra-imports': [],
+        'extra-imports': ['random', 'collections', 'typing', 'networkx', 'matplotlib.pyplot', 'numpy'],
         'max-nested-blocks': 4
     })